@@ -0,0 +1,228 @@
+"""
+AIMD自适应并发控制
+按抓取提供方的接口（单页抓取、批量抓取）分别维护并发窗口：响应正常时加性增大窗口，
+遇到429限流、超时或Retry-After时乘性减小窗口并暂停，窗口大小作为指标对外发布。
+控制器跨事件循环可用（后台事件循环和API事件循环共享同一实例）
+"""
+
+import asyncio
+import logging
+import re
+import threading
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Dict, Any, Optional, List
+
+from .config import ADAPTIVE_CONCURRENCY_CONFIG
+
+logger = logging.getLogger(__name__)
+
+# 请求结果
+OUTCOME_SUCCESS = "success"
+OUTCOME_THROTTLED = "throttled"
+OUTCOME_TIMEOUT = "timeout"
+OUTCOME_ERROR = "error"        # 与提供方负载无关的失败，不调整窗口
+
+_RETRY_AFTER_RE = re.compile(r"retry[- ]after\D{0,10}(\d+(?:\.\d+)?)", re.IGNORECASE)
+_THROTTLE_RE = re.compile(r"\b429\b|rate[- ]?limit|too many requests", re.IGNORECASE)
+
+
+def parse_retry_after(error: BaseException) -> Optional[float]:
+    """从异常（响应头或错误信息）中提取Retry-After秒数"""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if headers:
+        value = headers.get("Retry-After") or headers.get("retry-after")
+        try:
+            if value is not None:
+                return float(value)
+        except (TypeError, ValueError):
+            pass
+    match = _RETRY_AFTER_RE.search(str(error))
+    return float(match.group(1)) if match else None
+
+
+def classify_outcome(error: Optional[BaseException]) -> str:
+    """根据异常判断请求结果是否为提供方过载信号"""
+    if error is None:
+        return OUTCOME_SUCCESS
+    if isinstance(error, asyncio.TimeoutError):
+        return OUTCOME_TIMEOUT
+    if parse_retry_after(error) is not None or _THROTTLE_RE.search(str(error)):
+        return OUTCOME_THROTTLED
+    return OUTCOME_ERROR
+
+
+@dataclass
+class _Permit:
+    """一次获得的并发名额"""
+    started_at: float
+
+
+class AimdLimiter:
+    """单个接口的AIMD并发窗口"""
+
+    def __init__(self, name: str, config: Dict[str, Any]):
+        self.name = name
+        self.config = config
+        self.window = float(config["initial_window"])
+        self.paused_until = 0.0
+        self._in_flight = 0
+        self._last_decrease = 0.0
+        self._waiters: List[tuple] = []
+        self._lock = threading.Lock()
+        self.stats = {
+            "successes": 0,
+            "throttled": 0,
+            "timeouts": 0,
+            "errors": 0,
+            "increases": 0,
+            "decreases": 0
+        }
+
+    # ===== 内部 =====
+
+    def _limit(self) -> int:
+        return max(1, int(self.window))
+
+    def _can_start_locked(self, now: float) -> bool:
+        return now >= self.paused_until and self._in_flight < self._limit()
+
+    def _wake_locked(self):
+        """唤醒等待者，让其重新检查窗口"""
+        waiters, self._waiters = self._waiters, []
+        for loop, future in waiters:
+            try:
+                loop.call_soon_threadsafe(self._resolve, future)
+            except RuntimeError:
+                pass
+
+    @staticmethod
+    def _resolve(future: asyncio.Future):
+        if not future.done():
+            future.set_result(None)
+
+    def _on_success_locked(self):
+        self.stats["successes"] += 1
+        if self.window < self.config["max_window"]:
+            # 每完成一个窗口的成功请求，窗口约增加additive_increase
+            self.window = min(self.config["max_window"],
+                              self.window + self.config["additive_increase"] / self._limit())
+            self.stats["increases"] += 1
+
+    def _on_overload_locked(self, permit: _Permit, outcome: str, retry_after: Optional[float], now: float):
+        if outcome == OUTCOME_THROTTLED:
+            # 限流时暂停新请求：优先遵循Retry-After
+            pause = retry_after if retry_after is not None else self.config["default_retry_after"]
+            pause = min(pause, self.config["max_retry_after"])
+            self.paused_until = max(self.paused_until, now + pause)
+
+        # 同一波并发请求的连续失败只减小一次窗口
+        if permit.started_at < self._last_decrease:
+            return
+        previous = self.window
+        self.window = max(self.config["min_window"], self.window * self.config["decrease_factor"])
+        self._last_decrease = now
+        self.stats["decreases"] += 1
+        logger.warning(f"📉 [{self.name}] 提供方过载，并发窗口 {previous:.1f} → {self.window:.1f}，"
+                       f"暂停 {max(0.0, self.paused_until - now):.1f} 秒")
+
+    # ===== 公共接口 =====
+
+    async def acquire(self) -> _Permit:
+        """等待并发窗口中的空闲名额（以及Retry-After暂停结束）"""
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if self._can_start_locked(now):
+                    self._in_flight += 1
+                    return _Permit(started_at=now)
+                future = loop.create_future()
+                self._waiters.append((loop, future))
+                wait = self.paused_until - now if now < self.paused_until else None
+
+            try:
+                await asyncio.wait_for(future, timeout=wait)
+            except asyncio.TimeoutError:
+                pass
+            except asyncio.CancelledError:
+                with self._lock:
+                    if (loop, future) in self._waiters:
+                        self._waiters.remove((loop, future))
+                raise
+
+    def release(self, permit: _Permit, outcome: str, retry_after: float = None):
+        """归还名额并按结果调整窗口"""
+        with self._lock:
+            self._in_flight -= 1
+            now = time.monotonic()
+            if outcome == OUTCOME_SUCCESS:
+                self._on_success_locked()
+            elif outcome in (OUTCOME_THROTTLED, OUTCOME_TIMEOUT):
+                self.stats["throttled" if outcome == OUTCOME_THROTTLED else "timeouts"] += 1
+                self._on_overload_locked(permit, outcome, retry_after, now)
+            else:
+                self.stats["errors"] += 1
+            self._wake_locked()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                **self.stats,
+                "window": round(self.window, 2),
+                "limit": self._limit(),
+                "in_flight": self._in_flight,
+                "waiting": len(self._waiters),
+                "paused_for": round(max(0.0, self.paused_until - time.monotonic()), 2)
+            }
+
+
+class AdaptiveConcurrency:
+    """按接口维护AIMD并发窗口"""
+
+    def __init__(self, config: Dict[str, Any] = None):
+        self.config = {**ADAPTIVE_CONCURRENCY_CONFIG, **(config or {})}
+        self.enabled = self.config.get("enabled", True)
+        self._limiters: Dict[str, AimdLimiter] = {}
+        self._lock = threading.Lock()
+
+    def limiter(self, endpoint: str) -> AimdLimiter:
+        with self._lock:
+            limiter = self._limiters.get(endpoint)
+            if limiter is None:
+                overrides = self.config.get("endpoints", {}).get(endpoint, {})
+                limiter = AimdLimiter(endpoint, {**self.config, **overrides})
+                self._limiters[endpoint] = limiter
+            return limiter
+
+    @asynccontextmanager
+    async def limit(self, endpoint: str):
+        """在接口的并发窗口内执行一次请求；根据是否抛出异常及异常类型调整窗口"""
+        if not self.enabled:
+            yield
+            return
+
+        limiter = self.limiter(endpoint)
+        permit = await limiter.acquire()
+        try:
+            yield
+        except asyncio.CancelledError:
+            limiter.release(permit, OUTCOME_ERROR)
+            raise
+        except BaseException as e:
+            limiter.release(permit, classify_outcome(e), parse_retry_after(e))
+            raise
+        else:
+            limiter.release(permit, OUTCOME_SUCCESS)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """各接口当前窗口等指标"""
+        with self._lock:
+            limiters = list(self._limiters.values())
+        return {limiter.name: limiter.get_stats() for limiter in limiters}
+
+
+# 全局控制器实例（Firecrawl各接口）
+adaptive_concurrency = AdaptiveConcurrency()
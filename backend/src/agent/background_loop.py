@@ -0,0 +1,109 @@
+"""
+后台事件循环线程
+为同步调用方（V1图节点等）提供一个长期运行的事件循环，协程通过run_coroutine_threadsafe提交，
+抓取引擎的客户端和连接可以跨请求复用，避免每次调用都创建线程和事件循环
+"""
+
+import asyncio
+import concurrent.futures
+import logging
+import threading
+from typing import Any, Awaitable, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class BackgroundEventLoop:
+    """在守护线程中运行的长期事件循环"""
+
+    def __init__(self, name: str = "background-loop"):
+        self.name = name
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    @property
+    def is_running(self) -> bool:
+        return self._loop is not None and self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """启动后台循环（幂等）"""
+        with self._lock:
+            if self.is_running:
+                return
+
+            loop = asyncio.new_event_loop()
+            ready = threading.Event()
+
+            def run_loop():
+                asyncio.set_event_loop(loop)
+                loop.call_soon(ready.set)
+                loop.run_forever()
+
+                # 循环停止后清理未完成的任务
+                pending = asyncio.all_tasks(loop)
+                for task in pending:
+                    task.cancel()
+                if pending:
+                    loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+                loop.run_until_complete(loop.shutdown_asyncgens())
+                loop.close()
+
+            thread = threading.Thread(target=run_loop, name=self.name, daemon=True)
+            thread.start()
+            ready.wait()
+
+            self._loop = loop
+            self._thread = thread
+            logger.info(f"🔁 后台事件循环已启动: {self.name}")
+
+    def stop(self, timeout: float = 5.0):
+        """停止后台循环并等待线程退出"""
+        with self._lock:
+            loop, thread = self._loop, self._thread
+            self._loop = None
+            self._thread = None
+
+        if loop is None or thread is None:
+            return
+
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(timeout=timeout)
+        logger.info(f"🛑 后台事件循环已停止: {self.name}")
+
+    def submit(self, coro: Awaitable[Any]) -> concurrent.futures.Future:
+        """提交协程到后台循环，未启动时自动启动"""
+        if not self.is_running:
+            self.start()
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+    def _check_not_on_loop(self):
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        if running is self._loop:
+            raise RuntimeError("不能在后台事件循环线程内同步等待自身的协程")
+
+    def run(self, coro_factory: Callable[[], Awaitable[Any]], timeout: float = None) -> Any:
+        """同步执行协程并等待结果；超时后取消后台任务"""
+        self._check_not_on_loop()
+        future = self.submit(coro_factory())
+        try:
+            return future.result(timeout=timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise asyncio.TimeoutError(f"后台任务超时 ({timeout}秒)")
+
+    async def run_async(self, coro_factory: Callable[[], Awaitable[Any]], timeout: float = None) -> Any:
+        """在其他事件循环中等待后台循环上的协程，不阻塞调用方循环"""
+        future = self.submit(coro_factory())
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout=timeout)
+        except asyncio.TimeoutError:
+            future.cancel()
+            raise
+
+
+# 全局后台循环实例
+background_loop = BackgroundEventLoop()
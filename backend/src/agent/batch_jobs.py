@@ -0,0 +1,257 @@
+"""
+Firecrawl异步批量任务
+提交批量抓取任务后增量轮询任务状态（无新页面时退避），每个页面完成即产出，
+不必等待整批完成；截止时间到达或调用方提前结束时取消任务，已完成的页面照常返回。
+附带本地桩客户端，用于在没有API Key的环境中测试
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from .config import BATCH_JOB_CONFIG
+
+logger = logging.getLogger(__name__)
+
+# 任务状态
+JOB_SCRAPING = "scraping"
+JOB_COMPLETED = "completed"
+JOB_FAILED = "failed"
+JOB_CANCELLED = "cancelled"
+
+TERMINAL_STATES = {JOB_COMPLETED, JOB_FAILED, JOB_CANCELLED}
+
+
+def _field(obj: Any, name: str, default: Any = None) -> Any:
+    """兼容SDK响应对象和原始JSON字典"""
+    if isinstance(obj, dict):
+        return obj.get(name, default)
+    return getattr(obj, name, default)
+
+
+def page_url(page: Dict[str, Any]) -> str:
+    metadata = page.get("metadata") or {}
+    return metadata.get("sourceURL") or metadata.get("url") or ""
+
+
+def _normalize_page(item: Any) -> Optional[Dict[str, Any]]:
+    """将任务结果中的页面统一为 {markdown, html, metadata} 字典；抓取失败的页面返回None"""
+    if not item:
+        return None
+    metadata = _field(item, "metadata") or {}
+    if not isinstance(metadata, dict):
+        metadata = dict(getattr(metadata, "__dict__", {}))
+    status_code = metadata.get("statusCode") or metadata.get("status_code")
+    if metadata.get("error") or (isinstance(status_code, int) and status_code >= 400):
+        return None
+    return {
+        "markdown": _field(item, "markdown") or "",
+        "html": _field(item, "html") or "",
+        "metadata": metadata
+    }
+
+
+def supports_batch_jobs(client: Any) -> bool:
+    return client is not None and all(
+        hasattr(client, name) for name in ("async_batch_scrape_urls", "check_batch_scrape_status")
+    )
+
+
+class BatchScrapeJob:
+    """一次Firecrawl异步批量抓取任务"""
+
+    def __init__(self, client: Any, urls: List[str], scrape_kwargs: Dict[str, Any] = None,
+                 config: Dict[str, Any] = None):
+        self.client = client
+        self.urls = list(urls)
+        self.scrape_kwargs = scrape_kwargs or {}
+        self.config = {**BATCH_JOB_CONFIG, **(config or {})}
+        self.job_id: Optional[str] = None
+        self.status = None
+        self.completed = 0
+        self.total = len(self.urls)
+        self.polls = 0
+        self._seen: set = set()
+
+    @property
+    def done(self) -> bool:
+        return self.status in TERMINAL_STATES
+
+    async def submit(self) -> str:
+        """提交任务，返回任务ID（提交失败时抛出异常）"""
+        response = await self.client.async_batch_scrape_urls(self.urls, **self.scrape_kwargs)
+        job_id = _field(response, "id")
+        if not job_id or _field(response, "success", True) is False:
+            raise RuntimeError(f"批量任务提交失败: {_field(response, 'error') or response}")
+        self.job_id = job_id
+        self.status = JOB_SCRAPING
+        logger.info(f"🔥 已提交Firecrawl批量任务 {job_id}: {len(self.urls)} 个URL")
+        return job_id
+
+    async def poll(self) -> List[Dict[str, Any]]:
+        """查询一次任务状态，返回自上次查询以来新完成的页面"""
+        status = await self.client.check_batch_scrape_status(self.job_id)
+        self.polls += 1
+        self.status = _field(status, "status", JOB_SCRAPING)
+        self.completed = _field(status, "completed", self.completed) or 0
+        self.total = _field(status, "total", self.total) or self.total
+
+        pages = []
+        for item in _field(status, "data") or []:
+            page = _normalize_page(item)
+            url = page_url(page) if page else ""
+            if not url or url in self._seen:
+                continue
+            self._seen.add(url)
+            pages.append(page)
+        return pages
+
+    async def cancel(self):
+        """取消服务端任务；SDK不支持取消时只停止轮询"""
+        if not self.job_id or self.done:
+            return
+        self.status = JOB_CANCELLED
+        cancel = getattr(self.client, "cancel_batch_scrape", None)
+        if cancel is None:
+            logger.info(f"ℹ️ 客户端不支持取消批量任务，停止轮询 {self.job_id}")
+            return
+        try:
+            await cancel(self.job_id)
+            logger.info(f"🛑 已取消Firecrawl批量任务 {self.job_id} ({self.completed}/{self.total} 已完成)")
+        except Exception as e:
+            logger.warning(f"⚠️ 取消批量任务失败 {self.job_id}: {e}")
+
+    async def pages(self, deadline: float) -> AsyncIterator[Dict[str, Any]]:
+        """
+        提交任务并按完成顺序产出页面
+
+        Args:
+            deadline: 截止时间（time.monotonic()时刻），到达时取消任务并结束
+
+        轮询失败连续超过max_poll_errors次时抛出最后一次异常（已产出的页面不受影响）
+        """
+        if self.job_id is None:
+            await self.submit()
+
+        interval = self.config["poll_interval"]
+        errors = 0
+        try:
+            while not self.done:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                await asyncio.sleep(min(interval, remaining))
+
+                try:
+                    pages = await self.poll()
+                    errors = 0
+                except Exception as e:
+                    errors += 1
+                    if errors >= self.config["max_poll_errors"]:
+                        raise
+                    logger.warning(f"⚠️ 批量任务轮询失败 {self.job_id} (第{errors}次): {e}")
+                    pages = []
+
+                for page in pages:
+                    yield page
+
+                # 有新页面完成时恢复初始间隔，否则退避
+                if pages:
+                    interval = self.config["poll_interval"]
+                else:
+                    interval = min(self.config["max_poll_interval"], interval * self.config["backoff_factor"])
+        finally:
+            if not self.done:
+                await self.cancel()
+
+        if self.status == JOB_FAILED:
+            logger.warning(f"⚠️ Firecrawl批量任务失败 {self.job_id} ({self.completed}/{self.total} 已完成)")
+
+
+class StubBatchScrapeClient:
+    """本地批量任务桩客户端（模拟Firecrawl的提交/查询/取消接口）
+
+    第i个URL在提交后 (i+1)*page_delay 秒完成；failing_urls中的URL以错误页面完成
+    """
+
+    def __init__(self, page_delay: float = 0.1, failing_urls: List[str] = None,
+                 content: str = "桩页面正文。" * 30, fail_submit: bool = False):
+        self.page_delay = page_delay
+        self.failing_urls = set(failing_urls or [])
+        self.content = content
+        self.fail_submit = fail_submit
+        self.jobs: Dict[str, Dict[str, Any]] = {}
+        self.status_calls = 0
+
+    async def async_batch_scrape_urls(self, urls: List[str], **kwargs) -> Dict[str, Any]:
+        if self.fail_submit:
+            raise RuntimeError("429 Too Many Requests")
+        job_id = f"stub-{len(self.jobs) + 1}"
+        self.jobs[job_id] = {"urls": list(urls), "started": time.monotonic(), "cancelled": False}
+        return {"success": True, "id": job_id}
+
+    async def check_batch_scrape_status(self, job_id: str) -> Dict[str, Any]:
+        self.status_calls += 1
+        job = self.jobs[job_id]
+        elapsed = time.monotonic() - job["started"]
+        finished = [url for i, url in enumerate(job["urls"]) if elapsed >= (i + 1) * self.page_delay]
+        data = []
+        for url in finished:
+            if url in self.failing_urls:
+                data.append({"metadata": {"sourceURL": url, "statusCode": 500, "error": "stub failure"}})
+            else:
+                data.append({"markdown": f"# {url}\n\n{self.content}",
+                             "metadata": {"sourceURL": url, "title": f"Stub {url}", "statusCode": 200}})
+        if job["cancelled"]:
+            status = JOB_CANCELLED
+        else:
+            status = JOB_COMPLETED if len(finished) == len(job["urls"]) else JOB_SCRAPING
+        return {"status": status, "completed": len(finished), "total": len(job["urls"]), "data": data}
+
+    async def cancel_batch_scrape(self, job_id: str) -> Dict[str, Any]:
+        self.jobs[job_id]["cancelled"] = True
+        return {"success": True}
+
+
+async def test_batch_jobs() -> Dict[str, Any]:
+    """用桩客户端测试增量产出、截止时间取消和失败页面"""
+    config = {"poll_interval": 0.05, "max_poll_interval": 0.2}
+    urls = [f"https://example.com/page{i}" for i in range(5)]
+
+    # 完整任务：页面按完成顺序逐个产出，失败页面不产出
+    client = StubBatchScrapeClient(page_delay=0.05, failing_urls=[urls[2]])
+    job = BatchScrapeJob(client, urls, config=config)
+    arrivals = []
+    started = time.monotonic()
+    async for page in job.pages(time.monotonic() + 5):
+        arrivals.append((page_url(page), round(time.monotonic() - started, 2)))
+    complete = {
+        "yielded": [url for url, _ in arrivals],
+        "first_page_after": arrivals[0][1] if arrivals else None,
+        "status": job.status,
+        "polls": job.polls
+    }
+
+    # 截止时间：返回已完成的部分页面并取消任务
+    client = StubBatchScrapeClient(page_delay=0.2)
+    job = BatchScrapeJob(client, urls, config=config)
+    partial = [page_url(page) async for page in job.pages(time.monotonic() + 0.5)]
+    deadline = {
+        "yielded": partial,
+        "status": job.status,
+        "server_cancelled": client.jobs[job.job_id]["cancelled"]
+    }
+
+    results = {"complete": complete, "deadline": deadline}
+    print(f"🧪 批量任务测试: {results}")
+    assert complete["yielded"] == [urls[0], urls[1], urls[3], urls[4]], complete
+    assert complete["status"] == JOB_COMPLETED
+    assert complete["first_page_after"] is not None and complete["first_page_after"] < 0.2, complete
+    assert 0 < len(partial) < len(urls) and partial == urls[:len(partial)], deadline
+    assert deadline["status"] == JOB_CANCELLED and deadline["server_cancelled"], deadline
+    return results
+
+
+if __name__ == "__main__":
+    asyncio.run(test_batch_jobs())
@@ -0,0 +1,746 @@
+"""
+持久化LangGraph检查点
+V1/V2图共享的检查点存储：单机使用SQLite，多实例部署使用Postgres（psycopg2）。
+每次运行使用唯一的thread_id；通道值按版本单独存储（每步只写入变化的通道），
+序列化数据超过阈值时以zlib压缩。运行登记表记录每次运行的请求和状态，
+进程重启或客户端断开后可从最后完成的节点恢复，过期的运行按TTL回收
+"""
+
+import asyncio
+import json
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+)
+
+from .config import CHECKPOINT_CONFIG
+from .content_store import content_stores
+
+logger = logging.getLogger(__name__)
+
+# 运行状态
+RUN_RUNNING = "running"
+RUN_COMPLETED = "completed"
+RUN_FAILED = "failed"
+RUN_INTERRUPTED = "interrupted"    # 客户端断开等，检查点保留可恢复
+
+# 压缩存储的序列化类型后缀
+_ZLIB_SUFFIX = "+zlib"
+
+# 表结构（{blob}/{real}按数据库替换）
+_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS checkpoints (
+        thread_id TEXT NOT NULL,
+        checkpoint_ns TEXT NOT NULL DEFAULT '',
+        checkpoint_id TEXT NOT NULL,
+        parent_checkpoint_id TEXT,
+        type TEXT NOT NULL,
+        checkpoint {blob} NOT NULL,
+        metadata_type TEXT NOT NULL,
+        metadata {blob} NOT NULL,
+        created_at {real} NOT NULL,
+        PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS checkpoint_blobs (
+        thread_id TEXT NOT NULL,
+        checkpoint_ns TEXT NOT NULL DEFAULT '',
+        channel TEXT NOT NULL,
+        version TEXT NOT NULL,
+        type TEXT NOT NULL,
+        blob {blob},
+        PRIMARY KEY (thread_id, checkpoint_ns, channel, version)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS checkpoint_writes (
+        thread_id TEXT NOT NULL,
+        checkpoint_ns TEXT NOT NULL DEFAULT '',
+        checkpoint_id TEXT NOT NULL,
+        task_id TEXT NOT NULL,
+        idx INTEGER NOT NULL,
+        channel TEXT NOT NULL,
+        type TEXT NOT NULL,
+        blob {blob},
+        task_path TEXT NOT NULL DEFAULT '',
+        PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS checkpoint_content (
+        thread_id TEXT NOT NULL,
+        content_id TEXT NOT NULL,
+        blob {blob} NOT NULL,
+        PRIMARY KEY (thread_id, content_id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS research_runs (
+        thread_id TEXT PRIMARY KEY,
+        version TEXT NOT NULL,
+        request TEXT NOT NULL,
+        status TEXT NOT NULL,
+        error TEXT,
+        created_at {real} NOT NULL,
+        updated_at {real} NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_checkpoints_created_at ON checkpoints(created_at)",
+    "CREATE INDEX IF NOT EXISTS idx_research_runs_updated_at ON research_runs(updated_at)",
+]
+
+# 按thread_id删除运行的全部数据
+_THREAD_TABLES = ("checkpoints", "checkpoint_blobs", "checkpoint_writes", "checkpoint_content", "research_runs")
+
+# 图状态中出现的自定义类型（反序列化白名单）
+_STATE_TYPES = [
+    ("agents_v2.advanced_state", "ResearchTask"),
+    ("agents_v2.advanced_state", "TaskResult"),
+    ("agents_v2.advanced_state", "ContentQualityAssessment"),
+]
+
+
+def _state_serializer():
+    """允许反序列化V2状态数据类的序列化器（旧版langgraph没有白名单参数，使用默认序列化器）"""
+    from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+
+    try:
+        return JsonPlusSerializer(allowed_msgpack_modules=_STATE_TYPES)
+    except TypeError:
+        return None
+
+
+class _SQLiteDatabase:
+    """SQLite连接（单连接 + 锁，与页面缓存相同的用法）"""
+
+    blob_type = "BLOB"
+    real_type = "REAL"
+
+    def __init__(self, path: str):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=10.0)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def cursor(self):
+        with self._lock:
+            cursor = self._conn.cursor()
+            try:
+                yield cursor
+                self._conn.commit()
+            except Exception:
+                self._conn.rollback()
+                raise
+            finally:
+                cursor.close()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class _PostgresDatabase:
+    """Postgres连接池（多实例部署共享同一个检查点库）"""
+
+    blob_type = "BYTEA"
+    real_type = "DOUBLE PRECISION"
+
+    def __init__(self, dsn: str, max_connections: int):
+        import psycopg2.pool
+
+        if not dsn:
+            raise ValueError("CHECKPOINT_POSTGRES_DSN 或 DATABASE_URL 未设置")
+        self._pool = psycopg2.pool.ThreadedConnectionPool(1, max_connections, dsn)
+
+    @contextmanager
+    def cursor(self):
+        conn = self._pool.getconn()
+        try:
+            with conn.cursor() as cursor:
+                yield _PostgresCursor(cursor)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self._pool.putconn(conn)
+
+    def close(self):
+        self._pool.closeall()
+
+
+class _PostgresCursor:
+    """把SQLite风格的?占位符转换为psycopg2的%s"""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def execute(self, sql: str, params: Sequence[Any] = ()):
+        self._cursor.execute(sql.replace("?", "%s"), params)
+        return self
+
+    def executemany(self, sql: str, rows: Sequence[Sequence[Any]]):
+        self._cursor.executemany(sql.replace("?", "%s"), rows)
+        return self
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    @property
+    def rowcount(self) -> int:
+        return self._cursor.rowcount
+
+
+class ResearchCheckpointer(BaseCheckpointSaver[str]):
+    """
+    研究图的持久化检查点存储
+
+    检查点本体（不含通道值）、按版本存储的通道值、节点的中间写入分表保存；
+    另有运行登记表（恢复接口）和运行级内容存储的持久化表（见content_store的backing）
+    """
+
+    def __init__(self, config: Dict[str, Any] = None, database: Any = None):
+        super().__init__(serde=_state_serializer())
+        self.config = {**CHECKPOINT_CONFIG, **(config or {})}
+        if database is None:
+            if self.config["backend"] == "postgres":
+                database = _PostgresDatabase(self.config["postgres_dsn"], self.config["postgres_max_connections"])
+            else:
+                database = _SQLiteDatabase(self.config["sqlite_path"])
+        self.db = database
+        self._last_gc = 0.0
+        self._gc_lock = threading.Lock()
+        with self.db.cursor() as cursor:
+            for statement in _SCHEMA:
+                cursor.execute(statement.format(blob=self.db.blob_type, real=self.db.real_type))
+
+    # ===== 序列化 =====
+
+    def _dump(self, value: Any) -> Tuple[str, bytes]:
+        """序列化并在超过阈值时压缩（压缩无收益时保留原始数据）"""
+        type_, data = self.serde.dumps_typed(value)
+        if len(data) >= self.config["compress_min_bytes"]:
+            compressed = zlib.compress(data, self.config["compression_level"])
+            if len(compressed) < len(data):
+                return type_ + _ZLIB_SUFFIX, compressed
+        return type_, data
+
+    def _load(self, type_: str, data: Any) -> Any:
+        data = bytes(data) if data is not None else b""
+        if type_.endswith(_ZLIB_SUFFIX):
+            type_ = type_[:-len(_ZLIB_SUFFIX)]
+            data = zlib.decompress(data)
+        return self.serde.loads_typed((type_, data))
+
+    # ===== 读取 =====
+
+    def _load_blobs(self, cursor, thread_id: str, checkpoint_ns: str,
+                    versions: ChannelVersions) -> Dict[str, Any]:
+        if not versions:
+            return {}
+        pairs = list(versions.items())
+        conditions = " OR ".join("(channel = ? AND version = ?)" for _ in pairs)
+        params = [thread_id, checkpoint_ns]
+        for channel, version in pairs:
+            params.extend([channel, str(version)])
+        rows = cursor.execute(
+            f"SELECT channel, type, blob FROM checkpoint_blobs "
+            f"WHERE thread_id = ? AND checkpoint_ns = ? AND ({conditions})",
+            params
+        ).fetchall()
+        return {
+            channel: self._load(type_, blob)
+            for channel, type_, blob in rows if type_ != "empty"
+        }
+
+    def _load_writes(self, cursor, thread_id: str, checkpoint_ns: str, checkpoint_id: str) -> List[tuple]:
+        rows = cursor.execute(
+            "SELECT task_id, channel, type, blob FROM checkpoint_writes "
+            "WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ? "
+            "ORDER BY task_path, task_id, idx",
+            (thread_id, checkpoint_ns, checkpoint_id)
+        ).fetchall()
+        return [(task_id, channel, self._load(type_, blob)) for task_id, channel, type_, blob in rows]
+
+    def _build_tuple(self, cursor, row: tuple) -> CheckpointTuple:
+        thread_id, checkpoint_ns, checkpoint_id, parent_id, type_, blob, metadata_type, metadata = row
+        checkpoint = self._load(type_, blob)
+        return CheckpointTuple(
+            config={
+                "configurable": {
+                    "thread_id": thread_id,
+                    "checkpoint_ns": checkpoint_ns,
+                    "checkpoint_id": checkpoint_id,
+                }
+            },
+            checkpoint={
+                **checkpoint,
+                "channel_values": self._load_blobs(
+                    cursor, thread_id, checkpoint_ns, checkpoint["channel_versions"]
+                ),
+            },
+            metadata=self._load(metadata_type, metadata),
+            parent_config={
+                "configurable": {
+                    "thread_id": thread_id,
+                    "checkpoint_ns": checkpoint_ns,
+                    "checkpoint_id": parent_id,
+                }
+            } if parent_id else None,
+            pending_writes=self._load_writes(cursor, thread_id, checkpoint_ns, checkpoint_id),
+        )
+
+    _CHECKPOINT_COLUMNS = (
+        "thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, type, checkpoint, metadata_type, metadata"
+    )
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        """读取指定检查点；未指定checkpoint_id时读取该thread的最新检查点"""
+        configurable = config["configurable"]
+        thread_id = configurable["thread_id"]
+        checkpoint_ns = configurable.get("checkpoint_ns", "")
+        checkpoint_id = get_checkpoint_id(config)
+        with self.db.cursor() as cursor:
+            if checkpoint_id:
+                row = cursor.execute(
+                    f"SELECT {self._CHECKPOINT_COLUMNS} FROM checkpoints "
+                    "WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+                    (thread_id, checkpoint_ns, checkpoint_id)
+                ).fetchone()
+            else:
+                row = cursor.execute(
+                    f"SELECT {self._CHECKPOINT_COLUMNS} FROM checkpoints "
+                    "WHERE thread_id = ? AND checkpoint_ns = ? ORDER BY checkpoint_id DESC LIMIT 1",
+                    (thread_id, checkpoint_ns)
+                ).fetchone()
+            return self._build_tuple(cursor, row) if row else None
+
+    def list(self, config: Optional[RunnableConfig], *, filter: Optional[Dict[str, Any]] = None,
+             before: Optional[RunnableConfig] = None, limit: Optional[int] = None) -> Iterator[CheckpointTuple]:
+        """按thread、命名空间、元数据和checkpoint_id上界列出检查点（新的在前）"""
+        conditions, params = [], []
+        if config:
+            conditions.append("thread_id = ?")
+            params.append(config["configurable"]["thread_id"])
+            checkpoint_ns = config["configurable"].get("checkpoint_ns")
+            if checkpoint_ns is not None:
+                conditions.append("checkpoint_ns = ?")
+                params.append(checkpoint_ns)
+            if get_checkpoint_id(config):
+                conditions.append("checkpoint_id = ?")
+                params.append(get_checkpoint_id(config))
+        if before and get_checkpoint_id(before):
+            conditions.append("checkpoint_id < ?")
+            params.append(get_checkpoint_id(before))
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        with self.db.cursor() as cursor:
+            rows = cursor.execute(
+                f"SELECT {self._CHECKPOINT_COLUMNS} FROM checkpoints {where} ORDER BY checkpoint_id DESC",
+                params
+            ).fetchall()
+            results = []
+            for row in rows:
+                if limit is not None and len(results) >= limit:
+                    break
+                if filter:
+                    metadata = self._load(row[6], row[7])
+                    if any(metadata.get(key) != value for key, value in filter.items()):
+                        continue
+                results.append(self._build_tuple(cursor, row))
+        return iter(results)
+
+    # ===== 写入 =====
+
+    def put(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata,
+            new_versions: ChannelVersions) -> RunnableConfig:
+        """保存检查点：只写入本步版本有变化的通道值"""
+        configurable = config["configurable"]
+        thread_id = configurable["thread_id"]
+        checkpoint_ns = configurable.get("checkpoint_ns", "")
+        stored = checkpoint.copy()
+        values = stored.pop("channel_values")
+        blob_rows = []
+        for channel, version in new_versions.items():
+            type_, blob = self._dump(values[channel]) if channel in values else ("empty", None)
+            blob_rows.append((thread_id, checkpoint_ns, channel, str(version), type_, blob))
+        type_, blob = self._dump(stored)
+        metadata_type, metadata_blob = self._dump(get_checkpoint_metadata(config, metadata))
+        now = time.time()
+        # 检查点中的内容句柄先落库：本步节点写入的内容随检查点一次批量写入
+        content_stores.flush(thread_id)
+
+        with self.db.cursor() as cursor:
+            if blob_rows:
+                cursor.executemany(
+                    "INSERT INTO checkpoint_blobs (thread_id, checkpoint_ns, channel, version, type, blob) "
+                    "VALUES (?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT (thread_id, checkpoint_ns, channel, version) DO NOTHING",
+                    blob_rows
+                )
+            cursor.execute(
+                "INSERT INTO checkpoints (thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, "
+                "type, checkpoint, metadata_type, metadata, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (thread_id, checkpoint_ns, checkpoint_id) DO UPDATE SET "
+                "type = excluded.type, checkpoint = excluded.checkpoint, "
+                "metadata_type = excluded.metadata_type, metadata = excluded.metadata",
+                (thread_id, checkpoint_ns, checkpoint["id"], configurable.get("checkpoint_id"),
+                 type_, blob, metadata_type, metadata_blob, now)
+            )
+            # 运行心跳：最后一次写入检查点的时间
+            cursor.execute("UPDATE research_runs SET updated_at = ? WHERE thread_id = ?", (now, thread_id))
+
+        self._maybe_gc()
+        return {
+            "configurable": {
+                "thread_id": thread_id,
+                "checkpoint_ns": checkpoint_ns,
+                "checkpoint_id": checkpoint["id"],
+            }
+        }
+
+    def put_writes(self, config: RunnableConfig, writes: Sequence[Tuple[str, Any]], task_id: str,
+                   task_path: str = "") -> None:
+        """保存节点的中间写入（节点成功而同一步其他节点失败时，恢复后不会重跑已成功的节点）"""
+        configurable = config["configurable"]
+        thread_id = configurable["thread_id"]
+        checkpoint_ns = configurable.get("checkpoint_ns", "")
+        checkpoint_id = configurable["checkpoint_id"]
+        rows = []
+        for idx, (channel, value) in enumerate(writes):
+            type_, blob = self._dump(value)
+            rows.append((thread_id, checkpoint_ns, checkpoint_id, task_id,
+                         WRITES_IDX_MAP.get(channel, idx), channel, type_, blob, task_path))
+        if not rows:
+            return
+        # 特殊写入（错误、中断等）覆盖已有记录，普通写入只保存第一次
+        conflict = (
+            "DO UPDATE SET channel = excluded.channel, type = excluded.type, blob = excluded.blob"
+            if all(channel in WRITES_IDX_MAP for channel, _ in writes) else "DO NOTHING"
+        )
+        with self.db.cursor() as cursor:
+            cursor.executemany(
+                "INSERT INTO checkpoint_writes (thread_id, checkpoint_ns, checkpoint_id, task_id, idx, "
+                "channel, type, blob, task_path) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                f"ON CONFLICT (thread_id, checkpoint_ns, checkpoint_id, task_id, idx) {conflict}",
+                rows
+            )
+
+    def delete_thread(self, thread_id: str) -> None:
+        """删除运行的全部检查点、写入、内容和登记记录"""
+        with self.db.cursor() as cursor:
+            for table in _THREAD_TABLES:
+                cursor.execute(f"DELETE FROM {table} WHERE thread_id = ?", (thread_id,))
+
+    def get_next_version(self, current: Optional[str], channel: Any = None) -> str:
+        """单调递增的字符串版本（与LangGraph内置存储相同的格式）"""
+        if current is None:
+            current_version = 0
+        elif isinstance(current, int):
+            current_version = current
+        else:
+            current_version = int(current.split(".")[0])
+        return f"{current_version + 1:032}.{random.random():016}"
+
+    # ===== 异步接口（数据库操作在线程中执行，不阻塞事件循环） =====
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(self, config: Optional[RunnableConfig], *, filter: Optional[Dict[str, Any]] = None,
+                    before: Optional[RunnableConfig] = None,
+                    limit: Optional[int] = None) -> AsyncIterator[CheckpointTuple]:
+        results = await asyncio.to_thread(
+            lambda: list(self.list(config, filter=filter, before=before, limit=limit))
+        )
+        for item in results:
+            yield item
+
+    async def aput(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata,
+                   new_versions: ChannelVersions) -> RunnableConfig:
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config: RunnableConfig, writes: Sequence[Tuple[str, Any]], task_id: str,
+                          task_path: str = "") -> None:
+        await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        await asyncio.to_thread(self.delete_thread, thread_id)
+
+    # ===== 运行登记（恢复接口） =====
+
+    def register_run(self, thread_id: str, version: str, request: Dict[str, Any]):
+        """登记新运行（恢复时按登记的请求重建运行参数）"""
+        now = time.time()
+        with self.db.cursor() as cursor:
+            cursor.execute(
+                "INSERT INTO research_runs (thread_id, version, request, status, error, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, NULL, ?, ?) "
+                "ON CONFLICT (thread_id) DO UPDATE SET status = excluded.status, updated_at = excluded.updated_at",
+                (thread_id, version, json.dumps(request, ensure_ascii=False), RUN_RUNNING, now, now)
+            )
+
+    def claim_run(self, thread_id: str) -> bool:
+        """
+        原子地把可恢复的运行标记为running（多个实例/请求同时恢复时只有一个成功）
+
+        Returns:
+            bool: 是否由本次调用获得了运行
+        """
+        now = time.time()
+        with self.db.cursor() as cursor:
+            cursor.execute(
+                "UPDATE research_runs SET status = ?, error = NULL, updated_at = ? "
+                "WHERE thread_id = ? AND (status IN (?, ?) OR (status = ? AND updated_at < ?))",
+                (RUN_RUNNING, now, thread_id, RUN_INTERRUPTED, RUN_FAILED,
+                 RUN_RUNNING, now - self.config["stale_after"])
+            )
+            return cursor.rowcount == 1
+
+    def touch_run(self, thread_id: str):
+        """运行心跳：长时间没有新检查点的节点（如LLM调用）执行期间，避免运行被判定为已中断"""
+        with self.db.cursor() as cursor:
+            cursor.execute(
+                "UPDATE research_runs SET updated_at = ? WHERE thread_id = ? AND status = ?",
+                (time.time(), thread_id, RUN_RUNNING)
+            )
+
+    def set_run_status(self, thread_id: str, status: str, error: str = None):
+        with self.db.cursor() as cursor:
+            cursor.execute(
+                "UPDATE research_runs SET status = ?, error = ?, updated_at = ? WHERE thread_id = ?",
+                (status, error, time.time(), thread_id)
+            )
+
+    def get_run(self, thread_id: str) -> Optional[Dict[str, Any]]:
+        with self.db.cursor() as cursor:
+            row = cursor.execute(
+                "SELECT thread_id, version, request, status, error, created_at, updated_at "
+                "FROM research_runs WHERE thread_id = ?",
+                (thread_id,)
+            ).fetchone()
+        return self._run_from_row(row) if row else None
+
+    def list_runs(self, resumable_only: bool = False, limit: int = 50) -> List[Dict[str, Any]]:
+        """最近的运行（新的在前）；resumable_only时只返回可恢复的运行"""
+        with self.db.cursor() as cursor:
+            rows = cursor.execute(
+                "SELECT thread_id, version, request, status, error, created_at, updated_at "
+                "FROM research_runs ORDER BY updated_at DESC"
+            ).fetchall()
+        runs = [self._run_from_row(row) for row in rows]
+        if resumable_only:
+            runs = [run for run in runs if run["resumable"]]
+        return runs[:limit]
+
+    def _run_from_row(self, row: tuple) -> Dict[str, Any]:
+        thread_id, version, request, status, error, created_at, updated_at = row
+        stale = status == RUN_RUNNING and time.time() - updated_at > self.config["stale_after"]
+        return {
+            "thread_id": thread_id,
+            "version": version,
+            "request": json.loads(request),
+            "status": status,
+            "error": error,
+            "created_at": created_at,
+            "updated_at": updated_at,
+            # 中断/失败的运行，以及心跳已超时的running运行（进程已退出）可恢复
+            "resumable": status in (RUN_INTERRUPTED, RUN_FAILED) or stale
+        }
+
+    # ===== 运行级内容存储的持久化后端 =====
+
+    def save_content(self, run_id: str, content_id: str, text: str):
+        self.save_contents(run_id, [(content_id, text)])
+
+    def save_contents(self, run_id: str, items: Sequence[Tuple[str, str]]):
+        """批量写入内容（内容ID, 文本）"""
+        level = self.config["compression_level"]
+        rows = [(run_id, content_id, zlib.compress(text.encode("utf-8"), level)) for content_id, text in items]
+        with self.db.cursor() as cursor:
+            cursor.executemany(
+                "INSERT INTO checkpoint_content (thread_id, content_id, blob) VALUES (?, ?, ?) "
+                "ON CONFLICT (thread_id, content_id) DO NOTHING",
+                rows
+            )
+
+    def load_content(self, run_id: str, content_id: str) -> Optional[str]:
+        with self.db.cursor() as cursor:
+            row = cursor.execute(
+                "SELECT blob FROM checkpoint_content WHERE thread_id = ? AND content_id = ?",
+                (run_id, content_id)
+            ).fetchone()
+        return zlib.decompress(bytes(row[0])).decode("utf-8") if row else None
+
+    # ===== 过期回收 =====
+
+    def _maybe_gc(self):
+        now = time.time()
+        if now - self._last_gc < self.config["gc_interval"]:
+            return
+        if not self._gc_lock.acquire(blocking=False):
+            return
+        try:
+            self._last_gc = now
+            self.gc(now)
+        except Exception as e:
+            logger.warning(f"⚠️ 检查点回收失败: {e}")
+        finally:
+            self._gc_lock.release()
+
+    def gc(self, now: float = None) -> int:
+        """
+        回收过期运行：最后一次写入超过ttl的thread，以及完成超过completed_ttl的运行
+
+        Returns:
+            int: 删除的thread数
+        """
+        now = now or time.time()
+        with self.db.cursor() as cursor:
+            expired = {
+                row[0] for row in cursor.execute(
+                    "SELECT thread_id FROM checkpoints GROUP BY thread_id HAVING MAX(created_at) < ?",
+                    (now - self.config["ttl"],)
+                ).fetchall()
+            }
+            expired.update(
+                row[0] for row in cursor.execute(
+                    "SELECT thread_id FROM research_runs WHERE updated_at < ? OR (status = ? AND updated_at < ?)",
+                    (now - self.config["ttl"], RUN_COMPLETED, now - self.config["completed_ttl"])
+                ).fetchall()
+            )
+        for thread_id in expired:
+            self.delete_thread(thread_id)
+        if expired:
+            logger.info(f"🗑️ 检查点回收: {len(expired)} 个过期运行")
+        return len(expired)
+
+    def close(self):
+        self.db.close()
+
+
+_checkpointer: Optional[ResearchCheckpointer] = None
+_checkpointer_lock = threading.Lock()
+_checkpointer_failed = False
+
+
+def get_checkpointer() -> Optional[ResearchCheckpointer]:
+    """
+    进程级检查点存储（懒初始化）
+
+    未启用或初始化失败时返回None，图按原方式编译（不保存检查点）。
+    启用时同时作为运行级内容存储的持久化后端，恢复的运行能取回句柄内容
+    """
+    global _checkpointer, _checkpointer_failed
+    if not CHECKPOINT_CONFIG["enabled"] or _checkpointer_failed:
+        return None
+    with _checkpointer_lock:
+        if _checkpointer is None and not _checkpointer_failed:
+            try:
+                _checkpointer = ResearchCheckpointer()
+                logger.info(f"💾 检查点存储已启用: {CHECKPOINT_CONFIG['backend']}")
+            except Exception as e:
+                _checkpointer_failed = True
+                logger.error(f"❌ 检查点存储初始化失败，运行不可恢复: {e}")
+                return None
+            content_stores.attach_backing(_checkpointer)
+        return _checkpointer
+
+
+def close_checkpointer():
+    global _checkpointer
+    with _checkpointer_lock:
+        if _checkpointer is not None:
+            _checkpointer.close()
+            _checkpointer = None
+
+
+def test_checkpointer():
+    """用内存SQLite测试检查点读写、压缩、中间写入、分页列出、运行认领和过期回收"""
+    from langgraph.checkpoint.base import empty_checkpoint
+
+    saver = ResearchCheckpointer({"compress_min_bytes": 64, "gc_interval": 10 ** 9},
+                                 database=_SQLiteDatabase(":memory:"))
+    config = {"configurable": {"thread_id": "test-run", "checkpoint_ns": ""}}
+    report = "量子纠错是构建容错量子计算机的关键技术。" * 50
+
+    # 两个检查点：第二个只写入版本变化的report通道
+    first = empty_checkpoint()
+    first["channel_values"] = {"user_query": "量子纠错", "report": ""}
+    first["channel_versions"] = {"user_query": saver.get_next_version(None), "report": saver.get_next_version(None)}
+    first_config = saver.put(config, first, {"source": "input", "step": -1}, first["channel_versions"])
+
+    second = empty_checkpoint()
+    second["channel_values"] = {"user_query": "量子纠错", "report": report}
+    second["channel_versions"] = {
+        "user_query": first["channel_versions"]["user_query"],
+        "report": saver.get_next_version(first["channel_versions"]["report"]),
+    }
+    second_config = saver.put(first_config, second, {"source": "loop", "step": 0},
+                              {"report": second["channel_versions"]["report"]})
+    saver.put_writes(second_config, [("report", "草稿"), ("is_complete", True)], task_id="task-1")
+
+    latest = saver.get_tuple(config)
+    assert latest.checkpoint["id"] == second["id"]
+    assert latest.checkpoint["channel_values"] == {"user_query": "量子纠错", "report": report}
+    assert latest.metadata["step"] == 0
+    assert latest.parent_config["configurable"]["checkpoint_id"] == first["id"]
+    assert latest.pending_writes == [("task-1", "report", "草稿"), ("task-1", "is_complete", True)]
+    assert saver.get_tuple(first_config).checkpoint["channel_values"] == {"user_query": "量子纠错", "report": ""}
+
+    # 长报告以zlib压缩存储
+    with saver.db.cursor() as cursor:
+        types = {row[0] for row in cursor.execute(
+            "SELECT type FROM checkpoint_blobs WHERE channel = 'report'").fetchall()}
+    assert any(type_.endswith(_ZLIB_SUFFIX) for type_ in types), types
+
+    listed = [item.checkpoint["id"] for item in saver.list(config)]
+    assert listed == [second["id"], first["id"]]
+    assert [item.checkpoint["id"] for item in saver.list(config, before=second_config)] == [first["id"]]
+    assert [item.checkpoint["id"] for item in saver.list(config, filter={"source": "input"})] == [first["id"]]
+
+    # 运行认领：running中的运行不能被认领，中断后只有一次认领成功
+    saver.register_run("test-run", "v2", {"query": "量子纠错", "version": "v2"})
+    assert not saver.claim_run("test-run")
+    saver.set_run_status("test-run", RUN_INTERRUPTED)
+    assert saver.get_run("test-run")["resumable"]
+    assert saver.claim_run("test-run") and not saver.claim_run("test-run")
+
+    # 过期回收删除运行的全部数据
+    saver.save_content("test-run", "c1", report)
+    assert saver.load_content("test-run", "c1") == report
+    assert saver.gc(time.time()) == 0
+    assert saver.gc(time.time() + saver.config["ttl"] + 1) == 1
+    assert saver.get_tuple(config) is None and saver.get_run("test-run") is None
+    assert saver.load_content("test-run", "c1") is None
+    saver.close()
+    print("🧪 检查点存储测试通过")
+
+
+if __name__ == "__main__":
+    test_checkpointer()
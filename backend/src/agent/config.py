@@ -4,6 +4,8 @@ LangGraph Agent 配置文件
 定义研究代理的核心参数和行为配置
 """
 
+import os
+
 # 研究循环配置
 RESEARCH_CONFIG = {
     "max_cycles": 3,           # 最大研究轮次 (当前硬编码为3)
@@ -15,7 +17,169 @@ RESEARCH_CONFIG = {
 SEARCH_CONFIG = {
     "queries_per_cycle": 3,         # 每轮生成的查询数量
     "results_per_query": 5,         # 每个查询返回的结果数量
-    "results_for_reflection": 7,    # 用于反思分析的结果数量
+    "results_for_reflection": 5,    # 用于反思分析的结果数量 (按BM25相关性选取)
+}
+
+# 流水线配置 (V1.5)
+PIPELINE_CONFIG = {
+    "stream_search_to_scrape": True,   # 搜索结果逐条流入URL选择和抓取，搜索与抓取重叠执行
+    "max_enhance": 5,                  # 每轮最多增强的结果数量（上限，实际数量按时间预算决定）
+    "enhance_budget": 20,              # 每轮内容增强的时间预算(秒)
+    "pipeline_timeout": 120,           # 搜索+抓取流水线总超时(秒)
+}
+
+# 抓取预算配置 (按预测耗时和价值决定抓取数量)
+SCRAPE_BUDGET_CONFIG = {
+    "default_latency": 8.0,         # 无历史记录时的预测抓取耗时(秒)
+    "local_latency": 3.0,           # 本地抓取引擎的默认预测耗时(秒)
+    "cached_latency": 0.1,          # 已缓存页面的预测耗时(秒)
+    "latency_alpha": 0.3,           # 域名耗时历史的指数平滑系数
+    "safety_margin": 0.8,           # 只按预算的此比例规划，留出排队和抽取时间
+    "min_value": 0.3,               # 预测价值低于此值的URL不抓取
+    "thin_snippet_chars": 160,      # 摘要短于此长度视为信息稀薄，抓取价值更高
+    "thin_snippet_bonus": 0.5,      # 摘要完全为空时的价值加成比例
+    "max_urls": 8,                  # 未指定上限时的最大抓取数
+    "max_domains": 5000,            # 耗时历史最多记录的域名数
+}
+
+# 抓取页面缓存配置 (V1/V2共享)
+PAGE_CACHE_CONFIG = {
+    "enabled": os.getenv("PAGE_CACHE_ENABLED", "true").lower() != "false",
+    "path": os.getenv("PAGE_CACHE_PATH", os.path.normpath(os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), "..", "..", ".cache", "page_cache.sqlite3"
+    ))),                            # 默认 backend/.cache/
+    "default_ttl": 24 * 3600,       # 默认缓存1天
+    "negative_ttl": 6 * 3600,       # 未知失败类型的初始退避时间
+    "failure_backoff": {            # 按失败类型的初始退避时间(秒)，连续失败时指数增长
+        "timeout": 1 * 3600,
+        "blocked": 24 * 3600,
+        "too_short": 12 * 3600,
+        "empty": 6 * 3600,
+        "http_4xx": 12 * 3600,
+        "http_5xx": 30 * 60,
+    },
+    "max_backoff": 7 * 24 * 3600,   # 退避时间上限
+    "domain_failure_threshold": 3,  # 同一域名累计失败达到此次数后整体降权
+    "max_bytes": 200 * 1024 * 1024, # 压缩后总容量上限 200MB
+    "maintenance_interval": 300,    # 清理过期条目并重新统计总容量的间隔(秒)；其间总容量增量维护
+    "evict_batch": 200,             # 淘汰时每批读取的最久未访问条目数
+    "domain_ttls": {                # 按域名后缀的TTL(秒)
+        "wikipedia.org": 7 * 24 * 3600,
+        "arxiv.org": 30 * 24 * 3600,
+        "github.com": 2 * 24 * 3600,
+        "stackoverflow.com": 7 * 24 * 3600,
+        "reuters.com": 6 * 3600,
+        "bbc.com": 6 * 3600,
+    },
+}
+
+# 统一抓取引擎配置 (V1/V2共享同一Firecrawl客户端)
+SCRAPE_ENGINE_CONFIG = {
+    "global_request_delay": 0.5,    # 所有配置档共享的最小请求间隔(秒)
+    "min_cacheable_length": 50,     # 低于此长度的页面写入负缓存
+    "domain_weights": {},           # 按域名后缀的URL评分加减，如 {"arxiv.org": 0.1, "medium.com": -0.1}
+}
+
+# 本地抓取引擎配置 (Firecrawl不可用或失败时降级，或按域名优先使用)
+LOCAL_SCRAPE_CONFIG = {
+    "enabled": os.getenv("LOCAL_SCRAPE_ENABLED", "true").lower() != "false",
+    "domains": [                    # 优先使用本地抓取的域名后缀（静态页面为主）
+        "wikipedia.org",
+        "arxiv.org",
+        "python.org",
+    ],
+    "timeout": 10.0,                # 读取超时(秒)
+    "connect_timeout": 5.0,         # 连接超时(秒)
+    "max_connections": 20,          # 连接池总连接数
+    "max_keepalive_connections": 10,
+    "per_host_connections": 2,      # 单主机并发连接数
+    "max_bytes": 2 * 1024 * 1024,   # 单页下载上限 2MB
+    "process_workers": 2,           # 正文抽取进程数（0表示使用线程）
+    "max_redirects": 5,             # 最多跟随的重定向次数（每一跳都检查目标地址）
+    "allowed_hosts": [],            # 跳过公网地址检查的主机（如内网文档镜像）；默认拒绝回环/私有/链路本地地址
+    "user_agent": "Mozilla/5.0 (compatible; ResearchAgent/2.0)",
+}
+
+# 近重复内容折叠配置 (SimHash，转载新闻/镜像文档只保留一份)
+NEAR_DUPLICATE_CONFIG = {
+    "enabled": True,
+    "max_distance": 3,              # 64位指纹汉明距离不超过此值视为近重复
+    "shingle_size": 2,              # 词项n-gram长度
+    "min_tokens": 8,                # 词项过少的文本不参与判重（指纹不稳定）
+    "max_chars": 8000,              # 每条文本参与计算的最大字符数
+}
+
+# Firecrawl自适应并发配置 (AIMD，按接口分别维护窗口)
+ADAPTIVE_CONCURRENCY_CONFIG = {
+    "enabled": True,
+    "initial_window": 2,            # 初始并发窗口
+    "min_window": 1,
+    "max_window": 8,
+    "additive_increase": 1.0,       # 每完成一个窗口的成功请求，窗口增加的值
+    "decrease_factor": 0.5,         # 429/超时时窗口乘以此系数
+    "default_retry_after": 5.0,     # 429未给出Retry-After时的暂停时间(秒)
+    "max_retry_after": 60.0,        # 暂停时间上限(秒)
+    "endpoints": {                  # 按接口覆盖
+        "batch_scrape": {"initial_window": 1, "max_window": 2},
+    },
+}
+
+# Firecrawl异步批量任务配置 (提交任务后增量轮询，页面完成即产出)
+BATCH_JOB_CONFIG = {
+    "enabled": True,
+    "min_urls": 3,                  # 待抓取URL不少于此数时使用异步批量任务，否则使用阻塞批量接口
+    "poll_interval": 1.0,           # 初始轮询间隔(秒)
+    "max_poll_interval": 5.0,       # 轮询间隔上限(秒)
+    "backoff_factor": 1.5,          # 没有新页面完成时轮询间隔乘以此系数
+    "max_poll_errors": 3,           # 连续轮询失败次数上限，超过后放弃任务
+}
+
+# 投机预抓取配置 (搜索阶段把高置信度的靠前结果提前抓取到页面缓存，默认关闭)
+PREFETCH_CONFIG = {
+    "enabled": os.getenv("SPECULATIVE_PREFETCH_ENABLED", "false").lower() == "true",
+    "min_score": 0.95,              # URL评分阈值（优先域名且标题、摘要完整的结果才能达到）
+    "top_positions": 3,             # 只考虑每次搜索排名前N的结果
+    "max_per_search": 1,            # 每次搜索最多预抓取的URL数
+    "max_unused_per_run": 2,        # 每次运行中尚未被增强阶段使用的预抓取上限（浪费上限）
+    "unused_ttl": 900,              # 超过此时间(秒)仍未被使用的预抓取计为浪费
+    "formats": ["markdown", "html"],  # 预抓取格式（覆盖V1/V2配置档的格式，缓存可被两者命中）
+    "wait_timeout": 10.0,           # 增强阶段等待进行中预抓取的最长时间(秒)
+}
+
+# 运行级内容存储配置 (抓取正文、增强内容和报告存放在图状态之外，状态只保存句柄)
+CONTENT_STORE_CONFIG = {
+    "enabled": os.getenv("CONTENT_STORE_ENABLED", "true").lower() != "false",
+    "min_length": 512,              # 短于此长度的文本直接保留在状态中
+    "fields": ["content", "enhanced_content", "raw_content", "markdown", "html"],  # 结果中外置的文本字段
+    "memory_limit": 32 * 1024 * 1024,  # 单次运行内存区上限(字节)，超出后最早的内容写入溢出文件
+    "spill_enabled": os.getenv("CONTENT_STORE_SPILL", "true").lower() != "false",
+    "spill_dir": os.getenv("CONTENT_STORE_SPILL_DIR") or None,  # 溢出文件目录，默认系统临时目录
+    "run_ttl": 2 * 3600,            # 为读取句柄从检查点库重建的存储，空闲超过此时间(秒)被回收
+    "max_runs": 32,                 # 运行存储数量上限：超出时回收最久未使用的重建存储，运行中的存储只在释放时关闭
+}
+
+# LangGraph检查点配置 (V1/V2图共享，单机SQLite，多实例部署使用Postgres)
+# 每次运行使用唯一的thread_id，中断（进程重启、客户端断开）后可从最后完成的节点恢复
+CHECKPOINT_CONFIG = {
+    "enabled": os.getenv("CHECKPOINT_ENABLED", "true").lower() != "false",
+    "backend": os.getenv("CHECKPOINT_BACKEND", "sqlite").lower(),  # "sqlite" 或 "postgres"
+    "sqlite_path": os.getenv("CHECKPOINT_SQLITE_PATH", os.path.normpath(os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), "..", "..", ".cache", "checkpoints.sqlite3"
+    ))),                            # 默认 backend/.cache/
+    "postgres_dsn": os.getenv("CHECKPOINT_POSTGRES_DSN") or os.getenv("DATABASE_URL", ""),
+    "postgres_max_connections": 8,  # Postgres连接池大小
+    "compress_min_bytes": 512,      # 不小于此大小的序列化数据以zlib压缩存储
+    "compression_level": 6,
+    "ttl": 3 * 24 * 3600,           # 最后一次写入超过此时间(秒)的运行被回收
+    "completed_ttl": 6 * 3600,      # 已完成的运行保留时间(秒)
+    "gc_interval": 600,             # 两次回收之间的最小间隔(秒)，在写入检查点时触发
+    "stale_after": 300,             # 状态为running但超过此时间(秒)没有新检查点的运行视为已中断（进程已退出）
+}
+
+# 进程级抓取调度配置 (所有研究运行共享)
+SCRAPE_SCHEDULER_CONFIG = {
+    "max_concurrent": 4,            # 全局最大并发抓取数
+    "per_domain_concurrent": 1,     # 单个域名最大并发抓取数
 }
 
 # 测试场景配置
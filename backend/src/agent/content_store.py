@@ -0,0 +1,397 @@
+"""
+运行级内容存储
+抓取正文、增强内容和最终报告等长文本存放在图状态之外：状态中只保存句柄
+（内容ID、长度、哈希），节点需要文本时再按句柄取回。状态保持很小，
+每个超步的状态复制、astream事件和SSE序列化都不再携带整页文本。
+每次运行一个存储：内容先放在内存区，超过内存上限后最早的内容写入溢出文件，通过mmap读取。
+启用持久化检查点时，新内容先记入待写队列，保存检查点或释放存储时批量写入检查点库（backing），
+恢复的运行在其他进程中也能取回句柄内容；写入句柄的节点（包括事件循环上的异步节点）不做数据库I/O
+"""
+
+import hashlib
+import logging
+import mmap
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional
+
+from .config import CONTENT_STORE_CONFIG
+from .scrape_scheduler import get_scrape_context
+
+logger = logging.getLogger(__name__)
+
+# 句柄的字段（普通dict，可直接JSON序列化和写入检查点）
+HANDLE_KEYS = frozenset({"content_id", "length", "hash", "run_id"})
+
+
+class ContentHandleError(KeyError):
+    """句柄对应的内容无法取回（运行存储已释放且没有持久化后端）"""
+
+
+def is_handle(value: Any) -> bool:
+    """是否为内容句柄"""
+    return isinstance(value, dict) and value.keys() == HANDLE_KEYS
+
+
+def content_hash(text: str) -> str:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+
+class ContentStore:
+    """单次运行的内容存储：内存区 + 可选的mmap溢出文件，按内容哈希去重"""
+
+    def __init__(self, run_id: str, config: Dict[str, Any] = None, backing: Any = None):
+        self.run_id = run_id
+        self.config = {**CONTENT_STORE_CONFIG, **(config or {})}
+        self.backing = backing                                  # 持久化后端（save_content/load_content）
+        self._arena: "OrderedDict[str, str]" = OrderedDict()   # 内容ID -> 文本（按写入顺序）
+        self._arena_bytes = 0
+        self._spilled: Dict[str, tuple] = {}                    # 内容ID -> (偏移, 字节数)
+        self._pending: Dict[str, str] = {}                      # 待写入持久化后端的内容
+        self._spill_file = None
+        self._spill_size = 0
+        self._mmap: Optional[mmap.mmap] = None
+        self._lock = threading.Lock()
+        self.last_used = time.monotonic()
+        self.stats = {"puts": 0, "deduped": 0, "reads": 0, "spilled": 0, "spill_reads": 0}
+
+    def put(self, text: str) -> Dict[str, Any]:
+        """写入文本，返回句柄（相同内容只存一份）"""
+        digest = content_hash(text)
+        content_id = digest[:16]
+        handle = {"content_id": content_id, "length": len(text), "hash": digest, "run_id": self.run_id}
+        with self._lock:
+            self.last_used = time.monotonic()
+            self.stats["puts"] += 1
+            if content_id in self._arena or content_id in self._spilled:
+                self.stats["deduped"] += 1
+                return handle
+            self._cache_locked(content_id, text)
+            if self.backing is not None:
+                self._pending[content_id] = text
+        return handle
+
+    def flush(self) -> int:
+        """把待写队列中的内容批量写入持久化后端（同步I/O，不要在事件循环上调用），返回写入条数"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            backing = self.backing
+        if not pending or backing is None:
+            return 0
+        try:
+            backing.save_contents(self.run_id, list(pending.items()))
+        except Exception as e:
+            logger.warning(f"⚠️ 内容持久化失败: {self.run_id} ({len(pending)} 条) - {e}")
+            return 0
+        return len(pending)
+
+    def _cache_locked(self, content_id: str, text: str):
+        self._arena[content_id] = text
+        self._arena_bytes += len(text.encode("utf-8"))
+        self._spill_locked()
+
+    def get(self, content_id: str) -> Optional[str]:
+        """按内容ID读取文本，不存在时返回None（本地没有时从持久化后端加载）"""
+        text = self._get_local(content_id)
+        if text is not None or self.backing is None:
+            return text
+        try:
+            text = self.backing.load_content(self.run_id, content_id)
+        except Exception as e:
+            logger.warning(f"⚠️ 内容加载失败: {content_id} - {e}")
+            return None
+        if text is not None:
+            with self._lock:
+                if content_id not in self._arena and content_id not in self._spilled:
+                    self._cache_locked(content_id, text)
+        return text
+
+    def _get_local(self, content_id: str) -> Optional[str]:
+        with self._lock:
+            self.last_used = time.monotonic()
+            self.stats["reads"] += 1
+            text = self._arena.get(content_id)
+            if text is not None:
+                return text
+            location = self._spilled.get(content_id)
+            if location is None:
+                return None
+            offset, size = location
+            if self._mmap is None or offset + size > len(self._mmap):
+                # 溢出文件增长后重新映射
+                if self._mmap is not None:
+                    self._mmap.close()
+                self._spill_file.flush()
+                self._mmap = mmap.mmap(self._spill_file.fileno(), 0, access=mmap.ACCESS_READ)
+            self.stats["spill_reads"] += 1
+            return self._mmap[offset:offset + size].decode("utf-8")
+
+    def _spill_locked(self):
+        """内存区超过上限时，把最早写入的内容追加到溢出文件"""
+        if not self.config["spill_enabled"]:
+            return
+        while self._arena_bytes > self.config["memory_limit"] and len(self._arena) > 1:
+            content_id, text = self._arena.popitem(last=False)
+            data = text.encode("utf-8")
+            self._arena_bytes -= len(data)
+            if self._spill_file is None:
+                self._spill_file = tempfile.TemporaryFile(
+                    prefix=f"content-{self.run_id}-", dir=self.config["spill_dir"]
+                )
+            self._spill_file.seek(self._spill_size)
+            self._spill_file.write(data)
+            self._spilled[content_id] = (self._spill_size, len(data))
+            self._spill_size += len(data)
+            self.stats["spilled"] += 1
+
+    def close(self):
+        """写入待持久化的内容后释放内存区和溢出文件（没有持久化后端时，之后句柄无法再取回内容）"""
+        self.flush()
+        with self._lock:
+            self._arena.clear()
+            self._arena_bytes = 0
+            self._spilled.clear()
+            if self._mmap is not None:
+                self._mmap.close()
+                self._mmap = None
+            if self._spill_file is not None:
+                self._spill_file.close()
+                self._spill_file = None
+            self._spill_size = 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                **self.stats,
+                "arena_items": len(self._arena),
+                "arena_bytes": self._arena_bytes,
+                "spilled_items": len(self._spilled),
+                "pending_items": len(self._pending),
+                "spill_bytes": self._spill_size
+            }
+
+
+class ContentStoreRegistry:
+    """进程级的运行存储注册表：按run_id创建存储，运行结束时释放
+
+    写入方的存储只在release()时释放，不会因空闲或数量被回收；
+    只为读取句柄从持久化后端重建的存储（内容可重新加载）按空闲时间和数量回收
+    """
+
+    def __init__(self, config: Dict[str, Any] = None):
+        self.config = {**CONTENT_STORE_CONFIG, **(config or {})}
+        self.enabled = self.config["enabled"]
+        self._stores: "OrderedDict[str, ContentStore]" = OrderedDict()
+        self._readers: set = set()      # 只读的重建存储（可回收）
+        self._lock = threading.Lock()
+        self.backing = None
+
+    def attach_backing(self, backing: Any):
+        """设置持久化后端（之后创建的运行存储都写入该后端）"""
+        with self._lock:
+            self.backing = backing
+            for store in self._stores.values():
+                store.backing = backing
+
+    def for_run(self, run_id: str = None) -> ContentStore:
+        """获取（必要时创建）运行的存储，默认取当前抓取上下文的run_id；存储保留到release()"""
+        run_id = run_id or get_scrape_context().run_id
+        with self._lock:
+            self._readers.discard(run_id)
+            return self._open_locked(run_id)
+
+    def _reader_for(self, run_id: str) -> ContentStore:
+        """为读取句柄从持久化后端重建运行的存储（本进程没有该运行的存储时），可被回收"""
+        with self._lock:
+            reader = run_id not in self._stores
+            store = self._open_locked(run_id)
+            if reader:
+                self._readers.add(run_id)
+            return store
+
+    def _open_locked(self, run_id: str) -> ContentStore:
+        store = self._stores.get(run_id)
+        if store is None:
+            self._evict_locked()
+            store = ContentStore(run_id, self.config, self.backing)
+            self._stores[run_id] = store
+        else:
+            self._stores.move_to_end(run_id)
+        return store
+
+    def _evict_locked(self):
+        """回收只读的重建存储（内容仍在持久化后端）；运行中的存储超过上限时只记录警告"""
+        now = time.monotonic()
+        for run_id, store in list(self._stores.items()):
+            if run_id in self._readers and now - store.last_used > self.config["run_ttl"]:
+                self._close_reader_locked(run_id)
+                logger.info(f"🗑️ 回收空闲的内容存储: {run_id}")
+        for run_id in list(self._stores):
+            if len(self._stores) < self.config["max_runs"]:
+                return
+            if run_id in self._readers:
+                self._close_reader_locked(run_id)
+                logger.info(f"🗑️ 回收最久未使用的内容存储: {run_id}")
+        if len(self._stores) >= self.config["max_runs"]:
+            logger.warning(f"⚠️ 未释放的内容存储数量 ({len(self._stores)}) 达到上限 {self.config['max_runs']}，"
+                           f"检查运行结束时是否调用了release()")
+
+    def _close_reader_locked(self, run_id: str):
+        self._readers.discard(run_id)
+        self._stores.pop(run_id).close()
+
+    def put(self, text: Any, run_id: str = None) -> Any:
+        """长文本写入运行存储并返回句柄；短文本、非字符串或存储关闭时原样返回"""
+        if not self.enabled or not isinstance(text, str) or len(text) < self.config["min_length"]:
+            return text
+        return self.for_run(run_id).put(text)
+
+    def deref(self, value: Any, default: str = "") -> Any:
+        """取回句柄对应的文本；非句柄原样返回（None返回default）；内容无法取回时抛出ContentHandleError"""
+        if value is None:
+            return default
+        if not is_handle(value):
+            return value
+        with self._lock:
+            store = self._stores.get(value["run_id"])
+            backing = self.backing
+        if store is None and backing is not None:
+            # 本进程没有该运行的存储（如进程重启后恢复的运行），从持久化后端取回
+            store = self._reader_for(value["run_id"])
+        text = store.get(value["content_id"]) if store is not None else None
+        if text is None:
+            # 静默返回空文本会让报告和提示词悄悄丢失内容，直接报错
+            logger.error(f"❌ 内容句柄已失效: {value['run_id']}/{value['content_id']}")
+            raise ContentHandleError(f"{value['run_id']}/{value['content_id']}")
+        return text
+
+    def flush(self, run_id: str) -> int:
+        """把运行的待写内容批量写入持久化后端（保存检查点前调用，使检查点中的句柄都可取回）"""
+        with self._lock:
+            store = self._stores.get(run_id)
+        return store.flush() if store is not None else 0
+
+    def release(self, run_id: str):
+        """运行结束时释放其存储（会写入待持久化的内容，在事件循环上通过asyncio.to_thread调用）"""
+        with self._lock:
+            store = self._stores.pop(run_id, None)
+            self._readers.discard(run_id)
+        if store is not None:
+            logger.info(f"🗑️ 释放内容存储: {run_id} ({store.get_stats()})")
+            store.close()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stores = list(self._stores.values())
+        return {
+            "enabled": self.enabled,
+            "runs": len(stores),
+            "arena_bytes": sum(store.get_stats()["arena_bytes"] for store in stores),
+            "spill_bytes": sum(store.get_stats()["spill_bytes"] for store in stores)
+        }
+
+
+# 全局内容存储
+content_stores = ContentStoreRegistry()
+
+
+def deref(value: Any, default: str = "") -> Any:
+    """取回句柄对应的文本（见ContentStoreRegistry.deref）"""
+    return content_stores.deref(value, default)
+
+
+def content_length(value: Any) -> int:
+    """文本长度，句柄无需取回内容"""
+    if is_handle(value):
+        return value["length"]
+    return len(value) if isinstance(value, str) else len(str(value or ""))
+
+
+def externalize(result: Any, fields: Iterable[str] = None, run_id: str = None) -> Any:
+    """把结果中的长文本字段替换为句柄（返回副本，不修改原结果）"""
+    if not isinstance(result, dict) or not content_stores.enabled:
+        return result
+    fields = CONTENT_STORE_CONFIG["fields"] if fields is None else fields
+    updates = {}
+    for field in fields:
+        value = result.get(field)
+        if isinstance(value, str):
+            handle = content_stores.put(value, run_id)
+            if handle is not value:
+                updates[field] = handle
+    return {**result, **updates} if updates else result
+
+
+def materialize(result: Any) -> Any:
+    """把结果中的句柄替换回文本（返回副本，不修改原结果）"""
+    if not isinstance(result, dict):
+        return result
+    updates = {key: deref(value) for key, value in result.items() if is_handle(value)}
+    return {**result, **updates} if updates else result
+
+
+def test_content_store():
+    """测试句柄往返、去重、溢出文件读取和释放"""
+    registry = ContentStoreRegistry({"enabled": True, "min_length": 10, "memory_limit": 2000,
+                                     "spill_enabled": True, "max_runs": 2})
+    pages = [f"第{i}页的正文内容。" * 60 for i in range(5)]
+    handles = [registry.put(page, run_id="test-run") for page in pages]
+    assert all(is_handle(handle) for handle in handles)
+    assert registry.put("短文本", run_id="test-run") == "短文本"
+    assert registry.put(pages[0], run_id="test-run") == handles[0]
+
+    store = registry.for_run("test-run")
+    stats = store.get_stats()
+    print(f"🧪 内容存储: 内存区 {stats['arena_items']} 条, 溢出 {stats['spilled_items']} 条, 去重 {stats['deduped']} 次")
+    assert stats["spilled_items"] > 0 and stats["deduped"] == 1
+    assert [registry.deref(handle) for handle in handles] == pages
+    assert content_length(handles[1]) == len(pages[1])
+
+    registry.release("test-run")
+    try:
+        registry.deref(handles[0])
+        assert False, "已释放的句柄应报错"
+    except ContentHandleError:
+        pass
+
+    # 未释放的运行存储不会因数量上限被回收
+    for run_id in ("run-a", "run-b", "run-c"):
+        registry.put(pages[0], run_id=run_id)
+    assert registry.get_stats()["runs"] == 3
+    for run_id in ("run-a", "run-b", "run-c"):
+        registry.release(run_id)
+
+    # 持久化后端：写入句柄时不做I/O，flush时一次批量写入，释放后仍可从后端取回
+    class MemoryBacking:
+        def __init__(self):
+            self.rows, self.batches = {}, 0
+
+        def save_contents(self, run_id, items):
+            self.batches += 1
+            self.rows.update(((run_id, content_id), text) for content_id, text in items)
+
+        def load_content(self, run_id, content_id):
+            return self.rows.get((run_id, content_id))
+
+    backing = MemoryBacking()
+    registry.attach_backing(backing)
+    handles = [registry.put(page, run_id="backed-run") for page in pages[:3]]
+    assert backing.batches == 0 and registry.for_run("backed-run").get_stats()["pending_items"] == 3
+    assert registry.flush("backed-run") == 3 and backing.batches == 1
+    registry.put(pages[3], run_id="backed-run")
+    registry.release("backed-run")
+    assert backing.batches == 2 and len(backing.rows) == 4
+    assert registry.deref(handles[0]) == pages[0]
+
+    # 为读取重建的存储可以回收，内容仍从后端取回
+    registry.put(pages[0], run_id="run-a")
+    registry.put(pages[0], run_id="run-b")
+    assert registry.get_stats()["runs"] == 2
+    assert registry.deref(handles[1]) == pages[1]
+    print("🧪 内容存储测试通过")
+
+
+if __name__ == "__main__":
+    test_content_store()
@@ -0,0 +1,175 @@
+"""
+编译式域名策略
+将优先域名、排除域名、域名权重和缓存TTL规则编译为按标签倒序的后缀树，
+按完整标签匹配（'.org'不再误匹配x.organic.com），并识别多级公共后缀（eTLD，如edu.cn、co.uk）
+"""
+
+import logging
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional
+from urllib.parse import urlsplit
+
+logger = logging.getLogger(__name__)
+
+# 多级公共后缀（eTLD）：类别标签位于国家代码之前
+MULTI_LABEL_SUFFIXES = {
+    "com.cn", "net.cn", "org.cn", "gov.cn", "edu.cn", "ac.cn",
+    "com.hk", "org.hk", "gov.hk", "edu.hk",
+    "com.tw", "org.tw", "gov.tw", "edu.tw",
+    "co.uk", "org.uk", "gov.uk", "ac.uk", "nhs.uk",
+    "co.jp", "or.jp", "go.jp", "ac.jp",
+    "co.kr", "or.kr", "go.kr", "ac.kr",
+    "com.au", "org.au", "gov.au", "edu.au",
+    "com.sg", "gov.sg", "edu.sg",
+    "co.in", "gov.in", "ac.in",
+    "com.br", "gov.br", "edu.br",
+    "co.nz", "govt.nz", "ac.nz",
+}
+
+# 类别后缀在各国eTLD中的写法（'.gov'同时匹配gov.uk、go.jp等）
+CATEGORY_ALIASES = {
+    "edu": {"edu", "ac"},
+    "gov": {"gov", "go", "govt"},
+    "org": {"org", "or"},
+    "com": {"com", "co"},
+}
+
+_MAX_LOOKUP_CACHE = 50000
+
+
+def normalize_host(url_or_host: str) -> str:
+    """提取小写主机名（去掉端口、www前缀和末尾的点）"""
+    if not url_or_host:
+        return ""
+    value = url_or_host.strip().lower()
+    if "//" in value:
+        try:
+            value = urlsplit(value).hostname or ""
+        except ValueError:
+            return ""
+    else:
+        value = value.split("/", 1)[0].rsplit("@", 1)[-1]
+        if not value.startswith("["):
+            value = value.split(":", 1)[0]
+    value = value.rstrip(".")
+    if value.startswith("www."):
+        value = value[4:]
+    return value
+
+
+def public_suffix(host: str) -> str:
+    """公共后缀（eTLD）：识别常见多级后缀，否则为顶级域"""
+    labels = host.split(".")
+    if len(labels) >= 2 and ".".join(labels[-2:]) in MULTI_LABEL_SUFFIXES:
+        return ".".join(labels[-2:])
+    return labels[-1] if labels else ""
+
+
+def registrable_domain(host: str) -> str:
+    """可注册域名（eTLD+1），如news.bbc.co.uk → bbc.co.uk"""
+    host = normalize_host(host)
+    suffix = public_suffix(host)
+    if not suffix or host == suffix:
+        return host
+    rest = host[:-len(suffix) - 1]
+    return f"{rest.rsplit('.', 1)[-1]}.{suffix}"
+
+
+@dataclass(frozen=True)
+class DomainRule:
+    """域名匹配结果（逐级合并后的属性，越具体的规则优先）"""
+    priority: bool = False
+    excluded: bool = False
+    weight: float = 0.0
+    ttl: Optional[float] = None
+
+
+NO_RULE = DomainRule()
+
+
+class _Node:
+    __slots__ = ("children", "attrs")
+
+    def __init__(self):
+        self.children: Dict[str, "_Node"] = {}
+        self.attrs: Dict[str, Any] = {}
+
+
+class DomainPolicy:
+    """域名后缀树
+
+    规则写法：
+        'github.com'   匹配github.com及其所有子域名
+        '.edu'         类别后缀，匹配以edu结尾的域名，以及对应的国家eTLD（edu.cn、ac.uk等）
+    """
+
+    def __init__(self,
+                 priority: Iterable[str] = (),
+                 excluded: Iterable[str] = (),
+                 weights: Dict[str, float] = None,
+                 ttls: Dict[str, float] = None):
+        self._root = _Node()
+        self._cache: Dict[str, DomainRule] = {}
+        for pattern in priority or ():
+            self.add_rule(pattern, priority=True)
+        for pattern in excluded or ():
+            self.add_rule(pattern, excluded=True)
+        for pattern, weight in (weights or {}).items():
+            self.add_rule(pattern, weight=weight)
+        for pattern, ttl in (ttls or {}).items():
+            self.add_rule(pattern, ttl=ttl)
+
+    def _insert(self, labels: List[str], attrs: Dict[str, Any]):
+        node = self._root
+        for label in reversed(labels):
+            node = node.children.setdefault(label, _Node())
+        node.attrs.update(attrs)
+
+    def add_rule(self, pattern: str, **attrs):
+        """添加规则；attrs为priority/excluded/weight/ttl"""
+        pattern = (pattern or "").strip().lower()
+        is_category = pattern.startswith(".")
+        labels = [label for label in pattern.strip(".").split(".") if label]
+        if not labels:
+            return
+
+        self._insert(labels, attrs)
+        if is_category and len(labels) == 1:
+            # 类别后缀同时作用于国家eTLD（如'.gov' → gov.uk、go.jp）
+            for suffix in MULTI_LABEL_SUFFIXES:
+                category, country = suffix.split(".")
+                if category in CATEGORY_ALIASES.get(labels[0], {labels[0]}):
+                    self._insert([category, country], attrs)
+        self._cache.clear()
+
+    def lookup(self, url_or_host: str) -> DomainRule:
+        """匹配URL或主机名，返回合并后的规则"""
+        host = normalize_host(url_or_host)
+        if not host:
+            return NO_RULE
+
+        rule = self._cache.get(host)
+        if rule is not None:
+            return rule
+
+        merged: Dict[str, Any] = {}
+        node = self._root
+        for label in reversed(host.split(".")):
+            node = node.children.get(label)
+            if node is None:
+                break
+            merged.update(node.attrs)
+
+        rule = DomainRule(**merged) if merged else NO_RULE
+        if len(self._cache) >= _MAX_LOOKUP_CACHE:
+            self._cache.clear()
+        self._cache[host] = rule
+        return rule
+
+    def lookup_many(self, urls: Iterable[str]) -> List[DomainRule]:
+        """批量匹配 - 同一批次中重复的主机只查询一次"""
+        return [self.lookup(url) for url in urls]
+
+    def matches(self, url_or_host: str) -> bool:
+        """是否命中任一规则"""
+        return self.lookup(url_or_host) is not NO_RULE
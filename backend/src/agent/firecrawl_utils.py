@@ -8,14 +8,17 @@ V1.5 Firecrawl集成工具
 from dotenv import load_dotenv
 load_dotenv()
 
-import os
+import math
 import asyncio
 import logging
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Callable, Awaitable
 from dataclasses import dataclass
-import json
-import time
-from urllib.parse import urlparse
+
+from .scrape_engine import scrape_engine, ScrapeProfile, V1_PROFILE
+from .background_loop import background_loop
+from .simhash import SimHashIndex
+from .records import SearchHit, ScrapedDoc
+from .url_utils import extract_domain
 
 logger = logging.getLogger(__name__)
 
@@ -28,291 +31,81 @@ class EnhancementResult:
     enhanced_count: int
     error_message: str = ""
 
-# Firecrawl配置类 - 基于Firesearch最佳实践
-@dataclass
-class FirecrawlConfig:
-    """Firecrawl配置参数"""
-    # 速率限制
-    MAX_CONCURRENT_REQUESTS: int = 2        # 最大并发请求数
-    MAX_SOURCES_TO_SCRAPE: int = 3          # 最多抓取源数量
-    REQUEST_DELAY: float = 1.0              # 请求间延迟(秒)
-    
-    # 重试配置
-    MAX_RETRIES: int = 2                    # 最大重试次数
-    RETRY_DELAY: float = 2.0                # 重试延迟(秒)
-    
-    # 超时配置
-    SCRAPE_TIMEOUT: int = 15                # 抓取超时(秒)
-    BATCH_TIMEOUT: int = 30                 # 批量超时(秒)
-    
-    # 内容限制
-    MIN_CONTENT_LENGTH: int = 100           # 最小内容长度
-    MAX_CONTENT_LENGTH: int = 5000          # 最大内容长度
-    
-    # 质量控制
-    PRIORITY_DOMAINS: List[str] = None      # 优先域名
-    EXCLUDED_DOMAINS: List[str] = None      # 排除域名
-    
-    def __post_init__(self):
-        if self.PRIORITY_DOMAINS is None:
-            self.PRIORITY_DOMAINS = [
-                '.edu', '.gov', '.org',           # 权威机构
-                'wikipedia.org', 'arxiv.org',     # 学术资源
-                'github.com', 'stackoverflow.com' # 技术资源
-            ]
-        
-        if self.EXCLUDED_DOMAINS is None:
-            self.EXCLUDED_DOMAINS = [
-                'twitter.com', 'facebook.com', 'instagram.com',  # 社交媒体
-                'tiktok.com', 'youtube.com',                     # 视频平台
-                'pinterest.com', 'reddit.com'                    # 其他社交
-            ]
+# Firecrawl配置 - V1.5配置档，参数定义见scrape_engine.ScrapeProfile
+FirecrawlConfig = ScrapeProfile
 
 # 全局配置实例
-FIRECRAWL_CONFIG = FirecrawlConfig()
+FIRECRAWL_CONFIG = V1_PROFILE
 
 class SimpleFirecrawlClient:
-    """简化版Firecrawl客户端 - 专为V1.5设计"""
+    """简化版Firecrawl客户端 - 专为V1.5设计，统一抓取引擎上的V1配置档"""
     
-    def __init__(self):
-        self.api_key = os.getenv("FIRECRAWL_API_KEY")
-        self.enabled = bool(self.api_key)
-        self.client = None
-        self.config = FIRECRAWL_CONFIG
-        self.last_request_time = 0  # 用于速率限制
-        
-        if self.enabled:
-            try:
-                # 修复：使用AsyncFirecrawlApp用于异步操作
-                from firecrawl import AsyncFirecrawlApp
-                self.client = AsyncFirecrawlApp(api_key=self.api_key)
-                logger.info("🔥 V1.5 Firecrawl异步客户端初始化成功")
-            except Exception as e:
-                logger.error(f"❌ Firecrawl初始化失败: {e}")
-                self.enabled = False
-                self.client = None
-        else:
-            logger.info("ℹ️ Firecrawl API Key未配置，使用Mock模式")
+    def __init__(self, engine=None, profile: ScrapeProfile = None):
+        self.engine = engine or scrape_engine
+        self.config = profile or FIRECRAWL_CONFIG
     
-    def _extract_domain(self, url: str) -> str:
-        """提取域名"""
-        try:
-            return urlparse(url).netloc.lower()
-        except:
-            return ""
+    @property
+    def enabled(self) -> bool:
+        return self.engine.enabled
     
-    def _is_suitable_for_enhancement(self, url: str) -> bool:
-        """判断URL是否适合增强 - 使用配置化的域名过滤"""
-        if not url:
-            return False
-        
-        domain = self._extract_domain(url)
-        
-        # 检查排除域名
-        for excluded in self.config.EXCLUDED_DOMAINS:
-            if excluded in domain:
-                return False
-        
-        # 检查文件类型排除
-        excluded_extensions = ['.pdf', '.doc', '.docx', '.ppt', '.pptx', '.xls', '.xlsx']
-        if any(url.lower().endswith(ext) for ext in excluded_extensions):
-            return False
-        
-        return True
+    @property
+    def client(self):
+        return self.engine.client
     
-    def _calculate_priority_score(self, url: str) -> float:
-        """计算URL优先级分数"""
-        domain = self._extract_domain(url)
-        score = 0.5  # 基础分数
-        
-        # 优先域名加分
-        for priority in self.config.PRIORITY_DOMAINS:
-            if priority in domain:
-                score += 0.3
-                break
-        
-        # HTTPS加分
-        if url.startswith('https://'):
-            score += 0.1
-        
-        # 避免过长URL
-        if len(url) > 200:
-            score -= 0.2
-        
-        return min(1.0, max(0.0, score))
+    async def _select_priority_urls(self, results: List[Dict], max_count: int = None,
+                              selected_domains: set = None,
+                              fingerprints: SimHashIndex = None,
+                              time_budget: float = None) -> List[str]:
+        """选择优先增强的URLs - 使用引擎的统一选择策略
+        
+        selected_domains: 跨批次共享的已选域名集合（流水线模式），会被更新
+        fingerprints: 跨批次共享的摘要指纹索引（流水线模式），会被更新
+        time_budget: 时间预算(秒)；指定时按预测耗时和价值决定数量，max_count仅作为上限
+        """
+        if time_budget is not None:
+            return await self.engine.aplan_urls(results, self.config, time_budget, max_count=max_count,
+                                                selected_domains=selected_domains,
+                                                fingerprints=fingerprints)
+        return await self.engine.aselect_urls(results, self.config, max_count=max_count,
+                                              selected_domains=selected_domains,
+                                              fingerprints=fingerprints)
     
-    def _select_priority_urls(self, results: List[Dict], max_count: int = None) -> List[str]:
-        """选择优先增强的URLs - 使用配置化的限制"""
-        if max_count is None:
-            max_count = self.config.MAX_SOURCES_TO_SCRAPE
-        
-        # 计算每个URL的优先级分数
-        url_scores = []
-        seen_domains = set()
-        
-        for result in results:
-            # 兼容不同的URL字段名：'url' 或 'link'（Google搜索使用'link'）
-            url = result.get('url') or result.get('link', '')
-            url = url.strip() if url else ''
-            
-            if not url or not self._is_suitable_for_enhancement(url):
-                continue
-            
-            # 域名去重，提高多样性
-            domain = self._extract_domain(url)
-            if domain in seen_domains:
-                continue
-            
-            score = self._calculate_priority_score(url)
-            url_scores.append((url, score, domain))
-            seen_domains.add(domain)
-        
-        # 按分数排序并选择前N个
-        url_scores.sort(key=lambda x: x[1], reverse=True)
-        selected_urls = [url for url, score, domain in url_scores[:max_count]]
-        
-        logger.info(f"📌 从{len(results)}个结果中选择了{len(selected_urls)}个优质URL进行增强")
-        return selected_urls
-    
-    async def _rate_limited_request(self):
-        """实现速率限制"""
-        current_time = time.time()
-        time_since_last = current_time - self.last_request_time
-        
-        if time_since_last < self.config.REQUEST_DELAY:
-            sleep_time = self.config.REQUEST_DELAY - time_since_last
-            logger.debug(f"⏱️ 速率限制：等待 {sleep_time:.1f} 秒")
-            await asyncio.sleep(sleep_time)
-        
-        self.last_request_time = time.time()
-    
-    async def _batch_scrape(self, urls: List[str]) -> List[Dict[str, Any]]:
-        """批量抓取URLs - 使用严格的并发控制"""
+    async def _batch_scrape(self, urls: List[str],
+                            on_page: Callable[[Dict[str, Any], int, int], None] = None,
+                            query: str = "",
+                            deadline: float = None) -> List[Dict[str, Any]]:
+        """批量抓取URLs - 按完成顺序收集成功的结果，批量超时时保留已完成的页面
+        
+        on_page: 每个页面抓取成功后的回调 (页面, 已完成数, 总数)
+        query: 用于从超长页面中抽取相关段落
+        deadline: 批量截止时间(秒)，默认为配置档的BATCH_TIMEOUT
+        """
         results = []
-        
-        # 使用配置化的并发限制
-        semaphore = asyncio.Semaphore(self.config.MAX_CONCURRENT_REQUESTS)
-        
-        async def scrape_single_url(url: str) -> Optional[Dict[str, Any]]:
-            async with semaphore:
+        async for doc in self.engine.iter_scrape(urls, self.config, deadline=deadline, query=query):
+            if not doc.get("success"):
+                continue
+            results.append(doc)
+            if on_page:
                 try:
-                    # 实施速率限制
-                    await self._rate_limited_request()
-                    
-                    logger.info(f"🔄 正在抓取: {self._extract_domain(url)}")
-                    
-                    # 使用配置化的参数
-                    scrape_kwargs = {
-                        "formats": ["markdown"],
-                        "only_main_content": True,
-                        "timeout": self.config.SCRAPE_TIMEOUT * 1000  # 转换为毫秒
-                    }
-                    
-                    # 修复：正确调用AsyncFirecrawlApp
-                    content = await asyncio.wait_for(
-                        self.client.scrape_url(url, **scrape_kwargs),
-                        timeout=self.config.SCRAPE_TIMEOUT
-                    )
-                    
-                    # 修复：正确处理AsyncFirecrawlApp的响应格式
-                    if content:
-                        # 检查是否是 ScrapeResponse 对象
-                        if hasattr(content, 'success') and hasattr(content, 'markdown'):
-                            if content.success and content.markdown:
-                                markdown_text = content.markdown.strip()
-                                
-                                # 内容长度检查
-                                if len(markdown_text) < self.config.MIN_CONTENT_LENGTH:
-                                    logger.warning(f"⚠️ 内容过短: {self._extract_domain(url)} ({len(markdown_text)} 字符)")
-                                    return None
-                                
-                                # 截断过长内容
-                                if len(markdown_text) > self.config.MAX_CONTENT_LENGTH:
-                                    markdown_text = markdown_text[:self.config.MAX_CONTENT_LENGTH] + "..."
-                                    logger.info(f"✂️ 内容截断: {self._extract_domain(url)} (限制为 {self.config.MAX_CONTENT_LENGTH} 字符)")
-                                
-                                logger.info(f"✅ 成功抓取: {self._extract_domain(url)} ({len(markdown_text)} 字符)")
-                                
-                                # 获取元数据
-                                metadata = getattr(content, 'metadata', {}) or {}
-                                title = metadata.get('title', '') if isinstance(metadata, dict) else ''
-                                
-                                return {
-                                    "url": url,
-                                    "content": markdown_text,
-                                    "title": title or f"Content from {self._extract_domain(url)}",
-                                    "word_count": len(markdown_text.split()),
-                                    "extraction_time": time.time(),
-                                    "metadata": metadata
-                                }
-                            else:
-                                logger.warning(f"⚠️ 抓取失败: {self._extract_domain(url)} - success: {getattr(content, 'success', False)}")
-                                return None
-                        # 兼容字典格式返回
-                        elif isinstance(content, dict) and content.get('markdown'):
-                            markdown_text = content['markdown'].strip()
-                            
-                            # 内容长度检查
-                            if len(markdown_text) < self.config.MIN_CONTENT_LENGTH:
-                                logger.warning(f"⚠️ 内容过短: {self._extract_domain(url)} ({len(markdown_text)} 字符)")
-                                return None
-                            
-                            # 截断过长内容
-                            if len(markdown_text) > self.config.MAX_CONTENT_LENGTH:
-                                markdown_text = markdown_text[:self.config.MAX_CONTENT_LENGTH] + "..."
-                                logger.info(f"✂️ 内容截断: {self._extract_domain(url)} (限制为 {self.config.MAX_CONTENT_LENGTH} 字符)")
-                            
-                            logger.info(f"✅ 成功抓取: {self._extract_domain(url)} ({len(markdown_text)} 字符)")
-                            
-                            return {
-                                "url": url,
-                                "content": markdown_text,
-                                "title": content.get('metadata', {}).get('title', '') or f"Content from {self._extract_domain(url)}",
-                                "word_count": len(markdown_text.split()),
-                                "extraction_time": time.time(),
-                                "metadata": content.get('metadata', {})
-                            }
-                        else:
-                            logger.warning(f"⚠️ 无有效内容: {self._extract_domain(url)}")
-                            return None
-                    else:
-                        logger.warning(f"⚠️ 无响应: {self._extract_domain(url)}")
-                        return None
-                        
-                except asyncio.TimeoutError:
-                    logger.warning(f"⏰ 抓取超时: {self._extract_domain(url)}")
-                    return None
+                    on_page(doc, len(results), len(urls))
                 except Exception as e:
-                    logger.error(f"❌ 抓取失败: {self._extract_domain(url)} - {str(e)}")
-                    return None
-        
-        # 并发执行抓取任务
-        tasks = [scrape_single_url(url) for url in urls]
-        
-        try:
-            completed_results = await asyncio.wait_for(
-                asyncio.gather(*tasks, return_exceptions=True),
-                timeout=self.config.BATCH_TIMEOUT
-            )
-            
-            # 过滤有效结果
-            for result in completed_results:
-                if isinstance(result, dict) and result:
-                    results.append(result)
-                elif isinstance(result, Exception):
-                    logger.error(f"❌ 任务异常: {result}")
-            
-        except asyncio.TimeoutError:
-            logger.error(f"⏰ 批量抓取超时 ({self.config.BATCH_TIMEOUT}秒)")
-        
+                    logger.warning(f"⚠️ 页面回调失败: {e}")
         return results
     
     async def enhance_search_results(self, 
                                    search_results: List[Dict], 
-                                   max_enhance: int = 3) -> EnhancementResult:
-        """增强搜索结果 - V1.5核心功能"""
-        
-        if not self.enabled or not self.client:
+                                   max_enhance: int = None,
+                                   on_page: Callable[[Dict[str, Any], int, int], None] = None,
+                                   query: str = "",
+                                   time_budget: float = None) -> EnhancementResult:
+        """增强搜索结果 - V1.5核心功能
+        
+        on_page: 每个页面抓取完成后立即调用，用于流式进度展示
+        query: 用户查询，超长页面按其抽取最相关的段落
+        time_budget: 时间预算(秒)；按预测耗时和价值决定抓取数量，到期返回已完成的页面
+        """
+        
+        if not self.enabled:
             logger.info("ℹ️ Firecrawl未启用，跳过内容增强")
             return EnhancementResult(
                 success=False,
@@ -325,7 +118,9 @@ class SimpleFirecrawlClient:
         logger.info(f"🔍 开始增强 {len(search_results)} 条搜索结果")
         
         # 选择优质URLs进行增强
-        priority_urls = self._select_priority_urls(search_results, max_enhance)
+        if max_enhance is None and time_budget is None:
+            max_enhance = self.config.MAX_SOURCES_TO_SCRAPE
+        priority_urls = await self._select_priority_urls(search_results, max_enhance, time_budget=time_budget)
         
         if not priority_urls:
             logger.info("ℹ️ 未找到适合增强的URL")
@@ -340,7 +135,8 @@ class SimpleFirecrawlClient:
         logger.info(f"📥 选择 {len(priority_urls)} 个URL进行深度抓取")
         
         # 并行抓取内容
-        enhanced_content = await self._batch_scrape(priority_urls)
+        enhanced_content = await self._batch_scrape(priority_urls, on_page=on_page, query=query,
+                                                    deadline=time_budget)
         
         if not enhanced_content:
             logger.warning("⚠️ 所有URL增强都失败了")
@@ -366,74 +162,190 @@ class SimpleFirecrawlClient:
             enhanced_count=len(enhanced_content)
         )
     
+    async def stream_search_and_enhance(self,
+                                        queries: List[str],
+                                        search_func: Callable[[int, str], List[Dict]],
+                                        on_results: Callable[[int, str, List[Dict], List[Dict]], None] = None,
+                                        max_enhance: int = None,
+                                        collected: List[Dict] = None,
+                                        query: str = "",
+                                        time_budget: float = None) -> EnhancementResult:
+        """搜索-抓取流水线 - 每个查询完成后结果立即通过异步队列进入URL选择和抓取
+        
+        search_func: 同步搜索函数 (序号, 查询) -> 结果列表，在线程池中执行
+        on_results: 每个查询完成后的回调 (序号, 查询, 本次结果, 累计结果)
+        collected: 可选的累计结果列表，流水线中途失败时调用方仍能拿到已完成的搜索结果
+        query: 用户查询，超长页面按其抽取最相关的段落
+        time_budget: 抓取时间预算(秒)，从第一批搜索结果到达时开始计时；每批按剩余预算规划抓取数量
+        """
+        if max_enhance is None:
+            max_enhance = (self.engine.budget.config["max_urls"] if time_budget is not None
+                           else self.config.MAX_SOURCES_TO_SCRAPE)
+        if collected is None:
+            collected = []
+        
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        
+        async def producer():
+            for i, query in enumerate(queries, 1):
+                try:
+                    results = await loop.run_in_executor(None, search_func, i, query)
+                except Exception as e:
+                    logger.error(f"❌ 搜索失败: {query[:50]} - {e}")
+                    results = []
+                collected.extend(results)
+                if on_results:
+                    on_results(i, query, results, collected)
+                await queue.put(results)
+            await queue.put(None)
+        
+        async def consumer():
+            scrape_tasks = []
+            selected_domains = set()
+            fingerprints = SimHashIndex()
+            remaining = max_enhance
+            batches_left = len(queries)
+            deadline = None
+            
+            while True:
+                batch = await queue.get()
+                if batch is None:
+                    break
+                
+                # 剩余抓取名额在剩余批次间均摊，未用完的名额顺延到后续批次
+                quota = math.ceil(remaining / batches_left) if batches_left else remaining
+                batches_left -= 1
+                if not self.enabled or remaining <= 0 or not batch:
+                    continue
+                
+                time_left = None
+                if time_budget is not None:
+                    if deadline is None:
+                        deadline = loop.time() + time_budget
+                    time_left = deadline - loop.time()
+                    if time_left <= 0:
+                        logger.info("⏳ 流水线: 抓取时间预算已用完，后续批次不再抓取")
+                        continue
+                
+                urls = await self._select_priority_urls(batch, quota, selected_domains=selected_domains,
+                                                        fingerprints=fingerprints, time_budget=time_left)
+                remaining -= len(urls)
+                if urls:
+                    logger.info(f"📥 流水线: 立即抓取 {len(urls)} 个URL (剩余名额 {remaining})")
+                    scrape_tasks.append(asyncio.create_task(
+                        self._batch_scrape(urls, query=query, deadline=time_left)
+                    ))
+            
+            scraped = []
+            for batch_result in await asyncio.gather(*scrape_tasks, return_exceptions=True):
+                if isinstance(batch_result, list):
+                    scraped.extend(batch_result)
+                elif isinstance(batch_result, Exception):
+                    logger.error(f"❌ 抓取批次异常: {batch_result}")
+            return scraped, len(selected_domains)
+        
+        _, (enhanced_content, selected_count) = await asyncio.gather(producer(), consumer())
+        
+        if not self.enabled:
+            return EnhancementResult(
+                success=False,
+                enhanced_results=list(collected),
+                original_count=len(collected),
+                enhanced_count=0,
+                error_message="Firecrawl未启用"
+            )
+        
+        if not selected_count:
+            return EnhancementResult(
+                success=True,
+                enhanced_results=list(collected),
+                original_count=len(collected),
+                enhanced_count=0,
+                error_message="未找到适合增强的URL"
+            )
+        
+        if not enhanced_content:
+            logger.warning("⚠️ 所有URL增强都失败了")
+            return EnhancementResult(
+                success=False,
+                enhanced_results=list(collected),
+                original_count=len(collected),
+                enhanced_count=0,
+                error_message="所有URL增强都失败"
+            )
+        
+        enhanced_results = self._merge_enhanced_content(collected, enhanced_content)
+        logger.info(f"✅ 流水线成功增强 {len(enhanced_content)} 条内容")
+        
+        return EnhancementResult(
+            success=True,
+            enhanced_results=enhanced_results,
+            original_count=len(collected),
+            enhanced_count=len(enhanced_content)
+        )
+    
     def _merge_enhanced_content(self, 
                               original_results: List[Dict], 
                               enhanced_content: List[Dict]) -> List[Dict]:
-        """合并增强内容到原始结果"""
-        enhanced_urls = {item['url'] for item in enhanced_content}
+        """合并增强内容到原始结果 - 入口规范化为SearchHit/ScrapedDoc，按规范化URL一次查找，出口转回dict"""
+        docs = {}
+        for item in enhanced_content:
+            doc = ScrapedDoc.from_dict(item)
+            docs.setdefault(doc.key, doc)
         
         merged_results = []
         
-        # 添加增强后的结果
+        # 添加增强后的结果（记录是新对象，不修改原始数据）
         for result in original_results:
-            result_copy = result.copy()  # 避免修改原始数据
+            hit = SearchHit.from_dict(result)
+            doc = docs.get(hit.key) if hit.url else None
+            if doc:
+                # 合并内容
+                original_content = hit.content or hit.snippet
+                
+                # 构建增强后的内容
+                if original_content:
+                    hit.content = f"{original_content}\n\n**🔥 深度内容分析:**\n{doc.content}"
+                else:
+                    hit.content = f"**🔥 深度内容分析:**\n{doc.content}"
+                
+                # 添加增强标记
+                hit.is_enhanced = True
+                hit.enhancement_source = 'firecrawl'
+                hit.extra = {
+                    **(hit.extra or {}),
+                    'original_length': len(original_content),
+                    'enhanced_length': len(doc.content)
+                }
+                
+                logger.info(f"🔗 已增强: {extract_domain(doc.url) or 'unknown'} (+{len(doc.content)} 字符)")
             
-            # 兼容不同的URL字段名
-            result_url = result.get('url') or result.get('link', '')
-            
-            if result_url in enhanced_urls:
-                # 找到对应的增强内容
-                enhanced = next(
-                    (item for item in enhanced_content if item['url'] == result_url), 
-                    None
-                )
-                if enhanced:
-                    # 合并内容
-                    original_content = result_copy.get('content', result_copy.get('snippet', ''))
-                    enhanced_text = enhanced['content']
-                    
-                    # 构建增强后的内容
-                    if original_content:
-                        result_copy['content'] = f"{original_content}\n\n**🔥 深度内容分析:**\n{enhanced_text}"
-                    else:
-                        result_copy['content'] = f"**🔥 深度内容分析:**\n{enhanced_text}"
-                    
-                    # 统一URL字段（如果原来是'link'，也添加'url'字段）
-                    if not result_copy.get('url') and result_copy.get('link'):
-                        result_copy['url'] = result_copy['link']
-                    
-                    # 添加增强标记
-                    result_copy['enhanced'] = True
-                    result_copy['enhancement_source'] = 'firecrawl'
-                    result_copy['original_length'] = len(original_content)
-                    result_copy['enhanced_length'] = len(enhanced_text)
-                    
-                    logger.info(f"🔗 已增强: {enhanced.get('domain', 'unknown')} (+{len(enhanced_text)} 字符)")
-            
-            merged_results.append(result_copy)
+            # V1增强结果直接返回给快速搜索API和V1流程，保留旧键名
+            merged_results.append(hit.to_dict(aliases=True))
         
         return merged_results
 
+def _run_coroutine_sync(coro_factory: Callable[[], Awaitable[Any]], timeout: float) -> Any:
+    """在同步上下文中执行协程 - 提交到长期运行的后台事件循环，复用抓取引擎的连接"""
+    return background_loop.run(coro_factory, timeout=timeout)
+
 # 同步包装器，适配V1的同步调用模式
-def enhance_search_results_sync(search_results: List[Dict], max_enhance: int = 3) -> EnhancementResult:
+def _outer_timeout(time_budget: float = None) -> float:
+    """外层等待超时：有时间预算时在预算基础上留出余量，否则45秒"""
+    return time_budget + 10 if time_budget is not None else 45
+
+def enhance_search_results_sync(search_results: List[Dict], max_enhance: int = None,
+                                on_page: Callable[[Dict[str, Any], int, int], None] = None,
+                                query: str = "",
+                                time_budget: float = None) -> EnhancementResult:
     """同步版本的搜索结果增强 - 适配V1的同步调用"""
     try:
-        # 检查是否在异步环境中
-        try:
-            loop = asyncio.get_running_loop()
-            # 如果已有事件循环，使用线程池执行
-            import concurrent.futures
-            with concurrent.futures.ThreadPoolExecutor() as executor:
-                future = executor.submit(
-                    asyncio.run, 
-                    firecrawl_client.enhance_search_results(search_results, max_enhance)
-                )
-                return future.result(timeout=45)  # 45秒总超时
-        except RuntimeError:
-            # 没有运行中的事件循环，直接运行
-            return asyncio.run(
-                firecrawl_client.enhance_search_results(search_results, max_enhance)
-            )
+        return _run_coroutine_sync(
+            lambda: firecrawl_client.enhance_search_results(search_results, max_enhance, on_page, query,
+                                                            time_budget=time_budget),
+            timeout=_outer_timeout(time_budget)
+        )
     except Exception as e:
         logger.error(f"❌ 同步增强失败: {e}")
         return EnhancementResult(
@@ -441,7 +353,54 @@ def enhance_search_results_sync(search_results: List[Dict], max_enhance: int = 3
             enhanced_results=search_results,
             original_count=len(search_results),
             enhanced_count=0,
-            error_message=str(e)
+            error_message=str(e) or type(e).__name__
+        )
+
+async def enhance_search_results_async(search_results: List[Dict], max_enhance: int = None,
+                                      query: str = "",
+                                      time_budget: float = None) -> EnhancementResult:
+    """异步版本的搜索结果增强 - 在后台事件循环上执行，供异步调用方（如快速搜索API）使用"""
+    try:
+        return await background_loop.run_async(
+            lambda: firecrawl_client.enhance_search_results(search_results, max_enhance, query=query,
+                                                            time_budget=time_budget),
+            timeout=_outer_timeout(time_budget)
+        )
+    except Exception as e:
+        logger.error(f"❌ 异步增强失败: {e}")
+        return EnhancementResult(
+            success=False,
+            enhanced_results=search_results,
+            original_count=len(search_results),
+            enhanced_count=0,
+            error_message=str(e) or type(e).__name__
+        )
+
+def stream_search_and_enhance_sync(queries: List[str],
+                                   search_func: Callable[[int, str], List[Dict]],
+                                   on_results: Callable[[int, str, List[Dict], List[Dict]], None] = None,
+                                   max_enhance: int = None,
+                                   timeout: float = 120,
+                                   query: str = "",
+                                   time_budget: float = None) -> EnhancementResult:
+    """同步版本的搜索-抓取流水线 - 失败时返回已完成的搜索结果"""
+    collected: List[Dict] = []
+    try:
+        return _run_coroutine_sync(
+            lambda: firecrawl_client.stream_search_and_enhance(
+                queries, search_func, on_results, max_enhance, collected=collected, query=query,
+                time_budget=time_budget
+            ),
+            timeout=timeout
+        )
+    except Exception as e:
+        logger.error(f"❌ 搜索-抓取流水线失败: {e}")
+        return EnhancementResult(
+            success=False,
+            enhanced_results=list(collected),
+            original_count=len(collected),
+            enhanced_count=0,
+            error_message=str(e) or type(e).__name__
         )
 
 # 全局实例
@@ -7,8 +7,11 @@ from langgraph.graph import StateGraph, END
 from .state import ResearchState
 from .prompts import GENERATE_QUERIES_PROMPT, REFLECT_PROMPT, GENERATE_REPORT_PROMPT
 from .tools import google_web_search
-from .config import get_max_cycles, should_force_completion, SEARCH_CONFIG
-from .firecrawl_utils import enhance_search_results_sync, EnhancementResult
+from .config import get_max_cycles, should_force_completion, SEARCH_CONFIG, PIPELINE_CONFIG
+from .ranking import rank_results
+from .simhash import fold_near_duplicates
+from .firecrawl_utils import enhance_search_results_sync, stream_search_and_enhance_sync, EnhancementResult
+from .scrape_engine import scrape_engine, V1_PROFILE
 
 # --- Custom Gemini API Caller ---
 
@@ -194,8 +197,7 @@ def web_search_node(state: ResearchState) -> ResearchState:
     queries = state["search_queries"]
     all_results = []
     
-    # 逐个执行搜索查询，提供详细的子任务展示
-    for i, query in enumerate(queries, 1):
+    def search_one(i: int, query: str) -> list:
         # 显示当前正在搜索的具体内容
         search_info = {
             "type": "step_progress",
@@ -210,9 +212,13 @@ def web_search_node(state: ResearchState) -> ResearchState:
         
         print(f"INFO: Performing web search for: '{query[:50]}{'...' if len(query) > 50 else ''}'")
         results = google_web_search([query], num_results=5)
-        all_results.extend(results)
         print(f"INFO: Found {len(results)} results for query '{query[:50]}{'...' if len(query) > 50 else ''}'.")
-        
+        # 高置信度的靠前结果在后台提前抓取到页面缓存（需开启SPECULATIVE_PREFETCH_ENABLED）
+        if state.get("enhancement_enabled", True):
+            scrape_engine.prefetcher.observe(results, V1_PROFILE)
+        return results
+    
+    def report_results(i: int, query: str, results: list, collected: list):
         # 显示找到的资源
         if results:
             resource_info = {
@@ -220,7 +226,7 @@ def web_search_node(state: ResearchState) -> ResearchState:
                 "step": "information-gathering", 
                 "title": "发现优质资源",
                 "description": f"在 {query[:40]}{'...' if len(query) > 40 else ''} 中找到 {len(results)} 条资料",
-                "current_task": f"已收集: {len(all_results)} 条研究资料",
+                "current_task": f"已收集: {len(collected)} 条研究资料",
                 "resources_found": [
                     f"• {result.get('title', '未知标题')[:50]}{'...' if len(result.get('title', '')) > 50 else ''}"
                     for result in results[:3]  # 只显示前3个
@@ -229,6 +235,30 @@ def web_search_node(state: ResearchState) -> ResearchState:
             }
             print(f"STEP_INFO: {json.dumps(resource_info, ensure_ascii=False)}")
     
+    # V1.5流水线：每个查询的结果立即进入URL选择和抓取，与后续搜索重叠执行
+    stream_enhancement = (
+        state.get("enhancement_enabled", True) and
+        state.get("stream_enhancement", PIPELINE_CONFIG["stream_search_to_scrape"])
+    )
+    
+    if stream_enhancement:
+        enhancement_result = stream_search_and_enhance_sync(
+            queries,
+            search_one,
+            on_results=report_results,
+            max_enhance=PIPELINE_CONFIG["max_enhance"],
+            timeout=PIPELINE_CONFIG["pipeline_timeout"],
+            time_budget=PIPELINE_CONFIG["enhance_budget"],
+            query=f"{state['user_query']} {state.get('task_description', '')}".strip()
+        )
+        all_results = enhancement_result.enhanced_results
+    else:
+        # 逐个执行搜索查询，提供详细的子任务展示
+        for i, query in enumerate(queries, 1):
+            results = search_one(i, query)
+            all_results.extend(results)
+            report_results(i, query, results, all_results)
+    
     print(f"搜索到 {len(all_results)} 条结果")
     
     # Send step complete signal - 用户友好版本
@@ -244,7 +274,21 @@ def web_search_node(state: ResearchState) -> ResearchState:
     }
     print(f"STEP_INFO: {json.dumps(complete_info, ensure_ascii=False)}")
     
-    return {**state, "search_results": all_results}
+    if stream_enhancement:
+        # 增强已在流水线中完成，由content_enhancement节点汇报统计
+        return {
+            **state,
+            "search_results": all_results,
+            "enhancement_prefetched": True,
+            "enhancement_stats": {
+                "original_count": enhancement_result.original_count,
+                "enhanced_count": enhancement_result.enhanced_count,
+                "success": enhancement_result.success,
+                "error_message": enhancement_result.error_message
+            }
+        }
+    
+    return {**state, "search_results": all_results, "enhancement_prefetched": False}
 
 def content_enhancement_node(state: ResearchState) -> ResearchState:
     """
@@ -311,11 +355,37 @@ def content_enhancement_node(state: ResearchState) -> ResearchState:
         }
         print(f"STEP_INFO: {json.dumps(processing_info, ensure_ascii=False)}")
         
-        # 调用同步增强函数
-        enhancement_result = enhance_search_results_sync(
-            search_results, 
-            max_enhance=3  # 最多增强3个结果
-        )
+        prefetched_stats = state.get("enhancement_stats") or {}
+        if state.get("enhancement_prefetched") and prefetched_stats:
+            # 搜索阶段的流水线已完成抓取，直接使用其结果
+            enhancement_result = EnhancementResult(
+                success=prefetched_stats.get("success", False),
+                enhanced_results=search_results,
+                original_count=prefetched_stats.get("original_count", len(search_results)),
+                enhanced_count=prefetched_stats.get("enhanced_count", 0),
+                error_message=prefetched_stats.get("error_message", "")
+            )
+        else:
+            def report_page(page, done, total):
+                # 每篇页面抓取完成即推送进度，不等待整批结束
+                page_info = {
+                    "type": "step_progress",
+                    "step": "content-enhancement",
+                    "title": "📖 深度分析文献",
+                    "description": f"已完成 {done}/{total} 篇文献的深度抓取",
+                    "current_task": f"• 已获取: {page.get('title', '未知标题')[:50]}",
+                    "user_friendly": True
+                }
+                print(f"STEP_INFO: {json.dumps(page_info, ensure_ascii=False)}")
+            
+            # 调用同步增强函数
+            enhancement_result = enhance_search_results_sync(
+                search_results, 
+                max_enhance=PIPELINE_CONFIG["max_enhance"],  # 数量上限，实际按时间预算决定
+                on_page=report_page,
+                time_budget=PIPELINE_CONFIG["enhance_budget"],
+                query=f"{state['user_query']} {state.get('task_description', '')}".strip()
+            )
         
         # 显示处理完成的资源
         if enhancement_result.enhanced_count > 0:
@@ -454,9 +524,14 @@ def reflect_node(state: ResearchState) -> ResearchState:
         print(f"STEP_INFO: {json.dumps(complete_info, ensure_ascii=False)}")
         return {**state, "critique": f"已完成{current_cycle}轮研究，信息充足", "is_complete": True}
     
-    # 限制用于反思的结果数量
-    reflection_limit = SEARCH_CONFIG.get("results_for_reflection", 7)
-    top_results_for_reflection = all_results[:reflection_limit]
+    # 限制用于反思的结果数量（先折叠近重复结果，避免转载内容占用名额）
+    reflection_limit = SEARCH_CONFIG.get("results_for_reflection", 5)
+    top_results_for_reflection = rank_results(
+        fold_near_duplicates(all_results),
+        state["user_query"],
+        top_k=reflection_limit,
+        context=state.get("task_description", "")
+    )
     
     prompt = REFLECT_PROMPT.format(
         user_query=state["user_query"],
@@ -563,7 +638,8 @@ def generate_fallback_report(state: ResearchState) -> str:
     # 如果有搜索结果，添加摘要
     if search_results:
         report += "\n基于收集的资料，我们发现以下关键信息：\n\n"
-        for i, result in enumerate(search_results[:5], 1):  # 只显示前5条
+        top_results = rank_results(search_results, user_query, top_k=5)  # 只显示最相关的5条
+        for i, result in enumerate(top_results, 1):
             title = result.get('title', '未知标题')
             url = result.get('url', '')
             report += f"{i}. **{title}**\n"
@@ -611,9 +687,11 @@ def generate_report_node(state: ResearchState) -> ResearchState:
     }
     print(f"STEP_INFO: {json.dumps(step_info, ensure_ascii=False)}")
     
+    # 转载/镜像的近重复内容只保留一份写入提示词
+    report_results = fold_near_duplicates(state["search_results"])
     prompt = GENERATE_REPORT_PROMPT.format(
         user_query=state["user_query"],
-        search_results=json.dumps(state["search_results"], indent=2)
+        search_results=json.dumps(report_results, indent=2)
     )
 
     try:
@@ -684,10 +762,11 @@ def should_continue(state: ResearchState) -> str:
 
 # --- GRAPH ASSEMBLY ---
 
-def build_graph():
+def build_graph(checkpointer=None):
     """
     Builds and compiles the LangGraph research agent.
     V1.5: 添加了内容增强节点
+    checkpointer: 可选的检查点存储（见agent.checkpointer），启用后运行必须指定thread_id
     """
     workflow = StateGraph(ResearchState)
 
@@ -713,7 +792,7 @@ def build_graph():
     
     workflow.add_edge("generate_report", END)
 
-    app = workflow.compile()
+    app = workflow.compile(checkpointer=checkpointer)
     print("--- V1.5研究流程图已编译完成 (包含Firecrawl增强) ---")
     return app
 
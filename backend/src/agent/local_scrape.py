@@ -0,0 +1,546 @@
+"""
+本地抓取与正文抽取引擎
+Firecrawl不可用或抓取失败（限流、5xx）时的降级路径，也可按域名作为更便宜、更快的抓取方式：
+httpx异步连接池抓取（按主机限流、大小上限、字符集处理），
+正文抽取和HTML转markdown在进程池中执行，不阻塞事件循环。
+抓取在本机发起，每一跳（含重定向）都只允许http/https和公网地址，搜索结果不能把请求引向内网
+"""
+
+import asyncio
+import ipaddress
+import logging
+import re
+import socket
+import threading
+import weakref
+from concurrent.futures import ProcessPoolExecutor
+from html import unescape
+from html.parser import HTMLParser
+from typing import Dict, Any, List, Optional, Tuple
+from urllib.parse import urljoin, urlsplit
+
+import httpx
+
+from .config import LOCAL_SCRAPE_CONFIG
+from .url_utils import extract_domain
+from .domain_policy import DomainPolicy
+
+logger = logging.getLogger(__name__)
+
+
+class LocalFetchError(Exception):
+    """本地抓取失败；错误信息包含状态码，便于失败分类"""
+
+
+_ALLOWED_SCHEMES = ("http", "https")
+
+
+def is_public_address(address: str) -> bool:
+    """是否为公网地址（回环、私有、链路本地/云元数据、保留和组播地址都不是）"""
+    ip = ipaddress.ip_address(address.split("%", 1)[0])
+    if isinstance(ip, ipaddress.IPv6Address) and ip.ipv4_mapped is not None:
+        ip = ip.ipv4_mapped
+    return ip.is_global and not ip.is_multicast
+
+
+# ===== 正文抽取（在子进程中运行，需保持为模块级纯函数） =====
+
+# 整体丢弃的标签（含内容）
+_DROP_TAGS = {"script", "style", "noscript", "template", "svg", "canvas", "iframe",
+              "nav", "header", "footer", "aside", "form", "button", "select", "option"}
+# 块级标签：结束时换段
+_BLOCK_TAGS = {"p", "div", "section", "article", "main", "table", "tr", "blockquote",
+               "figure", "figcaption", "dl", "dd", "dt", "ul", "ol", "body"}
+_VOID_TAGS = {"br", "hr", "img", "input", "meta", "link", "source", "wbr", "area", "col", "embed"}
+# class/id 中出现这些词的元素视为页面框架
+_BOILERPLATE_RE = re.compile(
+    r"(^|[\s_-])(nav|navbar|menu|footer|header|sidebar|breadcrumb|cookie|banner|advert|ads?|"
+    r"share|social|comment|related|subscribe|popup|modal)([\s_-]|$)",
+    re.IGNORECASE
+)
+_META_CHARSET_RE = re.compile(rb"""<meta[^>]+charset\s*=\s*["']?\s*([a-zA-Z0-9_.:-]+)""", re.IGNORECASE)
+
+
+class _MarkdownExtractor(HTMLParser):
+    """HTML → markdown：跳过页面框架，记录 <main>/<article> 范围"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.out: List[str] = []
+        self.title = ""
+        self.description = ""
+        self._stack: List[Tuple[str, bool]] = []   # (标签, 是否被丢弃)
+        self._skip_depth = 0
+        self._in_title = False
+        self._list_stack: List[str] = []
+        self._in_pre = False
+        self._link_href: Optional[str] = None
+        self.main_ranges: List[List[int]] = []     # <main>/<article> 在out中的范围
+        self._main_depth = 0
+
+    def _emit(self, text: str):
+        if self._skip_depth == 0:
+            self.out.append(text)
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == "meta":
+            name = (attrs.get("name") or attrs.get("property") or "").lower()
+            if name in ("description", "og:description") and not self.description:
+                self.description = (attrs.get("content") or "").strip()
+            return
+        if tag == "title":
+            self._in_title = True
+            return
+        if tag in _VOID_TAGS:
+            if tag == "br":
+                self._emit("\n")
+            elif tag == "hr":
+                self._emit("\n\n---\n\n")
+            return
+
+        marker = f"{attrs.get('class') or ''} {attrs.get('id') or ''} {attrs.get('role') or ''}"
+        dropped = tag in _DROP_TAGS or (
+            tag not in ("main", "article", "body", "html") and bool(_BOILERPLATE_RE.search(marker))
+        )
+        self._stack.append((tag, dropped))
+        if dropped:
+            self._skip_depth += 1
+            return
+
+        if tag in ("main", "article"):
+            if self._main_depth == 0:
+                self.main_ranges.append([len(self.out), -1])
+            self._main_depth += 1
+        if tag in ("h1", "h2", "h3", "h4", "h5", "h6"):
+            self._emit("\n\n" + "#" * int(tag[1]) + " ")
+        elif tag in ("ul", "ol"):
+            self._list_stack.append(tag)
+            self._emit("\n")
+        elif tag == "li":
+            indent = "  " * max(0, len(self._list_stack) - 1)
+            bullet = "1." if self._list_stack and self._list_stack[-1] == "ol" else "-"
+            self._emit(f"\n{indent}{bullet} ")
+        elif tag == "pre":
+            self._in_pre = True
+            self._emit("\n\n```\n")
+        elif tag == "code" and not self._in_pre:
+            self._emit("`")
+        elif tag in ("strong", "b"):
+            self._emit("**")
+        elif tag in ("em", "i"):
+            self._emit("*")
+        elif tag == "a":
+            href = attrs.get("href") or ""
+            self._link_href = href if href.startswith("http") else None
+            if self._link_href:
+                self._emit("[")
+        elif tag in ("td", "th"):
+            self._emit(" | ")
+        elif tag in _BLOCK_TAGS:
+            self._emit("\n\n")
+
+    def handle_endtag(self, tag):
+        if tag == "title":
+            self._in_title = False
+            return
+        if tag in _VOID_TAGS:
+            return
+
+        # 容错：关闭到最近的同名标签
+        while self._stack:
+            open_tag, dropped = self._stack.pop()
+            if dropped:
+                self._skip_depth -= 1
+            elif open_tag in ("main", "article"):
+                self._main_depth -= 1
+                if self._main_depth == 0 and self.main_ranges:
+                    self.main_ranges[-1][1] = len(self.out)
+            if open_tag == tag:
+                break
+        else:
+            return
+
+        if self._skip_depth:
+            return
+        if tag in ("h1", "h2", "h3", "h4", "h5", "h6"):
+            self._emit("\n\n")
+        elif tag in ("ul", "ol"):
+            if self._list_stack:
+                self._list_stack.pop()
+            self._emit("\n")
+        elif tag == "pre":
+            self._in_pre = False
+            self._emit("\n```\n\n")
+        elif tag == "code" and not self._in_pre:
+            self._emit("`")
+        elif tag in ("strong", "b"):
+            self._emit("**")
+        elif tag in ("em", "i"):
+            self._emit("*")
+        elif tag == "a":
+            if self._link_href:
+                self._emit(f"]({self._link_href})")
+            self._link_href = None
+        elif tag in _BLOCK_TAGS:
+            self._emit("\n\n")
+
+    def handle_data(self, data):
+        if self._in_title:
+            self.title += data
+            return
+        if self._skip_depth:
+            return
+        if self._in_pre:
+            self.out.append(data)
+        else:
+            self._emit(re.sub(r"\s+", " ", data))
+
+
+def _normalize_markdown(text: str) -> str:
+    lines = [line.rstrip() for line in text.split("\n")]
+    text = "\n".join(lines)
+    text = re.sub(r"[ \t]+\n", "\n", text)
+    text = re.sub(r"\n{3,}", "\n\n", text)
+    # 去掉只剩标记符号的空行
+    text = re.sub(r"^\s*(\*\*|\*|`|\||-|#+)\s*$", "", text, flags=re.MULTILINE)
+    return re.sub(r"\n{3,}", "\n\n", text).strip()
+
+
+def _link_density(text: str) -> float:
+    link_text = sum(len(match) for match in re.findall(r"\[([^\]]*)\]\(", text))
+    return link_text / max(len(text), 1)
+
+
+def html_to_markdown(html: str, url: str = "") -> Dict[str, Any]:
+    """
+    抽取正文并转换为markdown（可在子进程中执行）
+
+    优先使用 <main>/<article> 范围；否则去掉链接密度过高的段落（导航、目录、推荐列表）
+
+    Returns:
+        dict: markdown, title, description
+    """
+    parser = _MarkdownExtractor()
+    try:
+        parser.feed(html)
+        parser.close()
+    except Exception as e:
+        logger.debug(f"HTML解析异常: {url} - {e}")
+
+    pieces = parser.out
+    ranges = [(start, end if end >= 0 else len(pieces)) for start, end in parser.main_ranges]
+    main_text = "".join("".join(pieces[start:end]) for start, end in ranges)
+    full_text = "".join(pieces)
+
+    # <main>/<article> 内容足够时只保留该范围
+    text = main_text if len(main_text.strip()) >= 0.25 * len(full_text.strip()) and main_text.strip() else full_text
+
+    paragraphs = [
+        paragraph for paragraph in re.split(r"\n\s*\n", text)
+        if paragraph.strip() and not (len(paragraph) < 400 and _link_density(paragraph) > 0.6)
+    ]
+
+    return {
+        "markdown": _normalize_markdown("\n\n".join(paragraphs)),
+        "title": unescape(parser.title).strip(),
+        "description": parser.description
+    }
+
+
+# ===== 抓取 =====
+
+def _sniff_encoding(head: bytes) -> Optional[str]:
+    match = _META_CHARSET_RE.search(head)
+    if not match:
+        return None
+    encoding = match.group(1).decode("ascii", "ignore").lower()
+    # 常见的声明别名
+    return {"gb2312": "gb18030", "gbk": "gb18030", "x-gbk": "gb18030"}.get(encoding, encoding)
+
+
+def _decode(body: bytes, header_encoding: Optional[str]) -> str:
+    """按 Content-Type → <meta charset> → UTF-8 的顺序解码"""
+    for encoding in (header_encoding, _sniff_encoding(body[:4096]), "utf-8"):
+        if not encoding:
+            continue
+        try:
+            return body.decode(encoding)
+        except (LookupError, UnicodeDecodeError):
+            continue
+    return body.decode("utf-8", errors="replace")
+
+
+class LocalScrapeEngine:
+    """本地抓取引擎：每个事件循环一个httpx连接池，按主机限制并发"""
+
+    def __init__(self, config: Dict[str, Any] = None):
+        self.config = {**LOCAL_SCRAPE_CONFIG, **(config or {})}
+        self.enabled = self.config.get("enabled", True)
+        self._domain_policy = DomainPolicy(priority=self.config.get("domains", []))
+        self._clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = weakref.WeakKeyDictionary()
+        self._host_limits: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, asyncio.Semaphore]]" = weakref.WeakKeyDictionary()
+        self._process_pool: Optional[ProcessPoolExecutor] = None
+        self._pool_broken = False
+        self._lock = threading.Lock()
+
+    def handles(self, url: str) -> bool:
+        """是否按域名配置优先使用本地抓取"""
+        return self._domain_policy.matches(url)
+
+    # ===== 资源管理 =====
+
+    def _get_client(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        client = self._clients.get(loop)
+        if client is None:
+            client = httpx.AsyncClient(
+                follow_redirects=False,     # 重定向在_fetch中逐跳检查目标地址
+                timeout=httpx.Timeout(self.config["timeout"], connect=self.config["connect_timeout"]),
+                limits=httpx.Limits(
+                    max_connections=self.config["max_connections"],
+                    max_keepalive_connections=self.config["max_keepalive_connections"]
+                ),
+                headers={
+                    "User-Agent": self.config["user_agent"],
+                    "Accept": "text/html,application/xhtml+xml;q=0.9,text/plain;q=0.8",
+                    "Accept-Language": "zh-CN,zh;q=0.9,en;q=0.8"
+                }
+            )
+            self._clients[loop] = client
+        return client
+
+    def _host_semaphore(self, host: str) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        limits = self._host_limits.setdefault(loop, {})
+        if host not in limits:
+            limits[host] = asyncio.Semaphore(self.config["per_host_connections"])
+        return limits[host]
+
+    def _get_process_pool(self) -> Optional[ProcessPoolExecutor]:
+        with self._lock:
+            if self._process_pool is None and not self._pool_broken and self.config["process_workers"] > 0:
+                try:
+                    self._process_pool = ProcessPoolExecutor(max_workers=self.config["process_workers"])
+                except Exception as e:
+                    logger.warning(f"⚠️ 无法创建抽取进程池，改用线程: {e}")
+                    self._pool_broken = True
+            return self._process_pool
+
+    async def _extract(self, html: str, url: str) -> Dict[str, Any]:
+        """在进程池中抽取正文；进程池不可用时退回默认线程池"""
+        loop = asyncio.get_running_loop()
+        pool = self._get_process_pool()
+        if pool is not None:
+            try:
+                return await loop.run_in_executor(pool, html_to_markdown, html, url)
+            except Exception as e:
+                logger.warning(f"⚠️ 抽取进程池失败，改用线程: {e}")
+                with self._lock:
+                    self._pool_broken = True
+                    self._process_pool = None
+                pool.shutdown(wait=False)
+        return await loop.run_in_executor(None, html_to_markdown, html, url)
+
+    async def aclose(self):
+        """关闭当前事件循环的连接池"""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        client = self._clients.pop(loop, None)
+        if client is not None:
+            await client.aclose()
+
+    def shutdown(self):
+        """关闭进程池"""
+        with self._lock:
+            if self._process_pool is not None:
+                self._process_pool.shutdown(wait=False)
+                self._process_pool = None
+
+    # ===== 抓取 =====
+
+    async def _check_target(self, url: str):
+        """
+        检查抓取目标：只允许http/https，主机解析出的地址必须全部是公网地址
+
+        错误信息含blocked，失败分类为站点拦截（不重试，写入负缓存）。
+        检查与连接之间的DNS变化（rebinding）不在防护范围内
+        """
+        parts = urlsplit(url)
+        if parts.scheme not in _ALLOWED_SCHEMES or not parts.hostname:
+            raise LocalFetchError(f"blocked: 不支持的URL {url[:100]}")
+        if parts.hostname in self.config["allowed_hosts"]:
+            return
+        try:
+            port = parts.port or (443 if parts.scheme == "https" else 80)
+            infos = await asyncio.get_running_loop().getaddrinfo(parts.hostname, port, type=socket.SOCK_STREAM)
+        except (ValueError, OSError) as e:
+            raise LocalFetchError(f"域名解析失败: {parts.hostname} - {e}") from e
+        for info in infos:
+            address = info[4][0]
+            if not is_public_address(address):
+                raise LocalFetchError(f"blocked: 拒绝访问非公网地址 {parts.hostname} ({address})")
+
+    async def _fetch(self, url: str) -> Tuple[str, str]:
+        """下载页面，返回(最终URL, HTML文本)；超过大小上限时截断，每一跳重定向都重新检查目标"""
+        client = self._get_client()
+        max_bytes = self.config["max_bytes"]
+
+        async with self._host_semaphore(extract_domain(url)):
+            for _ in range(self.config["max_redirects"] + 1):
+                await self._check_target(url)
+                async with client.stream("GET", url) as response:
+                    if response.has_redirect_location:
+                        url = urljoin(str(response.url), response.headers["location"])
+                        continue
+
+                    if response.status_code >= 400:
+                        raise LocalFetchError(f"Status code: {response.status_code}")
+
+                    content_type = response.headers.get("content-type", "").lower()
+                    if content_type and not any(kind in content_type for kind in ("html", "xml", "text/plain")):
+                        raise LocalFetchError(f"不支持的内容类型: {content_type}")
+
+                    declared = int(response.headers.get("content-length") or 0)
+                    if declared > max_bytes * 4:
+                        raise LocalFetchError(f"页面过大: {declared} 字节")
+
+                    chunks, size = [], 0
+                    async for chunk in response.aiter_bytes():
+                        chunks.append(chunk)
+                        size += len(chunk)
+                        if size >= max_bytes:
+                            logger.info(f"✂️ 本地抓取达到大小上限: {extract_domain(url)} ({max_bytes} 字节)")
+                            break
+
+                    body = b"".join(chunks)[:max_bytes]
+                    return str(response.url), _decode(body, response.charset_encoding)
+
+        raise LocalFetchError(f"重定向次数过多: {extract_domain(url)}")
+
+    async def scrape(self, url: str) -> Tuple[str, str, Dict[str, Any]]:
+        """抓取并抽取正文，返回(markdown, html, metadata)，与Firecrawl响应解析结果一致"""
+        try:
+            final_url, html = await self._fetch(url)
+        except httpx.TimeoutException as e:
+            raise LocalFetchError(f"Request timed out: {e}") from e
+        except httpx.HTTPError as e:
+            raise LocalFetchError(f"请求失败: {type(e).__name__} {e}") from e
+
+        extracted = await self._extract(html, final_url)
+        metadata = {
+            "title": extracted["title"],
+            "description": extracted["description"],
+            "sourceURL": url,
+            "url": final_url,
+            "extractor": "local"
+        }
+        return extracted["markdown"], "", metadata
+
+
+# 全局本地引擎实例
+local_scrape_engine = LocalScrapeEngine()
+
+
+# 测试函数
+async def test_local_scrape(port: int = 0) -> Dict[str, Any]:
+    """用本地HTTP夹具服务器测试抓取、字符集处理、大小上限和正文抽取"""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    article = "<p>" + "量子纠错是构建容错量子计算机的关键技术。" * 20 + "</p>"
+    pages = {
+        "/article": (
+            "text/html; charset=utf-8",
+            ("<html><head><title>量子纠错综述</title></head><body>"
+             "<nav><a href='https://x.com/1'>首页</a><a href='https://x.com/2'>登录</a></nav>"
+             "<div class='sidebar'>推荐阅读</div>"
+             f"<main><h1>量子纠错</h1>{article}<ul><li>表面码</li><li>色码</li></ul></main>"
+             "<footer>版权所有</footer></body></html>").encode("utf-8")
+        ),
+        "/gbk": (
+            "text/html",
+            ("<html><head><meta charset='gbk'><title>中文编码</title></head>"
+             "<body><article><p>" + "这是一个使用GBK编码的页面。" * 10 + "</p></article></body></html>").encode("gbk")
+        ),
+        "/large": ("text/html; charset=utf-8", b"<html><body><p>" + b"x" * (1536 * 1024) + b"</p></body></html>"),
+        "/blocked": ("text/html", b"forbidden"),
+    }
+    redirects = {"/moved": "/article", "/to-metadata": "http://169.254.169.254/latest/meta-data/"}
+
+    class FixtureHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path in redirects:
+                self.send_response(302)
+                self.send_header("Location", redirects[self.path])
+                self.end_headers()
+                return
+            if self.path not in pages or self.path == "/blocked":
+                self.send_response(403 if self.path == "/blocked" else 404)
+                self.end_headers()
+                return
+            content_type, body = pages[self.path]
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", port), FixtureHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+
+    # 夹具服务器在127.0.0.1上：默认配置必须拒绝，测试引擎通过allowed_hosts放行
+    guarded = LocalScrapeEngine({"process_workers": 0})
+    for url in (f"{base}/article", "http://169.254.169.254/latest/meta-data/", "http://10.0.0.1/", "file:///etc/passwd"):
+        try:
+            await guarded.scrape(url)
+            raise AssertionError(f"应拒绝抓取 {url}")
+        except LocalFetchError as e:
+            assert "blocked" in str(e), e
+    await guarded.aclose()
+
+    engine = LocalScrapeEngine({"max_bytes": 512 * 1024, "process_workers": 1, "allowed_hosts": ["127.0.0.1"]})
+    try:
+        markdown, _, metadata = await engine.scrape(f"{base}/moved")
+        assert metadata["url"] == f"{base}/article" and metadata["title"] == "量子纠错综述"
+        # 重定向的每一跳都检查目标地址
+        try:
+            await engine.scrape(f"{base}/to-metadata")
+            raise AssertionError("重定向到元数据地址应被拒绝")
+        except LocalFetchError as e:
+            assert "169.254.169.254" in str(e), e
+
+        markdown, _, metadata = await engine.scrape(f"{base}/article")
+        assert metadata["title"] == "量子纠错综述"
+        assert markdown.startswith("# 量子纠错"), markdown[:50]
+        assert "- 表面码" in markdown
+        assert "首页" not in markdown and "推荐阅读" not in markdown and "版权所有" not in markdown
+
+        markdown, _, metadata = await engine.scrape(f"{base}/gbk")
+        assert metadata["title"] == "中文编码" and "GBK编码" in markdown
+
+        markdown, _, _ = await engine.scrape(f"{base}/large")
+        assert len(markdown) <= 512 * 1024
+
+        try:
+            await engine.scrape(f"{base}/blocked")
+            raise AssertionError("403页面应抛出LocalFetchError")
+        except LocalFetchError as e:
+            assert "403" in str(e)
+    finally:
+        await engine.aclose()
+        engine.shutdown()
+        server.shutdown()
+
+    print("✅ 本地抓取引擎测试通过")
+    return {"base_url": base}
+
+
+if __name__ == "__main__":
+    asyncio.run(test_local_scrape())
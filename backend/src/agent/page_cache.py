@@ -0,0 +1,455 @@
+"""
+持久化抓取页面缓存
+V1 SimpleFirecrawlClient 与 V2 RealFirecrawlClient 共享，按规范化URL+抓取格式缓存
+内容以zlib压缩存入本地SQLite，支持按域名TTL、容量淘汰、负缓存和命中统计
+负缓存按URL和域名记录失败类型，连续失败时退避时间指数增长
+"""
+
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from dataclasses import dataclass, field
+from typing import Dict, Any, List, Optional, Iterable
+
+from .config import PAGE_CACHE_CONFIG
+from .url_utils import canonicalize_url, extract_domain
+from .domain_policy import DomainPolicy
+
+logger = logging.getLogger(__name__)
+
+# 失败类型
+FAILURE_TIMEOUT = "timeout"        # 抓取超时
+FAILURE_BLOCKED = "blocked"        # 被站点拦截（401/403/451、验证码等）
+FAILURE_TOO_SHORT = "too_short"    # 内容低于最小长度
+FAILURE_EMPTY = "empty"            # 无有效内容
+FAILURE_HTTP_4XX = "http_4xx"      # 其他4xx错误
+FAILURE_HTTP_5XX = "http_5xx"      # 5xx错误
+
+
+@dataclass
+class CachedPage:
+    """缓存命中的页面"""
+    url: str
+    formats: List[str]
+    content: Dict[str, str] = field(default_factory=dict)  # 格式 -> 文本
+    metadata: Dict[str, Any] = field(default_factory=dict)
+    negative: bool = False                                 # 负缓存：已知无法抓取
+    error: str = ""
+    created_at: float = 0.0
+
+
+@dataclass
+class FailureRecord:
+    """负缓存条目：URL或域名的失败记录"""
+    scope: str                  # "url" 或 "domain"
+    key: str
+    failure_class: str
+    count: int
+    expires_at: float
+
+
+class PageCache:
+    """基于SQLite的抓取页面缓存"""
+
+    def __init__(self, config: Dict[str, Any] = None):
+        self.config = {**PAGE_CACHE_CONFIG, **(config or {})}
+        self.enabled = self.config.get("enabled", True)
+        self.path = self.config.get("path")
+        self._ttl_policy = DomainPolicy(ttls=self.config.get("domain_ttls", {}))
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._total_bytes: Optional[int] = None    # 页面总容量（增量维护，定期重新统计）
+        self._last_maintenance = 0.0
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "negative_hits": 0,
+            "writes": 0,
+            "negative_writes": 0,
+            "evictions": 0,
+            "errors": 0
+        }
+
+    # ===== 内部工具 =====
+
+    def _connect(self) -> sqlite3.Connection:
+        """懒连接数据库并初始化表结构"""
+        if self._conn is None:
+            if self.path != ":memory:":
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, timeout=5.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS pages (
+                    url TEXT NOT NULL,
+                    formats TEXT NOT NULL,
+                    domain TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    content BLOB,
+                    metadata TEXT,
+                    error TEXT,
+                    size INTEGER NOT NULL DEFAULT 0,
+                    created_at REAL NOT NULL,
+                    expires_at REAL NOT NULL,
+                    last_access REAL NOT NULL,
+                    PRIMARY KEY (url, formats)
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_pages_last_access ON pages(last_access)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_pages_expires_at ON pages(expires_at)")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS failures (
+                    key TEXT PRIMARY KEY,
+                    scope TEXT NOT NULL,
+                    failure_class TEXT NOT NULL,
+                    count INTEGER NOT NULL,
+                    last_failure REAL NOT NULL,
+                    expires_at REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_failures_expires_at ON failures(expires_at)")
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    @staticmethod
+    def _formats_key(formats: List[str]) -> str:
+        return ",".join(sorted(set(formats or ["markdown"])))
+
+    def _ttl_for(self, domain: str) -> float:
+        """按域名后缀匹配TTL（编译后的后缀树，最具体的规则优先）"""
+        ttl = self._ttl_policy.lookup(domain).ttl
+        return ttl if ttl is not None else self.config.get("default_ttl", 86400)
+
+    def _backoff_for(self, failure_class: str, count: int) -> float:
+        """指数退避：初始时间 × 2^(连续失败次数-1)，不超过上限"""
+        base = self.config.get("failure_backoff", {}).get(
+            failure_class, self.config.get("negative_ttl", 3600)
+        )
+        return min(base * (2 ** max(0, count - 1)), self.config.get("max_backoff", base))
+
+    @staticmethod
+    def _domain_key(domain: str) -> str:
+        return f"domain:{domain}"
+
+    def _maintain(self, conn: sqlite3.Connection, now: float):
+        """定期清理过期条目并重新统计总容量（两次之间总容量由写入增量维护）"""
+        if self._total_bytes is not None and now - self._last_maintenance < self.config.get("maintenance_interval", 300):
+            return
+        self._last_maintenance = now
+        conn.execute("DELETE FROM pages WHERE expires_at < ?", (now,))
+        conn.execute("DELETE FROM failures WHERE expires_at < ?", (now - self.config.get("max_backoff", 0),))
+        self._total_bytes = conn.execute("SELECT COALESCE(SUM(size), 0) FROM pages").fetchone()[0]
+
+    def _evict_if_needed(self, conn: sqlite3.Connection):
+        """总容量超过上限时按最近访问时间分批淘汰"""
+        max_bytes = self.config.get("max_bytes", 0)
+        if not max_bytes:
+            return
+
+        self._maintain(conn, time.time())
+        if self._total_bytes <= max_bytes:
+            return
+
+        target = int(max_bytes * 0.9)
+        evicted = 0
+        while self._total_bytes > target:
+            rows = conn.execute(
+                "SELECT rowid, size FROM pages ORDER BY last_access ASC LIMIT ?",
+                (self.config.get("evict_batch", 200),)
+            ).fetchall()
+            if not rows:
+                self._total_bytes = 0
+                break
+            victims = []
+            for rowid, size in rows:
+                if self._total_bytes <= target:
+                    break
+                victims.append((rowid,))
+                self._total_bytes -= size
+            conn.executemany("DELETE FROM pages WHERE rowid = ?", victims)
+            evicted += len(victims)
+
+        self.stats["evictions"] += evicted
+        logger.info(f"🧹 页面缓存淘汰 {evicted} 条 (当前 {self._total_bytes / 1024 / 1024:.1f}MB)")
+
+    # ===== 公共接口 =====
+
+    def get(self, url: str, formats: List[str] = None) -> Optional[CachedPage]:
+        """查询缓存；格式为请求格式超集的条目也可命中；负缓存条目对任意格式生效"""
+        return self.get_many([url], formats).get(url)
+
+    def get_many(self, urls: Iterable[str], formats: List[str] = None) -> Dict[str, CachedPage]:
+        """批量查询缓存，返回 URL -> 命中的页面（含负缓存条目）；未命中的URL不在结果中
+
+        所有URL在一次加锁内用两条查询完成，命中条目的访问时间批量更新
+        """
+        if not self.enabled:
+            return {}
+
+        keys = {url: canonicalize_url(url) for url in urls if url}
+        if not keys:
+            return {}
+
+        wanted = set(formats or ["markdown"])
+        lookup = list(set(keys.values()))
+        placeholders = ",".join("?" * len(lookup))
+        now = time.time()
+
+        try:
+            with self._lock:
+                conn = self._connect()
+                failures = {
+                    key: (failure_class, last_failure)
+                    for key, failure_class, last_failure in conn.execute(
+                        f"SELECT key, failure_class, last_failure FROM failures "
+                        f"WHERE scope = 'url' AND expires_at >= ? AND key IN ({placeholders})",
+                        (now, *lookup)
+                    ).fetchall()
+                }
+
+                rows = {}
+                for key, row_formats, status, blob, metadata, created_at in conn.execute(
+                    f"SELECT url, formats, status, content, metadata, created_at FROM pages "
+                    f"WHERE expires_at >= ? AND url IN ({placeholders})",
+                    (now, *lookup)
+                ).fetchall():
+                    if key in failures or key in rows:
+                        continue
+                    if status == "ok" and wanted.issubset(row_formats.split(",")):
+                        rows[key] = (row_formats, blob, metadata, created_at)
+
+                if rows:
+                    conn.executemany(
+                        "UPDATE pages SET last_access = ? WHERE url = ? AND formats = ?",
+                        [(now, key, row[0]) for key, row in rows.items()]
+                    )
+                    conn.commit()
+
+                pages = {}
+                for url, key in keys.items():
+                    if key in failures:
+                        self.stats["negative_hits"] += 1
+                        failure_class, last_failure = failures[key]
+                        pages[url] = CachedPage(url=url, formats=[], negative=True,
+                                                error=failure_class, created_at=last_failure)
+                    elif key in rows:
+                        self.stats["hits"] += 1
+                        row_formats, blob, metadata, created_at = rows[key]
+                        pages[url] = CachedPage(
+                            url=url,
+                            formats=row_formats.split(","),
+                            content=json.loads(zlib.decompress(blob).decode("utf-8")),
+                            metadata=json.loads(metadata or "{}"),
+                            created_at=created_at
+                        )
+                    else:
+                        self.stats["misses"] += 1
+                return pages
+
+        except Exception as e:
+            self.stats["errors"] += 1
+            logger.warning(f"⚠️ 页面缓存读取失败: {e}")
+            return {}
+
+    def put(self, url: str, formats: List[str], content: Dict[str, str],
+            metadata: Dict[str, Any] = None, ttl: float = None):
+        """写入成功抓取的页面内容"""
+        if not self.enabled or not url:
+            return
+
+        key = canonicalize_url(url)
+        domain = extract_domain(key)
+        now = time.time()
+        ttl = ttl if ttl is not None else self._ttl_for(domain)
+
+        try:
+            blob = zlib.compress(json.dumps(content, ensure_ascii=False).encode("utf-8"), 6)
+            metadata_json = json.dumps(metadata or {}, ensure_ascii=False, default=str)
+
+            with self._lock:
+                conn = self._connect()
+                # 成功内容清除该URL的失败记录，并降低域名的失败计数
+                conn.execute("DELETE FROM failures WHERE key = ?", (key,))
+                conn.execute(
+                    "UPDATE failures SET count = count - 1 WHERE key = ? AND count > 0",
+                    (self._domain_key(domain),)
+                )
+                formats_key = self._formats_key(formats)
+                size = len(blob) + len(metadata_json)
+                previous = conn.execute(
+                    "SELECT size FROM pages WHERE url = ? AND formats = ?", (key, formats_key)
+                ).fetchone()
+                conn.execute(
+                    "INSERT OR REPLACE INTO pages "
+                    "(url, formats, domain, status, content, metadata, error, size, created_at, expires_at, last_access) "
+                    "VALUES (?, ?, ?, 'ok', ?, ?, '', ?, ?, ?, ?)",
+                    (key, formats_key, domain, blob, metadata_json, size, now, now + ttl, now)
+                )
+                if self._total_bytes is not None:
+                    self._total_bytes += size - (previous[0] if previous else 0)
+                self._evict_if_needed(conn)
+                conn.commit()
+                self.stats["writes"] += 1
+
+        except Exception as e:
+            self.stats["errors"] += 1
+            self._total_bytes = None    # 下次写入时重新统计
+            logger.warning(f"⚠️ 页面缓存写入失败: {e}")
+
+    def put_negative(self, url: str, reason: str, ttl: float = None):
+        """写入负缓存：记录URL及其域名的一次失败，连续失败时退避时间指数增长
+
+        reason: 失败类型（FAILURE_*）；ttl指定时覆盖URL的退避时间
+        """
+        if not self.enabled or not url:
+            return
+
+        key = canonicalize_url(url)
+        domain_key = self._domain_key(extract_domain(key))
+        now = time.time()
+
+        try:
+            with self._lock:
+                conn = self._connect()
+                counts = {}
+                for scope, record_key in (("url", key), ("domain", domain_key)):
+                    # 过期很久的记录会被清理，之后重新从1计数
+                    row = conn.execute(
+                        "SELECT count FROM failures WHERE key = ?", (record_key,)
+                    ).fetchone()
+                    count = counts[scope] = row[0] + 1 if row else 1
+                    backoff = ttl if (ttl is not None and scope == "url") else self._backoff_for(reason, count)
+                    conn.execute(
+                        "INSERT OR REPLACE INTO failures "
+                        "(key, scope, failure_class, count, last_failure, expires_at) VALUES (?, ?, ?, ?, ?, ?)",
+                        (record_key, scope, reason, count, now, now + backoff)
+                    )
+                conn.commit()
+                self.stats["negative_writes"] += 1
+                logger.info(f"🚫 负缓存: {key} ({reason}, 连续第{counts['url']}次, 域名累计{counts['domain']}次)")
+
+        except Exception as e:
+            self.stats["errors"] += 1
+            logger.warning(f"⚠️ 页面缓存写入失败: {e}")
+
+    def get_failures(self, urls: Iterable[str]) -> Dict[str, FailureRecord]:
+        """批量查询负缓存
+
+        返回 URL -> 生效中的失败记录：URL自身处于退避期时返回URL记录；
+        否则域名累计失败达到阈值且处于退避期时返回域名记录
+        """
+        if not self.enabled:
+            return {}
+
+        keys = {url: canonicalize_url(url) for url in urls if url}
+        if not keys:
+            return {}
+
+        domain_keys = {url: self._domain_key(extract_domain(key)) for url, key in keys.items()}
+        lookup = list(set(keys.values()) | set(domain_keys.values()))
+        now = time.time()
+
+        try:
+            with self._lock:
+                conn = self._connect()
+                rows = conn.execute(
+                    f"SELECT key, scope, failure_class, count, expires_at FROM failures "
+                    f"WHERE expires_at >= ? AND key IN ({','.join('?' * len(lookup))})",
+                    (now, *lookup)
+                ).fetchall()
+        except Exception as e:
+            self.stats["errors"] += 1
+            logger.warning(f"⚠️ 页面缓存读取失败: {e}")
+            return {}
+
+        records = {row[0]: FailureRecord(scope=row[1], key=row[0], failure_class=row[2],
+                                         count=row[3], expires_at=row[4]) for row in rows}
+        threshold = self.config.get("domain_failure_threshold", 3)
+
+        failures = {}
+        for url, key in keys.items():
+            if key in records:
+                failures[url] = records[key]
+                continue
+            domain_record = records.get(domain_keys[url])
+            if domain_record and domain_record.count >= threshold:
+                failures[url] = domain_record
+        return failures
+
+    def cached_urls(self, urls: Iterable[str]) -> set:
+        """批量查询哪些URL有未过期的成功缓存（不计入命中统计，用于抓取预算规划）"""
+        if not self.enabled:
+            return set()
+
+        keys = {url: canonicalize_url(url) for url in urls if url}
+        if not keys:
+            return set()
+
+        lookup = list(set(keys.values()))
+        try:
+            with self._lock:
+                conn = self._connect()
+                rows = conn.execute(
+                    f"SELECT DISTINCT url FROM pages "
+                    f"WHERE status = 'ok' AND expires_at >= ? AND url IN ({','.join('?' * len(lookup))})",
+                    (time.time(), *lookup)
+                ).fetchall()
+        except Exception as e:
+            self.stats["errors"] += 1
+            logger.warning(f"⚠️ 页面缓存读取失败: {e}")
+            return set()
+
+        hits = {row[0] for row in rows}
+        return {url for url, key in keys.items() if key in hits}
+
+    # ===== 异步接口 =====
+    # SQLite读写和解压在线程中执行，避免阻塞事件循环
+
+    async def aget(self, url: str, formats: List[str] = None) -> Optional[CachedPage]:
+        return await asyncio.to_thread(self.get, url, formats)
+
+    async def aget_many(self, urls: Iterable[str], formats: List[str] = None) -> Dict[str, CachedPage]:
+        return await asyncio.to_thread(self.get_many, list(urls), formats)
+
+    async def aput(self, url: str, formats: List[str], content: Dict[str, str],
+                   metadata: Dict[str, Any] = None, ttl: float = None):
+        await asyncio.to_thread(self.put, url, formats, content, metadata, ttl)
+
+    async def aput_negative(self, url: str, reason: str, ttl: float = None):
+        await asyncio.to_thread(self.put_negative, url, reason, ttl)
+
+    async def aget_failures(self, urls: Iterable[str]) -> Dict[str, FailureRecord]:
+        return await asyncio.to_thread(self.get_failures, list(urls))
+
+    async def acached_urls(self, urls: Iterable[str]) -> set:
+        return await asyncio.to_thread(self.cached_urls, list(urls))
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取缓存命中统计"""
+        lookups = self.stats["hits"] + self.stats["misses"] + self.stats["negative_hits"]
+        hit_rate = (self.stats["hits"] + self.stats["negative_hits"]) / lookups * 100 if lookups else 0
+
+        return {
+            **self.stats,
+            "hit_rate": hit_rate,
+            "enabled": self.enabled
+        }
+
+    def close(self):
+        """关闭数据库连接"""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+            self._total_bytes = None
+
+
+# 全局缓存实例
+page_cache = PageCache()
@@ -0,0 +1,156 @@
+"""
+投机预抓取
+搜索阶段就把排名靠前、评分很高（权威域名）的结果提前抓取到页面缓存，
+增强阶段选中这些URL时直接命中缓存或等待进行中的预抓取，不再重复请求。
+每次运行中尚未被使用的预抓取数量有上限，限制猜错时浪费的抓取
+"""
+
+import asyncio
+import concurrent.futures
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List
+
+from .config import PREFETCH_CONFIG
+from .background_loop import background_loop
+from .scrape_scheduler import scrape_context, get_scrape_context, PRIORITY_BACKGROUND
+from .url_utils import get_result_url
+
+logger = logging.getLogger(__name__)
+
+
+class SpeculativePrefetcher:
+    """抓取引擎的投机预抓取器（进程级，按运行统计浪费）"""
+
+    def __init__(self, engine: Any, config: Dict[str, Any] = None):
+        self.engine = engine
+        self.config = {**PREFETCH_CONFIG, **(config or {})}
+        self.enabled = self.config["enabled"]
+        self._inflight: Dict[str, concurrent.futures.Future] = {}
+        self._unused: "OrderedDict[str, tuple]" = OrderedDict()   # url -> (run_id, 开始时间)
+        self._lock = threading.Lock()
+        self.stats = {
+            "started": 0,
+            "succeeded": 0,
+            "failed": 0,
+            "used": 0,
+            "wasted": 0,
+            "capped": 0
+        }
+
+    def _expire_locked(self, now: float):
+        """超过unused_ttl仍未被使用的预抓取计为浪费"""
+        while self._unused:
+            url, (_, started) = next(iter(self._unused.items()))
+            if now - started < self.config["unused_ttl"]:
+                break
+            self._unused.popitem(last=False)
+            self.stats["wasted"] += 1
+
+    def observe(self, results: List[Dict], profile: Any, run_id: str = None) -> List[str]:
+        """
+        检查一次搜索的结果，对高置信度的靠前结果发起后台预抓取（不等待完成）
+
+        Args:
+            results: 搜索结果（按搜索排名）
+            profile: 用于评分和抓取的配置档
+            run_id: 所属运行，默认取当前抓取上下文
+
+        Returns:
+            list: 发起预抓取的URL
+        """
+        if not self.enabled or not results or not self.engine.enabled or not self.engine.cache.enabled:
+            return []
+
+        top = [result for result in results[:self.config["top_positions"]] if isinstance(result, dict)]
+        scored = [
+            (score, get_result_url(result))
+            for result, score in zip(top, self.engine.policy.score_batch(top, profile))
+            if score is not None and score >= self.config["min_score"]
+        ]
+        if not scored:
+            return []
+        scored.sort(key=lambda item: item[0], reverse=True)
+        cached = self.engine.cache.cached_urls([url for _, url in scored])
+
+        run_id = run_id or get_scrape_context().run_id
+        now = time.monotonic()
+        started = []
+        with self._lock:
+            self._expire_locked(now)
+            unused = sum(1 for owner, _ in self._unused.values() if owner == run_id)
+            for _, url in scored:
+                if len(started) >= self.config["max_per_search"]:
+                    break
+                if url in cached or url in self._inflight or url in self._unused:
+                    continue
+                if unused >= self.config["max_unused_per_run"]:
+                    self.stats["capped"] += 1
+                    break
+                self._unused[url] = (run_id, now)
+                unused += 1
+                started.append(url)
+            self.stats["started"] += len(started)
+
+        for url in started:
+            future = background_loop.submit(self._prefetch(url, profile, run_id))
+            with self._lock:
+                self._inflight[url] = future
+            future.add_done_callback(lambda f, url=url: self._on_done(url, f))
+            logger.info(f"🔮 投机预抓取: {url}")
+        return started
+
+    async def _prefetch(self, url: str, profile: Any, run_id: str) -> Dict[str, Any]:
+        """以后台优先级经进程级调度器抓取，结果由抓取引擎写入页面缓存"""
+        with scrape_context(run_id=run_id, priority=PRIORITY_BACKGROUND):
+            async with self.engine.scheduler.slot(url, run_limit=1):
+                return await asyncio.wait_for(
+                    self.engine.scrape_url(url, profile, {"formats": self.config["formats"]}),
+                    timeout=profile.URL_DEADLINE
+                )
+
+    def _on_done(self, url: str, future: concurrent.futures.Future):
+        with self._lock:
+            self._inflight.pop(url, None)
+            try:
+                success = not future.cancelled() and future.exception() is None and future.result().get("success")
+            except Exception:
+                success = False
+            self.stats["succeeded" if success else "failed"] += 1
+
+    def inflight_urls(self, urls: Iterable[str]) -> set:
+        """正在预抓取中的URL（用于抓取预算规划：完成后将命中缓存）"""
+        with self._lock:
+            return {url for url in urls if url in self._inflight}
+
+    async def settle(self, urls: Iterable[str], timeout: float = None):
+        """增强阶段开始抓取前调用：标记预抓取已被使用，并等待其中仍在进行的预抓取完成"""
+        if not self.enabled:
+            return
+        urls = list(urls)
+        with self._lock:
+            futures = [self._inflight[url] for url in urls if url in self._inflight]
+            used = [url for url in urls if self._unused.pop(url, None) is not None]
+            self.stats["used"] += len(used)
+
+        if not futures:
+            return
+        if timeout is None:
+            timeout = self.config["wait_timeout"]
+        timeout = min(timeout, self.config["wait_timeout"])
+        if timeout <= 0:
+            return
+        logger.info(f"🔮 等待 {len(futures)} 个进行中的预抓取")
+        await asyncio.wait([asyncio.wrap_future(future) for future in futures], timeout=timeout)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            self._expire_locked(time.monotonic())
+            return {
+                **self.stats,
+                "enabled": self.enabled,
+                "inflight": len(self._inflight),
+                "unused": len(self._unused)
+            }
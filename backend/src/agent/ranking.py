@@ -0,0 +1,268 @@
+"""
+本地BM25相关性排序
+对搜索结果的标题、摘要和增强内容按用户查询/当前任务打分，统一top-k选择
+"""
+
+import math
+import re
+from collections import Counter
+from typing import List, Dict, Any, Optional
+
+# CJK字符范围（中日韩统一表意文字、扩展A、兼容表意文字、假名、韩文）
+_CJK_RANGES = (
+    "\u3040-\u30ff"   # 平假名、片假名
+    "\u3400-\u4dbf"   # 扩展A
+    "\u4e00-\u9fff"   # 基本汉字
+    "\uac00-\ud7af"   # 韩文音节
+    "\uf900-\ufaff"   # 兼容表意文字
+)
+_TOKEN_RE = re.compile(f"[{_CJK_RANGES}]+|[a-zA-Z0-9_]+(?:['.-][a-zA-Z0-9_]+)*")
+_CJK_RE = re.compile(f"[{_CJK_RANGES}]")
+
+# 常见停用词（中英文）
+STOPWORDS = {
+    'the', 'a', 'an', 'of', 'and', 'or', 'to', 'in', 'on', 'for', 'is', 'are',
+    'was', 'were', 'be', 'with', 'by', 'at', 'as', 'it', 'this', 'that', 'from',
+    'what', 'how', 'why', 'which', 'who',
+    '的', '了', '和', '是', '在', '与', '及', '或', '有', '对', '中', '等',
+}
+
+# 字段权重：标题出现的词比正文更能说明相关性
+FIELD_WEIGHTS = {
+    "title": 2,
+    "snippet": 1,
+    "content": 1,
+}
+
+
+def tokenize(text: str) -> List[str]:
+    """分词 - 拉丁文按单词小写，CJK连续片段按字符二元组切分"""
+    if not text:
+        return []
+
+    tokens = []
+    for match in _TOKEN_RE.finditer(text):
+        piece = match.group(0)
+        if _CJK_RE.match(piece):
+            if len(piece) == 1:
+                tokens.append(piece)
+            else:
+                tokens.extend(piece[i:i + 2] for i in range(len(piece) - 1))
+        else:
+            tokens.append(piece.lower())
+
+    return [token for token in tokens if token not in STOPWORDS]
+
+
+def result_tokens(result: Any, max_content_chars: int = 2000) -> List[str]:
+    """提取搜索结果的加权词项（标题、摘要、增强内容）"""
+    if not isinstance(result, dict):
+        return tokenize(str(result)[:max_content_chars])
+
+    tokens = tokenize(result.get("title") or "") * FIELD_WEIGHTS["title"]
+    tokens += tokenize(result.get("snippet") or "") * FIELD_WEIGHTS["snippet"]
+
+    content = result.get("enhanced_content") or result.get("content") or ""
+    if isinstance(content, str):
+        tokens += tokenize(content[:max_content_chars]) * FIELD_WEIGHTS["content"]
+
+    return tokens
+
+
+class BM25Ranker:
+    """BM25打分器 - 针对单次候选集合计算IDF"""
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+
+    def score(self, query_tokens: List[str], documents: List[List[str]]) -> List[float]:
+        """计算每个文档对查询的BM25分数"""
+        if not documents:
+            return []
+
+        doc_count = len(documents)
+        avg_len = sum(len(doc) for doc in documents) / doc_count or 1.0
+        query_terms = set(query_tokens)
+
+        # 文档频率
+        doc_freq = Counter()
+        term_freqs = []
+        for doc in documents:
+            tf = Counter(token for token in doc if token in query_terms)
+            term_freqs.append(tf)
+            doc_freq.update(tf.keys())
+
+        scores = []
+        for doc, tf in zip(documents, term_freqs):
+            doc_len = len(doc)
+            score = 0.0
+            for term in query_terms:
+                freq = tf.get(term, 0)
+                if not freq:
+                    continue
+                idf = math.log(1 + (doc_count - doc_freq[term] + 0.5) / (doc_freq[term] + 0.5))
+                norm = freq + self.k1 * (1 - self.b + self.b * doc_len / avg_len)
+                score += idf * freq * (self.k1 + 1) / norm
+            scores.append(score)
+
+        return scores
+
+
+# 全局排序器实例
+bm25_ranker = BM25Ranker()
+
+
+def rank_results(results: List[Any],
+                 query: str,
+                 top_k: Optional[int] = None,
+                 context: str = "") -> List[Any]:
+    """
+    按与查询的相关性对搜索结果排序并取前top_k个
+
+    Args:
+        results: 搜索结果列表（dict，或任意可转字符串的对象）
+        query: 用户查询
+        top_k: 返回数量，None表示全部
+        context: 额外的查询上下文（如当前任务描述）
+
+    Returns:
+        list: 按相关性降序的结果；分数相同时保持原始顺序
+    """
+    if not results:
+        return []
+
+    query_tokens = tokenize(f"{query} {context}".strip())
+    if not query_tokens:
+        return list(results[:top_k]) if top_k is not None else list(results)
+
+    scores = bm25_ranker.score(query_tokens, [result_tokens(result) for result in results])
+    order = sorted(range(len(results)), key=lambda idx: (-scores[idx], idx))
+
+    if top_k is not None:
+        order = order[:top_k]
+
+    return [results[idx] for idx in order]
+
+
+# ===== 段落抽取 =====
+
+_HEADING_RE = re.compile(r"^\s{0,3}#{1,6}\s")
+_PARAGRAPH_SPLIT_RE = re.compile(r"\n\s*\n")
+
+
+def split_passages(markdown: str, max_chunk_chars: int = 1200) -> List[Dict[str, Any]]:
+    """按段落/标题切分markdown，每个段落记录所属标题（用于打分）；过长段落按行再切分"""
+    passages = []
+    heading = ""
+
+    for block in _PARAGRAPH_SPLIT_RE.split(markdown):
+        block = block.strip()
+        if not block:
+            continue
+
+        first_line = block.split("\n", 1)[0]
+        if _HEADING_RE.match(first_line):
+            heading = first_line.lstrip("# ").strip()
+
+        pieces = [block]
+        if len(block) > max_chunk_chars:
+            pieces, current = [], ""
+            for line in block.split("\n"):
+                if current and len(current) + len(line) + 1 > max_chunk_chars:
+                    pieces.append(current)
+                    current = ""
+                current = f"{current}\n{line}" if current else line
+            if current:
+                pieces.append(current)
+
+        for piece in pieces:
+            passages.append({"text": piece[:max_chunk_chars], "heading": heading, "index": len(passages)})
+
+    return passages
+
+
+_GAP_MARKER = "..."
+_JOINER = "\n\n"
+
+
+def _joined_length(passages: List[Dict[str, Any]], selected: List[int]) -> int:
+    """按原文顺序拼接后的长度（含段落间的换行和不相邻段落之间的"..."）"""
+    if not selected:
+        return 0
+    length = sum(len(passages[idx]["text"]) for idx in selected) + len(_JOINER) * (len(selected) - 1)
+    gaps = sum(1 for prev, idx in zip(selected, selected[1:]) if idx != prev + 1)
+    return length + gaps * (len(_GAP_MARKER) + len(_JOINER))
+
+
+def extract_passages(markdown: str, query: str, budget: int, context: str = "") -> str:
+    """
+    按与查询的相关性从markdown中抽取段落，在字符预算内保留最相关的部分
+
+    Args:
+        markdown: 抓取的页面内容
+        query: 用户查询
+        budget: 字符预算
+        context: 额外的查询上下文（如当前任务描述）
+
+    Returns:
+        str: 不超过预算的内容；入选段落按原文顺序拼接，不相邻的段落之间用"..."分隔。
+             内容未超预算时原样返回；没有可用的查询词时退化为截取开头
+    """
+    if not markdown or len(markdown) <= budget:
+        return markdown or ""
+
+    query_tokens = tokenize(f"{query} {context}".strip())
+    if not query_tokens:
+        return markdown[:max(0, budget - len(_GAP_MARKER))] + _GAP_MARKER
+
+    passages = split_passages(markdown)
+    documents = [
+        tokenize(passage["heading"]) * FIELD_WEIGHTS["snippet"] + tokenize(passage["text"])
+        for passage in passages
+    ]
+    scores = bm25_ranker.score(query_tokens, documents)
+
+    # 按分数贪心选取；分数相同时靠前的段落优先（通常是导语）
+    # 预算按拼接后的实际长度计算，分隔符和"..."都计入
+    order = sorted(range(len(passages)), key=lambda idx: (-scores[idx], idx))
+    selected = []
+    for idx in order:
+        if scores[idx] <= 0 and selected:
+            break
+        candidate = sorted(selected + [idx])
+        if _joined_length(passages, candidate) > budget:
+            continue
+        selected = candidate
+
+    if not selected:
+        return markdown[:max(0, budget - len(_GAP_MARKER))] + _GAP_MARKER
+
+    parts = []
+    for position, idx in enumerate(selected):
+        if position and idx != selected[position - 1] + 1:
+            parts.append(_GAP_MARKER)
+        parts.append(passages[idx]["text"])
+    return _JOINER.join(parts)
+
+
+def test_extract_passages():
+    """测试段落抽取不超过字符预算（含分隔符和省略号），且保留相关段落"""
+    paragraphs = []
+    for i in range(40):
+        topic = "量子纠错 表面码 逻辑比特" if i % 7 == 3 else "无关的页面内容 广告 导航"
+        paragraphs.append(f"## 第{i}节\n\n" + f"{topic}，第{i}段的正文。" * 12)
+    markdown = "\n\n".join(paragraphs)
+
+    for budget in (200, 1000, 3000):
+        for query in ("量子纠错 表面码", ""):
+            out = extract_passages(markdown, query, budget)
+            assert len(out) <= budget, (budget, query, len(out))
+            if query and budget >= 1000:
+                assert "量子纠错" in out
+    assert extract_passages("短文本", "查询", 100) == "短文本"
+    print("🧪 段落抽取预算测试通过")
+
+
+if __name__ == "__main__":
+    test_extract_passages()
@@ -0,0 +1,163 @@
+"""
+紧凑的结果记录
+搜索结果、抓取页面和研究发现在入口处规范化为__slots__数据类：
+url/link、snippet/content、enhanced/is_enhanced等不一致的字段名只在from_dict中处理一次，
+循环中直接访问属性；再通过to_dict转回dict视图：图状态中只保存规范键名（url、is_enhanced），
+对外的API/SSE响应用to_dict(aliases=True)补上旧键名（link、enhanced）
+"""
+
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+from .url_utils import canonicalize_url
+
+# 搜索结果中由SearchHit字段承载的键（其余键原样保留在extra中）
+_HIT_KEYS = frozenset({
+    "url", "link", "title", "snippet", "content", "enhanced_content",
+    "is_enhanced", "enhanced", "enhancement_source"
+})
+_DOC_KEYS = frozenset({"url", "title", "content", "source", "word_count", "success", "error"})
+
+
+@dataclass(slots=True)
+class SearchHit:
+    """一条搜索结果（可能已合并抓取正文）"""
+    url: str = ""
+    title: str = ""
+    snippet: str = ""
+    content: Any = ""                       # 正文，可能是内容存储句柄
+    enhanced_content: Any = ""              # V2抓取正文，可能是内容存储句柄
+    is_enhanced: bool = False
+    enhancement_source: str = ""
+    extra: Optional[Dict[str, Any]] = None  # 其他字段（评分、元数据等）
+
+    @classmethod
+    def from_dict(cls, data: Any) -> "SearchHit":
+        """规范化任意形式的搜索结果（dict、字符串或已是SearchHit）"""
+        if isinstance(data, cls):
+            return data
+        if not isinstance(data, dict):
+            return cls(title="搜索结果", snippet=str(data))
+        extra = {key: value for key, value in data.items() if key not in _HIT_KEYS}
+        return cls(
+            url=(data.get("url") or data.get("link") or "").strip(),
+            title=data.get("title") or "",
+            snippet=data.get("snippet") or "",
+            content=data.get("content") or "",
+            enhanced_content=data.get("enhanced_content") or "",
+            is_enhanced=bool(data.get("is_enhanced") or data.get("enhanced")),
+            enhancement_source=data.get("enhancement_source") or "",
+            extra=extra or None
+        )
+
+    @property
+    def key(self) -> str:
+        """规范化URL（去重/匹配用）"""
+        return canonicalize_url(self.url)
+
+    @property
+    def text(self) -> Any:
+        """最完整的文本：抓取正文 > 正文 > 摘要"""
+        return self.enhanced_content or self.content or self.snippet
+
+    def to_dict(self, aliases: bool = False) -> Dict[str, Any]:
+        """dict视图：只使用规范键名；aliases=True时同时写入link/enhanced，供读取旧键名的API消费方使用"""
+        data = dict(self.extra) if self.extra else {}
+        data["title"] = self.title
+        if self.url:
+            data["url"] = self.url
+            if aliases:
+                data["link"] = self.url
+        data["snippet"] = self.snippet
+        if self.content:
+            data["content"] = self.content
+        if self.enhanced_content:
+            data["enhanced_content"] = self.enhanced_content
+        if self.is_enhanced:
+            data["is_enhanced"] = True
+            if aliases:
+                data["enhanced"] = True
+        if self.enhancement_source:
+            data["enhancement_source"] = self.enhancement_source
+        return data
+
+
+@dataclass(slots=True)
+class ScrapedDoc:
+    """抓取引擎返回的一个页面"""
+    url: str
+    title: str = ""
+    content: str = ""
+    source: str = ""
+    word_count: int = 0
+    success: bool = True
+    error: str = ""
+    extra: Optional[Dict[str, Any]] = None  # html、metadata等
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "ScrapedDoc":
+        if isinstance(data, cls):
+            return data
+        extra = {key: value for key, value in data.items() if key not in _DOC_KEYS}
+        return cls(
+            url=(data.get("url") or "").strip(),
+            title=data.get("title") or "",
+            content=data.get("content") or "",
+            source=data.get("source") or "",
+            word_count=data.get("word_count") or 0,
+            success=bool(data.get("success", True)),
+            error=data.get("error") or "",
+            extra=extra or None
+        )
+
+    @property
+    def key(self) -> str:
+        return canonicalize_url(self.url)
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = dict(self.extra) if self.extra else {}
+        data.update({
+            "success": self.success,
+            "url": self.url,
+            "title": self.title,
+            "content": self.content,
+            "source": self.source
+        })
+        if self.word_count:
+            data["word_count"] = self.word_count
+        if self.error:
+            data["error"] = self.error
+        return data
+
+
+@dataclass(slots=True)
+class Finding:
+    """某个研究任务收集到的一条来源"""
+    task_id: Optional[str]
+    hit: SearchHit
+    source: str = "web_search"
+
+    @classmethod
+    def from_dict(cls, data: Any) -> "Finding":
+        """规范化current_task_detailed_findings中的一条（{"task_id", "content", "source"}）"""
+        if isinstance(data, cls):
+            return data
+        if not isinstance(data, dict):
+            return cls(task_id=None, hit=SearchHit.from_dict(data))
+        return cls(
+            task_id=data.get("task_id"),
+            hit=SearchHit.from_dict(data.get("content")),
+            source=data.get("source") or "web_search"
+        )
+
+    @property
+    def enhanced(self) -> bool:
+        return self.hit.is_enhanced
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "task_id": self.task_id,
+            "content": self.hit.to_dict(),
+            "source": self.source,
+            "enhanced": self.enhanced
+        }
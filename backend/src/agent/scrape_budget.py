@@ -0,0 +1,104 @@
+"""
+抓取时间预算规划
+按域名历史预测抓取耗时、按选择分数和摘要信息量预测抓取价值，
+在给定时间预算和并发数内决定抓取哪些URL，取代固定的抓取数量
+"""
+
+import logging
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from .config import SCRAPE_BUDGET_CONFIG
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ScrapeCandidate:
+    """待规划的抓取候选"""
+    url: str
+    value: float            # 预测价值
+    latency: float          # 预测耗时(秒)
+
+
+class ScrapeBudgetPlanner:
+    """抓取预算规划器（进程级共享域名耗时历史）"""
+
+    def __init__(self, config: Dict[str, Any] = None):
+        self.config = {**SCRAPE_BUDGET_CONFIG, **(config or {})}
+        self._latency: "OrderedDict[str, float]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    # ===== 预测 =====
+
+    def record(self, domain: str, seconds: float):
+        """记录一次实际抓取耗时（失败和超时同样计入，超时代表真实成本）"""
+        if not domain or seconds < 0:
+            return
+        alpha = self.config["latency_alpha"]
+        with self._lock:
+            previous = self._latency.pop(domain, None)
+            self._latency[domain] = seconds if previous is None else alpha * seconds + (1 - alpha) * previous
+            while len(self._latency) > self.config["max_domains"]:
+                self._latency.popitem(last=False)
+
+    def predict_latency(self, domain: str, cached: bool = False, local: bool = False) -> float:
+        """预测抓取耗时：已缓存的页面几乎无成本；否则取域名历史，没有历史时取默认值"""
+        if cached:
+            return self.config["cached_latency"]
+        with self._lock:
+            history = self._latency.get(domain)
+        if history is not None:
+            return history
+        return self.config["local_latency"] if local else self.config["default_latency"]
+
+    def predict_value(self, score: float, snippet: str) -> float:
+        """预测抓取价值：选择分数越高越值得抓取，摘要越稀薄，抓取带来的新增信息越多"""
+        thin_chars = self.config["thin_snippet_chars"]
+        thinness = max(0.0, 1.0 - len(snippet or "") / thin_chars) if thin_chars else 0.0
+        return score * (1.0 + self.config["thin_snippet_bonus"] * thinness)
+
+    # ===== 规划 =====
+
+    def plan(self, candidates: List[ScrapeCandidate], budget: float,
+             concurrency: int, max_count: Optional[int] = None) -> List[str]:
+        """
+        在时间预算内选择抓取的URL
+
+        按价值从高到低，把每个候选安排到最早空闲的并发通道上；
+        预测完成时间超出预算的候选被跳过（仍会尝试更快的候选），价值低于阈值时停止
+
+        Returns:
+            list: 入选的URL（按价值降序）
+        """
+        if max_count is None:
+            max_count = self.config["max_urls"]
+        usable = max(0.0, budget) * self.config["safety_margin"]
+        lanes = [0.0] * max(1, concurrency)
+        selected, skipped = [], 0
+
+        for candidate in sorted(candidates, key=lambda c: c.value, reverse=True):
+            if len(selected) >= max_count or candidate.value < self.config["min_value"]:
+                break
+            lane = min(range(len(lanes)), key=lanes.__getitem__)
+            finish = lanes[lane] + candidate.latency
+            if finish > usable:
+                skipped += 1
+                continue
+            lanes[lane] = finish
+            selected.append(candidate.url)
+
+        logger.info(f"⏳ 抓取预算规划: 预算 {budget:.1f}秒 × {len(lanes)}并发，"
+                    f"从{len(candidates)}个候选中选择 {len(selected)} 个"
+                    f"{f'（{skipped}个预计超时被跳过）' if skipped else ''}，预计耗时 {max(lanes):.1f}秒")
+        return selected
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"domains_tracked": len(self._latency)}
+
+
+# 全局规划器实例
+scrape_budget_planner = ScrapeBudgetPlanner()
@@ -0,0 +1,886 @@
+"""
+统一抓取引擎
+V1 SimpleFirecrawlClient 与 V2 RealFirecrawlClient 共用的异步抓取核心：
+一个Firecrawl客户端、一个速率限制器、一个页面缓存和一套URL选择策略，
+V1/V2只作为配置档（ScrapeProfile）叠加在上面
+"""
+
+# 确保在模块加载时就加载环境变量
+from dotenv import load_dotenv
+load_dotenv()
+
+import asyncio
+import logging
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass
+from typing import List, Dict, Any, Optional, AsyncIterator
+
+from .config import SCRAPE_ENGINE_CONFIG, BATCH_JOB_CONFIG
+from .page_cache import (
+    page_cache, CachedPage, FailureRecord,
+    FAILURE_TIMEOUT, FAILURE_BLOCKED, FAILURE_TOO_SHORT, FAILURE_EMPTY,
+    FAILURE_HTTP_4XX, FAILURE_HTTP_5XX
+)
+from .scrape_scheduler import scrape_scheduler, PRIORITY_RESEARCH, PRIORITY_BACKGROUND
+from .url_utils import extract_domain, get_result_url
+from .ranking import extract_passages
+from .local_scrape import local_scrape_engine
+from .simhash import SimHashIndex, simhash, snippet_text
+from .domain_policy import DomainPolicy, DomainRule
+from .adaptive_concurrency import adaptive_concurrency
+from .scrape_budget import scrape_budget_planner, ScrapeCandidate
+from .batch_jobs import BatchScrapeJob, supports_batch_jobs, page_url
+from .prefetch import SpeculativePrefetcher
+
+logger = logging.getLogger(__name__)
+
+_STATUS_CODE_RE = re.compile(r"\b([45]\d\d)\b")
+_BLOCKED_HINTS = ("blocked", "forbidden", "captcha", "access denied", "unauthorized")
+
+# 不值得在同一次请求中重试的失败类型
+NON_RETRYABLE_FAILURES = {FAILURE_BLOCKED, FAILURE_HTTP_4XX}
+
+
+def classify_failure(error: str) -> Optional[str]:
+    """根据Firecrawl错误信息判断失败类型；提供方限流(429)等与站点无关的错误返回None"""
+    message = (error or "").lower()
+    match = _STATUS_CODE_RE.search(message)
+    if match:
+        status = int(match.group(1))
+        if status == 429:
+            return None
+        if status in (401, 403, 451):
+            return FAILURE_BLOCKED
+        return FAILURE_HTTP_4XX if status < 500 else FAILURE_HTTP_5XX
+    if "timeout" in message or "timed out" in message:
+        return FAILURE_TIMEOUT
+    if any(hint in message for hint in _BLOCKED_HINTS):
+        return FAILURE_BLOCKED
+    return None
+
+
+# 抓取配置档 - 基于Firesearch最佳实践
+@dataclass
+class ScrapeProfile:
+    """抓取配置档参数（默认值为V1.5配置）"""
+    NAME: str = "v1"                        # 配置档名称（用于速率限制和日志）
+
+    # 速率限制
+    MAX_CONCURRENT_REQUESTS: int = 2        # 单次运行最大并发请求数
+    PRIORITY: int = PRIORITY_RESEARCH       # 调度优先级（可被scrape_context覆盖）
+    MAX_SOURCES_TO_SCRAPE: int = 3          # 最多抓取源数量
+    REQUEST_DELAY: float = 1.0              # 请求间延迟(秒)
+
+    # 重试配置
+    MAX_RETRIES: int = 2                    # 最大尝试次数（超时不重试）
+    RETRY_DELAY: float = 2.0                # 重试延迟(秒)
+
+    # 超时配置
+    SCRAPE_TIMEOUT: int = 15                # 抓取超时(秒)
+    URL_DEADLINE: float = 25                # 单个URL总时限（含排队和重试）(秒)
+    BATCH_TIMEOUT: int = 30                 # 批量超时(秒)，到期返回已完成的结果
+
+    # 内容限制
+    MIN_CONTENT_LENGTH: int = 100           # 最小内容长度
+    MAX_CONTENT_LENGTH: int = 4000          # 最大内容长度（按查询抽取相关段落）
+
+    # URL选择
+    QUALITY_THRESHOLD: float = 0.0          # 最低质量分数
+    PRIORITY_BONUS: float = 0.3             # 优先域名加分
+    FAILING_DOMAIN_PENALTY: float = 0.3     # 域名处于失败退避期时的降权
+    CANDIDATE_MULTIPLIER: int = 0           # 候选窗口 = 抓取数 × 倍数（0表示全部结果）
+
+    # 抓取方式
+    FORMATS: List[str] = None               # Firecrawl抓取格式
+    USE_BATCH_API: bool = False             # 多URL时使用Firecrawl批量接口
+    MOCK_WHEN_DISABLED: bool = False        # 未配置API Key时返回Mock内容
+
+    # 质量控制
+    PRIORITY_DOMAINS: List[str] = None      # 优先域名（'.edu'为类别后缀，其余匹配域名及子域名）
+    EXCLUDED_DOMAINS: List[str] = None      # 排除域名
+    EXCLUDED_EXTENSIONS: List[str] = None   # 排除的文件类型
+    DOMAIN_WEIGHTS: Dict[str, float] = None # 按域名的评分加减（默认取SCRAPE_ENGINE_CONFIG）
+
+    def __post_init__(self):
+        if self.FORMATS is None:
+            self.FORMATS = ["markdown"]
+
+        if self.PRIORITY_DOMAINS is None:
+            self.PRIORITY_DOMAINS = [
+                '.edu', '.gov', '.org',           # 权威机构
+                'wikipedia.org', 'arxiv.org',     # 学术资源
+                'github.com', 'stackoverflow.com' # 技术资源
+            ]
+
+        if self.EXCLUDED_DOMAINS is None:
+            self.EXCLUDED_DOMAINS = [
+                'twitter.com', 'facebook.com', 'instagram.com',  # 社交媒体
+                'tiktok.com', 'youtube.com',                     # 视频平台
+                'pinterest.com', 'reddit.com'                    # 其他社交
+            ]
+
+        if self.EXCLUDED_EXTENSIONS is None:
+            self.EXCLUDED_EXTENSIONS = ['.pdf', '.doc', '.docx', '.ppt', '.pptx', '.xls', '.xlsx']
+
+        if self.DOMAIN_WEIGHTS is None:
+            self.DOMAIN_WEIGHTS = dict(SCRAPE_ENGINE_CONFIG.get("domain_weights", {}))
+
+        self.compile_domain_policy()
+
+    def compile_domain_policy(self):
+        """编译域名规则（修改域名列表后需重新调用）"""
+        self.domain_policy = DomainPolicy(
+            priority=self.PRIORITY_DOMAINS,
+            excluded=self.EXCLUDED_DOMAINS,
+            weights=self.DOMAIN_WEIGHTS
+        )
+        self._excluded_extensions = tuple(ext.lower() for ext in self.EXCLUDED_EXTENSIONS)
+
+
+# V1.5配置档
+V1_PROFILE = ScrapeProfile()
+
+# V2配置档 - 更保守的设置
+V2_PROFILE = ScrapeProfile(
+    NAME="v2",
+    MAX_CONCURRENT_REQUESTS=2,              # 单次运行上限；提供方并发由AIMD窗口自适应控制
+    PRIORITY=PRIORITY_BACKGROUND,           # 深度研究为后台抓取，让位于快速搜索
+    MAX_SOURCES_TO_SCRAPE=2,                # V2减少抓取数量
+    REQUEST_DELAY=1.0,                      # V2请求间延迟（限流时由AIMD暂停接管）
+    MAX_RETRIES=1,                          # V2减少重试次数
+    RETRY_DELAY=3.0,                        # V2增加重试延迟
+    SCRAPE_TIMEOUT=10,                      # V2缩短超时时间
+    URL_DEADLINE=15,
+    BATCH_TIMEOUT=20,                       # V2缩短批量超时
+    MIN_CONTENT_LENGTH=50,                  # V2降低最小长度要求
+    MAX_CONTENT_LENGTH=2500,                # V2减少最大内容长度
+    QUALITY_THRESHOLD=0.6,
+    PRIORITY_BONUS=0.4,                     # 优先域名大幅加分
+    CANDIDATE_MULTIPLIER=3,                 # 扩大候选范围
+    FORMATS=["markdown", "html"],
+    USE_BATCH_API=True,
+    MOCK_WHEN_DISABLED=True,
+    PRIORITY_DOMAINS=[
+        '.edu', '.gov', '.org',
+        'wikipedia.org', 'arxiv.org'
+    ],
+    EXCLUDED_DOMAINS=[
+        'twitter.com', 'facebook.com', 'instagram.com',
+        'tiktok.com', 'youtube.com', 'linkedin.com',
+        'pinterest.com', 'reddit.com'
+    ]
+)
+
+
+class RateLimiter:
+    """按键的请求间隔限制器 - 线程安全，可跨事件循环使用"""
+
+    def __init__(self):
+        self._next_slot: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    async def acquire(self, key: str, interval: float):
+        """预约下一个可用时间槽并等待"""
+        if interval <= 0:
+            return
+
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(key, 0.0))
+            self._next_slot[key] = slot + interval
+
+        wait_time = slot - now
+        if wait_time > 0:
+            logger.debug(f"⏱️ 速率限制[{key}]：等待 {wait_time:.1f} 秒")
+            await asyncio.sleep(wait_time)
+
+
+class UrlSelectionPolicy:
+    """统一的URL筛选与评分策略"""
+
+    def is_suitable(self, url: str, profile: ScrapeProfile, rule: DomainRule = None) -> bool:
+        """判断URL是否适合增强 - 使用编译后的域名规则和文件类型过滤"""
+        if not url:
+            return False
+
+        # 检查排除域名
+        if rule is None:
+            rule = profile.domain_policy.lookup(url)
+        if rule.excluded:
+            return False
+
+        # 检查文件类型排除
+        if url.lower().endswith(profile._excluded_extensions):
+            return False
+
+        return True
+
+    def score(self, url: str, title: str, snippet: str, profile: ScrapeProfile,
+              rule: DomainRule = None) -> float:
+        """计算URL质量分数"""
+        if rule is None:
+            rule = profile.domain_policy.lookup(url)
+        score = 0.3  # 基础分数
+
+        # 标题/摘要信息量加分
+        if len(title or "") > 10:
+            score += 0.2
+        if len(snippet or "") > 50:
+            score += 0.2
+
+        # 优先域名加分，及按域名配置的权重
+        if rule.priority:
+            score += profile.PRIORITY_BONUS
+        score += rule.weight
+
+        # HTTPS加分
+        if url.startswith('https://'):
+            score += 0.1
+
+        # 避免过长URL
+        if len(url) > 200:
+            score -= 0.2
+
+        return min(1.0, max(0.0, score))
+
+    def score_batch(self, results: List[Dict], profile: ScrapeProfile) -> List[Optional[float]]:
+        """批量评分 - 一次匹配整批结果的域名规则；不适合增强的结果返回None"""
+        urls = [get_result_url(result) for result in results]
+        rules = profile.domain_policy.lookup_many(urls)
+        return [
+            self.score(url, result.get("title", ""), result.get("snippet", ""), profile, rule)
+            if self.is_suitable(url, profile, rule) else None
+            for result, url, rule in zip(results, urls, rules)
+        ]
+
+    def select(self,
+               results: List[Dict],
+               profile: ScrapeProfile,
+               max_count: int = None,
+               quality_threshold: float = None,
+               selected_domains: set = None,
+               failures: Dict[str, FailureRecord] = None,
+               fingerprints: SimHashIndex = None) -> List[str]:
+        """选择优先增强的URLs - 质量过滤、域名去重后按分数取前N个，摘要近重复的只抓取分数最高的一个
+
+        selected_domains: 跨批次共享的已选域名集合（流水线模式），会被更新
+        failures: 负缓存记录；URL处于退避期时跳过，域名处于退避期时降权
+        fingerprints: 跨批次共享的已选结果摘要指纹索引（流水线模式），会被更新
+        """
+        failures = failures or {}
+        if max_count is None:
+            max_count = profile.MAX_SOURCES_TO_SCRAPE
+        if quality_threshold is None:
+            quality_threshold = profile.QUALITY_THRESHOLD
+
+        candidates = results
+        if profile.CANDIDATE_MULTIPLIER:
+            candidates = results[:max_count * profile.CANDIDATE_MULTIPLIER]
+
+        url_scores = []
+        seen_domains = set(selected_domains) if selected_domains else set()
+        base_scores = self.score_batch(candidates, profile)
+
+        for result, score in zip(candidates, base_scores):
+            if score is None:
+                continue
+            url = get_result_url(result)
+
+            # 域名去重，提高多样性
+            domain = extract_domain(url)
+            if domain in seen_domains:
+                continue
+
+            failure = failures.get(url)
+            if failure and failure.scope == "url":
+                logger.info(f"🚫 跳过近期失败的URL: {domain} ({failure.failure_class})")
+                continue
+
+            if failure:
+                score -= profile.FAILING_DOMAIN_PENALTY
+            if score < quality_threshold:
+                continue
+
+            url_scores.append((url, score, domain, simhash(snippet_text(result))))
+            seen_domains.add(domain)
+
+        # 按分数排序并选择前N个，跳过与已选结果摘要近重复的（转载/镜像页面）
+        url_scores.sort(key=lambda x: x[1], reverse=True)
+        if fingerprints is None:
+            fingerprints = SimHashIndex()
+        selected = []
+        for url, score, domain, fingerprint in url_scores:
+            if len(selected) >= max_count:
+                break
+            duplicate_of = fingerprints.find(fingerprint)
+            if duplicate_of is not None:
+                logger.info(f"🧬 跳过近重复结果: {domain} (与 {extract_domain(duplicate_of)} 相似)")
+                continue
+            fingerprints.add(url, fingerprint)
+            selected.append((url, score, domain))
+
+        if selected_domains is not None:
+            selected_domains.update(domain for url, score, domain in selected)
+
+        logger.info(f"📌 [{profile.NAME}] 从{len(results)}个结果中选择了{len(selected)}个优质URL进行增强")
+        return [url for url, score, domain in selected]
+
+
+class ScrapeEngine:
+    """统一异步抓取引擎"""
+
+    def __init__(self, api_key: str = None):
+        self.api_key = api_key or os.getenv("FIRECRAWL_API_KEY")
+        self.config = SCRAPE_ENGINE_CONFIG
+        self.client = None
+        self.rate_limiter = RateLimiter()
+        self.policy = UrlSelectionPolicy()
+        self.scheduler = scrape_scheduler
+        self.concurrency = adaptive_concurrency
+        self.cache = page_cache
+        self.local = local_scrape_engine
+        self.budget = scrape_budget_planner
+        self.prefetcher = SpeculativePrefetcher(self)
+
+        if self.api_key:
+            try:
+                from firecrawl import AsyncFirecrawlApp
+                self.client = AsyncFirecrawlApp(api_key=self.api_key)
+                logger.info("🔥 统一抓取引擎: Firecrawl异步客户端初始化成功")
+            except Exception as e:
+                logger.error(f"❌ Firecrawl初始化失败: {e}")
+                self.client = None
+        else:
+            logger.info(f"ℹ️ Firecrawl API Key未配置，{'使用本地抓取引擎' if self.local.enabled else '抓取引擎未启用'}")
+
+    @property
+    def enabled(self) -> bool:
+        return self.client is not None or self.local.enabled
+
+    def _use_local(self, url: str) -> bool:
+        """Firecrawl不可用，或域名配置为优先本地抓取时走本地引擎（Firecrawl失败后的降级见_scrape_live）"""
+        return self.local.enabled and (self.client is None or self.local.handles(url))
+
+    # ===== URL选择 =====
+
+    def select_urls(self, results: List[Dict], profile: ScrapeProfile,
+                    failures: Dict[str, Any] = None, **kwargs) -> List[str]:
+        """按统一策略选择待抓取的URL，跳过或降权负缓存中的URL和域名
+
+        failures: 预先查询的负缓存记录（见aselect_urls），未提供时同步查询
+        """
+        if failures is None:
+            failures = self.cache.get_failures(get_result_url(result) for result in results)
+        return self.policy.select(results, profile, failures=failures, **kwargs)
+
+    def plan_urls(self, results: List[Dict], profile: ScrapeProfile, budget: float,
+                  max_count: int = None, selected_domains: set = None,
+                  fingerprints: SimHashIndex = None, failures: Dict[str, Any] = None,
+                  cached: set = None, **kwargs) -> List[str]:
+        """按时间预算选择待抓取的URL
+
+        先按统一策略选出候选（上限max_count），再根据预测耗时（域名历史、缓存、本地引擎）
+        和预测价值（选择分数、摘要稀薄程度）决定在预算内抓取哪些
+        selected_domains/fingerprints: 流水线模式下跨批次共享，只记录最终入选的URL
+        failures/cached: 预先查询的负缓存记录和已缓存URL（见aplan_urls），未提供时同步查询
+        """
+        if max_count is None:
+            max_count = self.budget.config["max_urls"]
+
+        # 候选池比上限大一倍，让价值预测（摘要稀薄程度）有重新排序的空间
+        candidate_urls = self.select_urls(
+            results, profile, failures=failures, max_count=max_count * 2,
+            selected_domains=set(selected_domains) if selected_domains is not None else None,
+            fingerprints=fingerprints.copy() if fingerprints is not None else None,
+            **kwargs
+        )
+        if not candidate_urls:
+            return []
+
+        by_url = {}
+        for result in results:
+            by_url.setdefault(get_result_url(result), result)
+        # 进行中的投机预抓取完成后同样命中缓存
+        if cached is None:
+            cached = self.cache.cached_urls(candidate_urls)
+        cached = cached | self.prefetcher.inflight_urls(candidate_urls)
+
+        candidates = []
+        for url in candidate_urls:
+            result = by_url.get(url, {})
+            domain = extract_domain(url)
+            score = self.policy.score(url, result.get("title", ""), result.get("snippet", ""), profile)
+            candidates.append(ScrapeCandidate(
+                url=url,
+                value=self.budget.predict_value(score, result.get("snippet", "")),
+                latency=self.budget.predict_latency(domain, cached=url in cached,
+                                                    local=self._use_local(url))
+            ))
+
+        concurrency = min(profile.MAX_CONCURRENT_REQUESTS, self.scheduler.config["max_concurrent"])
+        if self.client is not None:
+            concurrency = min(concurrency, self.concurrency.limiter("scrape").get_stats()["limit"])
+        selected = self.budget.plan(candidates, budget, concurrency, max_count)
+
+        if selected_domains is not None:
+            selected_domains.update(extract_domain(url) for url in selected)
+        if fingerprints is not None:
+            for url in selected:
+                fingerprints.add(url, simhash(snippet_text(by_url.get(url, {}))))
+        return selected
+
+    async def aselect_urls(self, results: List[Dict], profile: ScrapeProfile, **kwargs) -> List[str]:
+        """select_urls的异步版本：负缓存查询在线程中执行"""
+        failures = await self.cache.aget_failures(get_result_url(result) for result in results)
+        return self.select_urls(results, profile, failures=failures, **kwargs)
+
+    async def aplan_urls(self, results: List[Dict], profile: ScrapeProfile, budget: float,
+                         **kwargs) -> List[str]:
+        """plan_urls的异步版本：负缓存和已缓存URL在线程中一次查询"""
+        urls = [get_result_url(result) for result in results]
+        failures, cached = await asyncio.to_thread(
+            lambda: (self.cache.get_failures(urls), self.cache.cached_urls(urls))
+        )
+        return self.plan_urls(results, profile, budget, failures=failures, cached=cached, **kwargs)
+
+    # ===== 结果构建 =====
+
+    def _parse_response(self, response: Any):
+        """解析AsyncFirecrawlApp响应 - 兼容ScrapeResponse对象和字典格式，返回(markdown, html, metadata)"""
+        if hasattr(response, 'success'):
+            if not response.success:
+                return "", "", {}
+            metadata = getattr(response, 'metadata', {}) or {}
+            markdown = getattr(response, 'markdown', '') or ''
+            html = getattr(response, 'html', '') or ''
+        elif isinstance(response, dict):
+            metadata = response.get('metadata', {}) or {}
+            markdown = response.get('markdown', '') or ''
+            html = response.get('html', '') or ''
+        else:
+            return "", "", {}
+
+        return markdown.strip(), html, metadata if isinstance(metadata, dict) else {}
+
+    def _build_doc(self, url: str, markdown: str, html: str, metadata: Dict[str, Any],
+                   profile: ScrapeProfile, source: str, query: str = "") -> Dict[str, Any]:
+        """按配置档的长度限制构建抓取结果；超长内容按查询抽取最相关的段落"""
+        domain = extract_domain(url)
+        content = markdown or html or ""
+
+        # 内容长度检查
+        if len(content) < profile.MIN_CONTENT_LENGTH:
+            logger.warning(f"⚠️ 内容过短: {domain} ({len(content)} 字符)")
+            return self._failed_doc(url, "内容过短", "too_short")
+
+        # 超长内容：在字符预算内保留与查询最相关的段落（无查询时截取开头）
+        if len(content) > profile.MAX_CONTENT_LENGTH:
+            original_length = len(content)
+            content = extract_passages(content, query, profile.MAX_CONTENT_LENGTH)
+            logger.info(f"✂️ 段落抽取: {domain} ({original_length} → {len(content)} 字符)")
+
+        return {
+            "success": True,
+            "url": url,
+            "title": metadata.get("title", "") or f"Content from {domain}",
+            "content": content,
+            "html": html,
+            "metadata": metadata,
+            "word_count": len(content.split()),
+            "extraction_time": time.time(),
+            "source": source
+        }
+
+    def _failed_doc(self, url: str, error: str, source: str = "firecrawl_failed") -> Dict[str, Any]:
+        """失败结果 - 空内容，不污染报告"""
+        return {
+            "success": False,
+            "url": url,
+            "title": "增强失败",
+            "content": "",
+            "error": error,
+            "source": source
+        }
+
+    def _doc_from_cache(self, url: str, cached: CachedPage, profile: ScrapeProfile,
+                        query: str = "") -> Dict[str, Any]:
+        """将缓存条目转换为抓取结果"""
+        if cached.negative:
+            logger.info(f"🚫 负缓存跳过: {extract_domain(url)} ({cached.error})")
+            return self._failed_doc(url, f"负缓存: {cached.error}", "page_cache_negative")
+
+        logger.info(f"💾 缓存命中: {extract_domain(url)}")
+        return self._build_doc(
+            url,
+            cached.content.get("markdown", ""),
+            cached.content.get("html", ""),
+            cached.metadata,
+            profile,
+            source="page_cache",
+            query=query
+        )
+
+    async def mock_scrape(self, url: str) -> Dict[str, Any]:
+        """Mock抓取模式 - 降级方案"""
+        # 模拟网络延迟
+        await asyncio.sleep(0.5)
+
+        return {
+            "success": True,
+            "url": url,
+            "title": f"增强内容 - {url.split('/')[-1]}",
+            "content": f"从 {url} 获取的增强内容：\n\n" +
+                      "这是通过Firecrawl深度抓取获得的高质量内容。" * 20,
+            "metadata": {"source": "firecrawl_mock", "quality": "high"},
+            "word_count": 800,
+            "extraction_time": time.time(),
+            "source": "firecrawl_mock"
+        }
+
+    # ===== 抓取 =====
+
+    async def _acquire_slot(self, profile: ScrapeProfile):
+        """全局（提供方）与配置档两级速率限制"""
+        await self.rate_limiter.acquire("global", self.config["global_request_delay"])
+        await self.rate_limiter.acquire(profile.NAME, profile.REQUEST_DELAY)
+
+    async def _store(self, url: str, formats: List[str], markdown: str, html: str, metadata: Dict[str, Any]):
+        """写入页面缓存 - 缓存未截断的原始内容，供不同长度限制的配置档共享"""
+        content = markdown or html or ""
+        if len(content) < self.config["min_cacheable_length"]:
+            await self.cache.aput_negative(url, FAILURE_TOO_SHORT)
+        else:
+            await self.cache.aput(url, formats, {"markdown": markdown, "html": html}, metadata)
+
+    async def scrape_url(self, url: str, profile: ScrapeProfile,
+                         options: Dict[str, Any] = None, query: str = "") -> Dict[str, Any]:
+        """抓取单个URL（缓存 → 速率限制 → Firecrawl或本地引擎 → 缓存写入）"""
+        options = options or {}
+        formats = options.get("formats", profile.FORMATS)
+
+        cached = await self.cache.aget(url, formats)
+        if cached is not None:
+            return self._doc_from_cache(url, cached, profile, query)
+
+        use_local = self._use_local(url)
+        if not self.client and not use_local:
+            if profile.MOCK_WHEN_DISABLED:
+                return await self.mock_scrape(url)
+            return self._failed_doc(url, "Firecrawl未启用")
+
+        # 记录实际耗时（含重试，不含排队），供抓取预算规划预测域名耗时
+        started = time.monotonic()
+        doc = await self._scrape_live(url, profile, options, formats, use_local, query)
+        self.budget.record(extract_domain(url), time.monotonic() - started)
+        return doc
+
+    async def _scrape_live(self, url: str, profile: ScrapeProfile, options: Dict[str, Any],
+                           formats: List[str], use_local: bool, query: str) -> Dict[str, Any]:
+        """通过Firecrawl或本地引擎实际抓取（带重试），写入缓存"""
+        scrape_kwargs = {
+            "formats": formats,
+            "only_main_content": True,
+            "timeout": profile.SCRAPE_TIMEOUT * 1000  # 转换为毫秒
+        }
+        scrape_kwargs.update(options)
+
+        domain = extract_domain(url)
+        source = f"{'local' if use_local else 'firecrawl'}_{profile.NAME}"
+        last_error = ""
+        attempts = max(1, profile.MAX_RETRIES)
+
+        for attempt in range(attempts):
+            try:
+                logger.info(f"🔄 [{source}] 正在抓取: {domain} (尝试 {attempt + 1}/{attempts})")
+
+                if use_local:
+                    # 本地抓取直接访问目标站点，礼貌性由调度器的域名并发限制保证
+                    markdown, html, metadata = await asyncio.wait_for(
+                        self.local.scrape(url),
+                        timeout=profile.SCRAPE_TIMEOUT
+                    )
+                else:
+                    # 提供方并发由AIMD窗口控制，429/超时会缩小窗口
+                    async with self.concurrency.limit("scrape"):
+                        await self._acquire_slot(profile)
+                        response = await asyncio.wait_for(
+                            self.client.scrape_url(url, **scrape_kwargs),
+                            timeout=profile.SCRAPE_TIMEOUT
+                        )
+
+                    if not response:
+                        # 提供方无响应：记入负缓存，走下方的本地引擎降级
+                        logger.warning(f"⚠️ 无响应: {domain}")
+                        last_error = "No response from Firecrawl"
+                        await self.cache.aput_negative(url, FAILURE_EMPTY)
+                        break
+
+                    markdown, html, metadata = self._parse_response(response)
+
+                if not (markdown or html):
+                    logger.warning(f"⚠️ 无有效内容: {domain}")
+                    await self.cache.aput_negative(url, FAILURE_EMPTY)
+                    return self._failed_doc(url, f"{'Local engine' if use_local else 'Firecrawl'} scraping failed")
+
+                await self._store(url, formats, markdown, html, metadata)
+                doc = self._build_doc(url, markdown, html, metadata, profile,
+                                      source=source, query=query)
+                if doc["success"]:
+                    logger.info(f"✅ 成功抓取: {domain} ({len(doc['content'])} 字符)")
+                return doc
+
+            except asyncio.TimeoutError:
+                # 超时已消耗完整等待时间，不再重试
+                logger.warning(f"⏰ 抓取超时: {domain}")
+                await self.cache.aput_negative(url, FAILURE_TIMEOUT)
+                return self._failed_doc(url, "请求超时")
+            except Exception as e:
+                last_error = str(e)
+                failure_class = classify_failure(last_error)
+                logger.warning(f"❌ 抓取失败: {domain} - {last_error} (尝试 {attempt + 1})")
+                if failure_class in NON_RETRYABLE_FAILURES or attempt == attempts - 1:
+                    if failure_class:
+                        await self.cache.aput_negative(url, failure_class)
+                    break
+
+            # 指数退避策略
+            if attempt < attempts - 1:
+                await asyncio.sleep(profile.RETRY_DELAY * (2 ** attempt))
+
+        # Firecrawl侧的失败（限流、5xx、未分类错误）改用本地引擎抓取；站点拦截和4xx换引擎也无济于事
+        if not use_local and self.local.enabled and classify_failure(last_error) in (None, FAILURE_HTTP_5XX):
+            logger.info(f"↩️ Firecrawl抓取失败，改用本地引擎: {domain}")
+            return await self._scrape_live(url, profile, options, formats, True, query)
+
+        return self._failed_doc(url, last_error)
+
+    async def _batch_api_scrape(self, urls: List[str], profile: ScrapeProfile,
+                                options: Dict[str, Any], deadline: float,
+                                query: str = "") -> Optional[Dict[str, Dict[str, Any]]]:
+        """使用Firecrawl批量接口抓取，失败或到达截止时间（time.monotonic()）时返回None"""
+        formats = options.get("formats", profile.FORMATS)
+        batch_kwargs = {
+            "formats": formats,
+            "only_main_content": True,
+            "timeout": profile.SCRAPE_TIMEOUT * 1000
+        }
+        batch_kwargs.update(options)
+
+        try:
+            async with self.concurrency.limit("batch_scrape"):
+                await self._acquire_slot(profile)
+                timeout = min(profile.BATCH_TIMEOUT, deadline - time.monotonic())
+                try:
+                    batch_result = await asyncio.wait_for(
+                        self.client.batch_scrape_urls(urls, **batch_kwargs),
+                        timeout=max(timeout, 0)
+                    )
+                except asyncio.TimeoutError:
+                    if timeout >= profile.BATCH_TIMEOUT:
+                        raise
+                    # 调用方截止时间先到，不是提供方过载，不缩小并发窗口
+                    logger.warning(f"⏰ 批量Firecrawl抓取到达截止时间 ({max(timeout, 0):.1f}秒)")
+                    return None
+        except Exception as e:
+            logger.warning(f"🔥 批量Firecrawl抓取失败，降级到单个抓取: {e or type(e).__name__}")
+            return None
+
+        if not (batch_result and getattr(batch_result, 'success', False)):
+            return None
+
+        docs = {}
+        for item in getattr(batch_result, 'data', []) or []:
+            if not item:
+                continue
+            markdown, html, metadata = self._parse_response(item)
+            url = metadata.get("sourceURL") or metadata.get("url") or ""
+            if not url or not (markdown or html):
+                continue
+            await self._store(url, formats, markdown, html, metadata)
+            docs[url] = self._build_doc(url, markdown, html, metadata, profile,
+                                        source=f"firecrawl_{profile.NAME}_batch", query=query)
+
+        logger.info(f"🔥 批量Firecrawl抓取完成: {len(docs)}/{len(urls)} 成功")
+        return docs
+
+    async def _acquire_batch_capacity(self, urls: List[str], profile: ScrapeProfile, deadline: float):
+        """为批量抓取占用调度器名额（每个URL一个，受全局/域名/运行并发限制）；截止时间前未获得时返回None"""
+        try:
+            return await asyncio.wait_for(
+                self.scheduler.acquire_batch(urls, deadline=deadline,
+                                             run_limit=profile.MAX_CONCURRENT_REQUESTS,
+                                             priority=profile.PRIORITY),
+                timeout=max(deadline - time.monotonic(), 0)
+            )
+        except asyncio.TimeoutError:
+            logger.warning(f"⏰ [{profile.NAME}] 截止时间前未获得批量抓取名额，改为逐个抓取")
+            return None
+
+    def _use_batch_job(self, urls: List[str]) -> bool:
+        return (BATCH_JOB_CONFIG["enabled"]
+                and len(urls) >= BATCH_JOB_CONFIG["min_urls"]
+                and supports_batch_jobs(self.client))
+
+    async def _batch_job_scrape(self, urls: List[str], profile: ScrapeProfile,
+                                options: Dict[str, Any], deadline: float,
+                                query: str = "") -> AsyncIterator[Dict[str, Any]]:
+        """通过Firecrawl异步批量任务抓取，按完成顺序产出成功的结果
+
+        任务占用一个batch_scrape并发名额直到结束；提交或轮询失败时结束产出，
+        未产出的URL由调用方降级为单个抓取
+        """
+        formats = options.get("formats", profile.FORMATS)
+        batch_kwargs = {
+            "formats": formats,
+            "only_main_content": True,
+            "timeout": profile.SCRAPE_TIMEOUT * 1000
+        }
+        batch_kwargs.update(options)
+        requested = set(urls)
+        yielded = 0
+
+        job = BatchScrapeJob(self.client, urls, batch_kwargs)
+        try:
+            async with self.concurrency.limit("batch_scrape"):
+                await self._acquire_slot(profile)
+                async for page in job.pages(deadline):
+                    url = page_url(page)
+                    if url not in requested:
+                        continue
+                    markdown, html, metadata = self._parse_response(page)
+                    if not (markdown or html):
+                        continue
+                    await self._store(url, formats, markdown, html, metadata)
+                    yielded += 1
+                    yield self._build_doc(url, markdown, html, metadata, profile,
+                                          source=f"firecrawl_{profile.NAME}_batch", query=query)
+        except Exception as e:
+            logger.warning(f"🔥 Firecrawl批量任务失败，降级到单个抓取: {e or type(e).__name__}")
+            return
+
+        logger.info(f"🔥 Firecrawl批量任务结束 ({job.status}): {yielded}/{len(urls)} 成功，轮询 {job.polls} 次")
+
+    async def iter_scrape(self, urls: List[str], profile: ScrapeProfile,
+                          options: Dict[str, Any] = None,
+                          deadline: float = None,
+                          query: str = "") -> AsyncIterator[Dict[str, Any]]:
+        """按完成顺序逐个产出抓取结果
+
+        每个URL受URL_DEADLINE限制；批量截止时间（默认BATCH_TIMEOUT）到达时
+        取消仍未完成的抓取，已完成的结果不受影响。query用于超长页面的段落抽取
+        """
+        options = options or {}
+        formats = options.get("formats", profile.FORMATS)
+        batch_deadline = time.monotonic() + (deadline if deadline is not None else profile.BATCH_TIMEOUT)
+        pending = []
+
+        # 投机预抓取过的URL：等待进行中的预抓取写入缓存
+        await self.prefetcher.settle(urls, timeout=batch_deadline - time.monotonic())
+
+        # 缓存命中立即产出（一次批量查询）
+        cached_pages = await self.cache.aget_many(urls, formats)
+        for url in urls:
+            cached = cached_pages.get(url)
+            if cached is not None:
+                yield self._doc_from_cache(url, cached, profile, query)
+            else:
+                pending.append(url)
+
+        if len(pending) < len(urls):
+            logger.info(f"💾 [{profile.NAME}] 缓存命中: {len(urls) - len(pending)}/{len(urls)}")
+
+        # 尝试使用Firecrawl的批量抓取功能
+        firecrawl_pending = [url for url in pending if not self._use_local(url)]
+        if self.client and profile.USE_BATCH_API and len(firecrawl_pending) > 1:
+            use_batch_job = self._use_batch_job(firecrawl_pending)
+            # 阻塞式批量接口没有部分结果：调用方的截止时间比批量超时更短时直接逐个抓取，
+            # 截止时间到达时仍能产出已完成的页面
+            if use_batch_job or deadline is None or deadline >= profile.BATCH_TIMEOUT:
+                # 批量抓取同样经过调度器：按URL数占用名额，遵守优先级和域名并发限制
+                ticket = await self._acquire_batch_capacity(firecrawl_pending, profile, batch_deadline)
+            else:
+                ticket = None
+            if ticket is not None:
+                try:
+                    if use_batch_job:
+                        # 异步批量任务：页面完成即产出，截止时间到达时取消任务
+                        scraped = set()
+                        async for doc in self._batch_job_scrape(firecrawl_pending, profile, options,
+                                                                batch_deadline, query):
+                            scraped.add(doc["url"])
+                            yield doc
+                        pending = [url for url in pending if url not in scraped]
+                    else:
+                        batch_docs = await self._batch_api_scrape(firecrawl_pending, profile, options,
+                                                                  batch_deadline, query)
+                        if batch_docs:
+                            for url in firecrawl_pending:
+                                if url in batch_docs:
+                                    yield batch_docs[url]
+                            pending = [url for url in pending if url not in batch_docs]
+                finally:
+                    self.scheduler.release(ticket)
+
+        # 批量任务未完成的URL在剩余时间内逐个抓取
+        if not pending or time.monotonic() >= batch_deadline:
+            return
+
+        # 通过进程级调度器排队：全局/域名/运行并发限制，按优先级、截止时间和排名分配名额
+        async def scrape_with_limit(url: str, rank: int) -> Dict[str, Any]:
+            async with self.scheduler.slot(url,
+                                           deadline=batch_deadline,
+                                           rank=rank,
+                                           run_limit=profile.MAX_CONCURRENT_REQUESTS,
+                                           priority=profile.PRIORITY):
+                try:
+                    return await asyncio.wait_for(
+                        self.scrape_url(url, profile, options, query),
+                        timeout=profile.URL_DEADLINE
+                    )
+                except asyncio.TimeoutError:
+                    logger.warning(f"⏰ 超过单URL时限: {extract_domain(url)} ({profile.URL_DEADLINE}秒)")
+                    return self._failed_doc(url, "请求超时")
+
+        tasks = {asyncio.create_task(scrape_with_limit(url, rank)): url for rank, url in enumerate(pending)}
+        try:
+            while tasks:
+                remaining = batch_deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+
+                done, _ = await asyncio.wait(tasks, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    url = tasks.pop(task)
+                    try:
+                        yield task.result()
+                    except Exception as e:
+                        logger.error(f"❌ 任务异常: {e}")
+                        yield self._failed_doc(url, str(e))
+        finally:
+            # 截止时间到达或调用方提前结束：取消剩余的抓取
+            if tasks:
+                logger.warning(f"⏰ [{profile.NAME}] 批量抓取到达截止时间，取消 {len(tasks)} 个未完成的URL")
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def scrape_urls(self, urls: List[str], profile: ScrapeProfile,
+                          options: Dict[str, Any] = None,
+                          deadline: float = None,
+                          query: str = "") -> List[Dict[str, Any]]:
+        """批量抓取URLs - 返回截止时间内完成的结果（按输入顺序）"""
+        docs: Dict[str, Dict[str, Any]] = {}
+        async for doc in self.iter_scrape(urls, profile, options, deadline, query):
+            docs[doc["url"]] = doc
+
+        results = [docs[url] for url in urls if url in docs]
+        successful_count = sum(1 for doc in results if doc.get("success"))
+        logger.info(f"🔥 [{profile.NAME}] 批量抓取完成: {successful_count}/{len(urls)} 成功")
+        return results
+
+
+# 全局引擎实例
+scrape_engine = ScrapeEngine()
@@ -0,0 +1,275 @@
+"""
+进程级抓取调度器
+所有抓取请求共享一个优先队列：按优先级、截止时间和URL排名排序，
+同时限制全局并发、单域名并发和单次运行并发，并在并发研究运行之间公平分配名额。
+Firecrawl批量抓取按URL数占用多个名额（batch_slot），同样受这些限制。
+调度器跨事件循环可用（后台事件循环和API事件循环共享同一实例）
+"""
+
+import asyncio
+import contextvars
+import itertools
+import logging
+import threading
+import time
+from collections import Counter
+from contextlib import asynccontextmanager, contextmanager
+from dataclasses import dataclass, field
+from typing import Dict, Any, Optional, AsyncIterator, List
+
+from .config import SCRAPE_SCHEDULER_CONFIG
+from .url_utils import extract_domain
+
+logger = logging.getLogger(__name__)
+
+# 优先级（数值越小越优先）
+PRIORITY_INTERACTIVE = 0   # 快速搜索等用户正在等待的请求
+PRIORITY_RESEARCH = 1      # V1研究流程
+PRIORITY_BACKGROUND = 2    # V2深度研究的后台抓取
+
+
+@dataclass
+class ScrapeContext:
+    """当前抓取请求所属的运行和优先级"""
+    run_id: str = "default"
+    priority: Optional[int] = None
+
+
+_scrape_context: contextvars.ContextVar = contextvars.ContextVar("scrape_context", default=ScrapeContext())
+
+
+@contextmanager
+def scrape_context(run_id: str = None, priority: int = None):
+    """设置当前上下文（及其创建的任务）中抓取请求的运行ID和优先级
+
+    上下文变量会随run_coroutine_threadsafe和create_task传递到后台事件循环
+    """
+    current = _scrape_context.get()
+    token = _scrape_context.set(ScrapeContext(
+        run_id=run_id or current.run_id,
+        priority=priority if priority is not None else current.priority
+    ))
+    try:
+        yield
+    finally:
+        try:
+            _scrape_context.reset(token)
+        except ValueError:
+            # 异步生成器可能在其他上下文中被关闭
+            pass
+
+
+async def with_scrape_context(stream: AsyncIterator[Any], run_id: str = None,
+                              priority: int = None) -> AsyncIterator[Any]:
+    """在指定抓取上下文中迭代异步生成器（用于流式响应）"""
+    with scrape_context(run_id=run_id, priority=priority):
+        async for item in stream:
+            yield item
+
+
+def get_scrape_context() -> ScrapeContext:
+    return _scrape_context.get()
+
+
+@dataclass
+class _Ticket:
+    """等待或持有调度名额的抓取请求"""
+    priority: int
+    deadline: float
+    rank: int
+    seq: int
+    domains: Counter                # 域名 -> 占用的名额数
+    weight: int                     # 占用的全局/运行名额数（单个URL为1）
+    run_id: str
+    run_limit: Optional[int]
+    loop: asyncio.AbstractEventLoop
+    future: asyncio.Future
+    enqueued_at: float = field(default_factory=time.monotonic)
+    granted: bool = False
+
+
+class ScrapeScheduler:
+    """全局抓取调度器"""
+
+    def __init__(self, config: Dict[str, Any] = None):
+        self.config = {**SCRAPE_SCHEDULER_CONFIG, **(config or {})}
+        self._lock = threading.Lock()
+        self._waiting = []
+        self._active = 0
+        self._domain_active: Counter = Counter()
+        self._run_active: Counter = Counter()
+        self._seq = itertools.count()
+        self.stats = {
+            "granted": 0,
+            "cancelled": 0,
+            "max_wait": 0.0,
+            "total_wait": 0.0
+        }
+
+    # ===== 内部调度 =====
+
+    def _is_eligible(self, ticket: _Ticket) -> bool:
+        if self._active + ticket.weight > self.config["max_concurrent"]:
+            return False
+        per_domain = self.config["per_domain_concurrent"]
+        if any(self._domain_active[domain] + count > per_domain for domain, count in ticket.domains.items()):
+            return False
+        if ticket.run_limit and self._run_active[ticket.run_id] + ticket.weight > ticket.run_limit:
+            return False
+        return True
+
+    def _order_key(self, ticket: _Ticket):
+        # 同一优先级内，正在占用名额较少的运行先获得名额（公平共享）
+        return (ticket.priority, self._run_active[ticket.run_id],
+                ticket.deadline, ticket.rank, ticket.seq)
+
+    def _dispatch_locked(self):
+        """分配空闲名额给队列中最优先的可运行请求"""
+        while self._waiting:
+            candidates = [ticket for ticket in self._waiting if self._is_eligible(ticket)]
+            if not candidates:
+                return
+
+            ticket = min(candidates, key=self._order_key)
+            self._waiting.remove(ticket)
+            ticket.granted = True
+            self._active += ticket.weight
+            self._domain_active.update(ticket.domains)
+            self._run_active[ticket.run_id] += ticket.weight
+
+            wait_time = time.monotonic() - ticket.enqueued_at
+            self.stats["granted"] += 1
+            self.stats["total_wait"] += wait_time
+            self.stats["max_wait"] = max(self.stats["max_wait"], wait_time)
+
+            try:
+                ticket.loop.call_soon_threadsafe(self._resolve, ticket.future)
+            except RuntimeError:
+                # 请求方的事件循环已关闭，立即归还名额
+                self._release_locked(ticket)
+
+    @staticmethod
+    def _resolve(future: asyncio.Future):
+        if not future.done():
+            future.set_result(None)
+
+    def _release_locked(self, ticket: _Ticket):
+        if not ticket.granted:
+            return
+        ticket.granted = False
+        self._active -= ticket.weight
+        for domain, count in ticket.domains.items():
+            self._domain_active[domain] -= count
+            if self._domain_active[domain] <= 0:
+                del self._domain_active[domain]
+        self._run_active[ticket.run_id] -= ticket.weight
+        if self._run_active[ticket.run_id] <= 0:
+            del self._run_active[ticket.run_id]
+
+    # ===== 公共接口 =====
+
+    async def acquire(self, url: str, deadline: float = None, rank: int = 0,
+                      run_limit: int = None, priority: int = None) -> _Ticket:
+        """排队等待抓取名额
+
+        deadline: 请求截止时间（time.monotonic()），越早越优先
+        rank: URL在本批次中的排名（选择策略已按分数排序），越小越优先
+        run_limit: 当前运行允许的最大并发数
+        priority: 未通过scrape_context指定优先级时使用的默认优先级
+        """
+        return await self._enqueue(Counter({extract_domain(url): 1}), 1,
+                                   deadline, rank, run_limit, priority)
+
+    async def acquire_batch(self, urls: List[str], deadline: float = None, rank: int = 0,
+                            run_limit: int = None, priority: int = None) -> _Ticket:
+        """为一次批量抓取排队：每个URL占一个名额，上限为全局/运行/单域名的并发限制
+
+        名额按上限截断，保证批量请求总能在空闲时获得调度；参数同acquire
+        """
+        per_domain = self.config["per_domain_concurrent"]
+        domains = Counter(extract_domain(url) for url in urls)
+        domains = Counter({domain: min(count, per_domain) for domain, count in domains.items()})
+        weight = min(len(urls), self.config["max_concurrent"], run_limit or len(urls))
+        return await self._enqueue(domains, max(1, weight), deadline, rank, run_limit, priority)
+
+    async def _enqueue(self, domains: Counter, weight: int, deadline: Optional[float], rank: int,
+                       run_limit: Optional[int], priority: Optional[int]) -> _Ticket:
+        context = get_scrape_context()
+        if context.priority is not None:
+            priority = context.priority
+        elif priority is None:
+            priority = PRIORITY_RESEARCH
+
+        loop = asyncio.get_running_loop()
+        ticket = _Ticket(
+            priority=priority,
+            deadline=deadline if deadline is not None else float("inf"),
+            rank=rank,
+            seq=next(self._seq),
+            domains=domains,
+            weight=weight,
+            run_id=context.run_id,
+            run_limit=run_limit,
+            loop=loop,
+            future=loop.create_future()
+        )
+
+        with self._lock:
+            self._waiting.append(ticket)
+            self._dispatch_locked()
+
+        try:
+            await ticket.future
+        except asyncio.CancelledError:
+            with self._lock:
+                if ticket in self._waiting:
+                    self._waiting.remove(ticket)
+                else:
+                    self._release_locked(ticket)
+                    self._dispatch_locked()
+                self.stats["cancelled"] += 1
+            raise
+
+        return ticket
+
+    def release(self, ticket: _Ticket):
+        """归还名额并唤醒下一个请求"""
+        with self._lock:
+            self._release_locked(ticket)
+            self._dispatch_locked()
+
+    @asynccontextmanager
+    async def slot(self, url: str, **kwargs):
+        """占用一个抓取名额的上下文"""
+        ticket = await self.acquire(url, **kwargs)
+        try:
+            yield ticket
+        finally:
+            self.release(ticket)
+
+    @asynccontextmanager
+    async def batch_slot(self, urls: List[str], **kwargs):
+        """占用一次批量抓取所需名额的上下文（见acquire_batch）"""
+        ticket = await self.acquire_batch(urls, **kwargs)
+        try:
+            yield ticket
+        finally:
+            self.release(ticket)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取调度统计"""
+        with self._lock:
+            granted = self.stats["granted"]
+            return {
+                **self.stats,
+                "average_wait": self.stats["total_wait"] / granted if granted else 0.0,
+                "active": self._active,
+                "waiting": len(self._waiting),
+                "active_runs": len(self._run_active),
+                "max_concurrent": self.config["max_concurrent"],
+                "per_domain_concurrent": self.config["per_domain_concurrent"]
+            }
+
+
+# 全局调度器实例
+scrape_scheduler = ScrapeScheduler()
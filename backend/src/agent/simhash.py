@@ -0,0 +1,181 @@
+"""
+SimHash近重复检测
+转载新闻、镜像文档等内容几乎相同的页面和摘要只保留一份，
+在URL抓取选择前（按摘要）和提示词组装前（按正文）折叠近重复结果，减少重复token
+"""
+
+import hashlib
+import logging
+from typing import Any, Callable, Dict, List, Optional
+
+from .config import NEAR_DUPLICATE_CONFIG
+from .ranking import tokenize
+from .url_utils import get_result_url
+
+logger = logging.getLogger(__name__)
+
+FINGERPRINT_BITS = 64
+
+
+def _feature_hash(feature: str) -> int:
+    return int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+def simhash(text: str, config: Dict[str, Any] = None) -> Optional[int]:
+    """计算文本的64位SimHash指纹；词项过少时返回None（不参与判重）"""
+    config = config or NEAR_DUPLICATE_CONFIG
+    tokens = tokenize((text or "")[:config["max_chars"]])
+    if len(tokens) < config["min_tokens"]:
+        return None
+
+    size = max(1, config["shingle_size"])
+    features: Dict[str, int] = {}
+    for i in range(max(1, len(tokens) - size + 1)):
+        feature = " ".join(tokens[i:i + size])
+        features[feature] = features.get(feature, 0) + 1
+
+    weights = [0] * FINGERPRINT_BITS
+    for feature, weight in features.items():
+        value = _feature_hash(feature)
+        for bit in range(FINGERPRINT_BITS):
+            if value >> bit & 1:
+                weights[bit] += weight
+            else:
+                weights[bit] -= weight
+
+    fingerprint = 0
+    for bit, weight in enumerate(weights):
+        if weight > 0:
+            fingerprint |= 1 << bit
+    return fingerprint
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+class SimHashIndex:
+    """近重复查找索引
+
+    指纹按max_distance+1段切分：汉明距离不超过max_distance的两个指纹至少有一段完全相同（抽屉原理），
+    只需与同段相同的候选比较
+    """
+
+    def __init__(self, max_distance: int = None):
+        if max_distance is None:
+            max_distance = NEAR_DUPLICATE_CONFIG["max_distance"]
+        self.max_distance = max_distance
+        blocks = max_distance + 1
+        width = FINGERPRINT_BITS // blocks
+        self._blocks = [
+            (i * width, FINGERPRINT_BITS - i * width if i == blocks - 1 else width)
+            for i in range(blocks)
+        ]
+        self._buckets: List[Dict[int, List[tuple]]] = [{} for _ in self._blocks]
+
+    def _segments(self, fingerprint: int):
+        for i, (offset, width) in enumerate(self._blocks):
+            yield i, fingerprint >> offset & ((1 << width) - 1)
+
+    def find(self, fingerprint: Optional[int]) -> Optional[Any]:
+        """返回已索引的近重复项的键，没有时返回None"""
+        if fingerprint is None:
+            return None
+        for i, segment in self._segments(fingerprint):
+            for key, other in self._buckets[i].get(segment, ()):
+                if hamming_distance(fingerprint, other) <= self.max_distance:
+                    return key
+        return None
+
+    def copy(self) -> "SimHashIndex":
+        clone = SimHashIndex(self.max_distance)
+        clone._buckets = [{segment: list(entries) for segment, entries in bucket.items()}
+                          for bucket in self._buckets]
+        return clone
+
+    def add(self, key: Any, fingerprint: Optional[int]):
+        if fingerprint is None:
+            return
+        for i, segment in self._segments(fingerprint):
+            self._buckets[i].setdefault(segment, []).append((key, fingerprint))
+
+
+def snippet_text(result: Any) -> str:
+    """搜索摘要文本（标题+摘要），用于抓取前判重"""
+    if not isinstance(result, dict):
+        return str(result)
+    return f"{result.get('title') or ''}\n{result.get('snippet') or ''}"
+
+
+def content_text(result: Any) -> str:
+    """结果的完整文本（优先抓取的正文），用于提示词组装前判重"""
+    if not isinstance(result, dict):
+        return str(result)
+    content = result.get("enhanced_content") or result.get("content") or result.get("snippet") or ""
+    if not isinstance(content, str):
+        content = str(content)
+    return f"{result.get('title') or ''}\n{content}"
+
+
+def _richness(result: Any) -> int:
+    """代表项优先级：已抓取正文的结果优先，其次内容更长的"""
+    if not isinstance(result, dict):
+        return len(str(result))
+    enhanced = result.get("enhanced") or result.get("is_enhanced")
+    return (1 << 30 if enhanced else 0) + len(content_text(result))
+
+
+def fold_near_duplicates(results: List[Any],
+                         text_fn: Callable[[Any], str] = content_text,
+                         max_distance: int = None) -> List[Any]:
+    """
+    将近重复结果折叠为一条来源记录
+
+    Args:
+        results: 搜索结果列表（dict，或任意可转字符串的对象）
+        text_fn: 参与指纹计算的文本
+        max_distance: 汉明距离阈值，默认取配置
+
+    Returns:
+        list: 每组近重复保留内容最丰富的一条，位置取该组首次出现的位置；
+              被折叠结果的URL记录在保留项的duplicate_urls中（保留项为副本，不修改输入）
+    """
+    if not NEAR_DUPLICATE_CONFIG["enabled"] or not results or len(results) < 2:
+        return list(results or [])
+
+    index = SimHashIndex(max_distance)
+    kept: List[Any] = []
+    folded: Dict[int, List[Any]] = {}
+
+    for result in results:
+        fingerprint = simhash(text_fn(result))
+        position = index.find(fingerprint)
+        if position is None:
+            index.add(len(kept), fingerprint)
+            kept.append(result)
+            continue
+        folded.setdefault(position, []).append(result)
+        if _richness(result) > _richness(kept[position]):
+            folded[position].append(kept[position])
+            folded[position].remove(result)
+            kept[position] = result
+
+    if not folded:
+        return kept
+
+    for position, duplicates in folded.items():
+        representative = kept[position]
+        if not isinstance(representative, dict):
+            continue
+        own_url = get_result_url(representative)
+        duplicate_urls = list(representative.get("duplicate_urls") or [])
+        for duplicate in duplicates:
+            url = get_result_url(duplicate)
+            if url and url != own_url and url not in duplicate_urls:
+                duplicate_urls.append(url)
+        if duplicate_urls:
+            kept[position] = {**representative, "duplicate_urls": duplicate_urls}
+
+    folded_count = len(results) - len(kept)
+    logger.info(f"🧬 折叠近重复内容: {len(results)} → {len(kept)} 条 (合并 {folded_count} 条)")
+    return kept
@@ -17,4 +17,6 @@ class ResearchState(TypedDict):
     
     # V1.5 新增字段
     enhancement_enabled: Optional[bool]    # 是否启用内容增强功能
-    enhancement_stats: Optional[dict]      # 增强统计信息 
\ No newline at end of file
+    enhancement_stats: Optional[dict]      # 增强统计信息
+    stream_enhancement: Optional[bool]     # 是否在搜索阶段流水线式抓取
+    enhancement_prefetched: Optional[bool] # 本轮增强是否已在搜索阶段完成 
\ No newline at end of file
@@ -0,0 +1,70 @@
+"""
+URL工具函数
+统一URL规范化与域名提取，供V1/V2的去重、缓存和选择逻辑复用
+"""
+
+from typing import Dict, Any
+from urllib.parse import urlparse, urlunparse, parse_qsl, urlencode
+
+# 不影响页面内容的追踪参数
+TRACKING_PARAMS = {
+    'utm_source', 'utm_medium', 'utm_campaign', 'utm_term', 'utm_content',
+    'gclid', 'fbclid', 'msclkid', 'spm', 'ref', 'from'
+}
+
+
+def canonicalize_url(url: str) -> str:
+    """规范化URL：小写scheme/host、去掉www、默认端口、fragment和追踪参数"""
+    if not url:
+        return ""
+
+    url = url.strip()
+    try:
+        parsed = urlparse(url)
+    except ValueError:
+        return url
+
+    if not parsed.netloc:
+        return url
+
+    scheme = (parsed.scheme or "http").lower()
+    host = (parsed.hostname or "").lower()
+    if host.startswith("www."):
+        host = host[4:]
+
+    # 保留非默认端口
+    port = parsed.port if parsed.port else None
+    if port and not ((scheme == "http" and port == 80) or (scheme == "https" and port == 443)):
+        host = f"{host}:{port}"
+
+    path = parsed.path or "/"
+    if len(path) > 1 and path.endswith("/"):
+        path = path.rstrip("/")
+
+    query_pairs = [
+        (key, value) for key, value in parse_qsl(parsed.query, keep_blank_values=True)
+        if key.lower() not in TRACKING_PARAMS
+    ]
+    query = urlencode(sorted(query_pairs))
+
+    # http/https视为同一资源
+    if scheme == "http":
+        scheme = "https"
+
+    return urlunparse((scheme, host, path, "", query, ""))
+
+
+def extract_domain(url: str) -> str:
+    """提取域名（小写，保留端口）"""
+    try:
+        return urlparse(url).netloc.lower()
+    except Exception:
+        return ""
+
+
+def get_result_url(result: Dict[str, Any]) -> str:
+    """获取搜索结果的URL - 兼容'url'和'link'（Google搜索使用'link'）"""
+    if not isinstance(result, dict):
+        return ""
+    url = result.get('url') or result.get('link') or ''
+    return url.strip()
@@ -7,10 +7,13 @@ from langgraph.graph import StateGraph, START, END
 from langchain_core.runnables import RunnableConfig
 
 from .advanced_state import AdvancedResearchState
-from .planner import planner_node
+from .planner import planner_node, get_current_task
 from .coordinator import task_coordinator_node, decide_next_step_in_plan
 from .enhancer import content_enhancement_node, should_enhance_content
-from .api_utils import retry_manager, robust_web_search, enhance_content_with_firecrawl
+from .api_utils import retry_manager, robust_web_search, enhance_content_with_firecrawl, run_blocking
+from .config import get_fanout_config, get_enhancement_stage_config, FANOUT_QUERY_SUFFIXES
+from .state_contracts import checked_node
+from .source_store import store_update, store_results, store_keys
 
 # 重用现有的节点（兼容性）
 from agent.graph import (
@@ -19,10 +22,12 @@ from agent.graph import (
     reflect_node,
     generate_report_node
 )
+from agent.url_utils import canonicalize_url, get_result_url
+from agent.content_store import content_stores, deref, content_length
 
 
-def create_advanced_research_graph():
-    """创建高级研究图"""
+def create_advanced_research_graph(checkpointer=None):
+    """创建高级研究图（checkpointer: 可选的检查点存储，启用后运行必须指定thread_id）"""
     
     # 创建状态图
     builder = StateGraph(AdvancedResearchState)
@@ -30,15 +35,16 @@ def create_advanced_research_graph():
     # ===== 添加所有节点 =====
     
     # 新的高级节点
-    builder.add_node("planner", planner_node)
-    builder.add_node("task_coordinator", task_coordinator_node)
-    builder.add_node("content_enhancer", content_enhancement_node)
+    builder.add_node("planner", checked_node("planner", planner_node))
+    builder.add_node("task_coordinator", checked_node("task_coordinator", task_coordinator_node))
+    builder.add_node("content_enhancer", checked_node("content_enhancer", content_enhancement_node))
     
-    # 重用的现有节点（适配后）
-    builder.add_node("generate_query", generate_query_adapter)
-    builder.add_node("web_research", web_research_adapter) 
-    builder.add_node("reflection", reflection_adapter)
-    builder.add_node("finalize_answer", finalize_answer_adapter)
+    # 重用的现有节点（适配后）；节点只返回修改的字段，约定见state_contracts
+    builder.add_node("generate_query", checked_node("generate_query", generate_query_adapter))
+    builder.add_node("web_research", checked_node("web_research", web_research_adapter))
+    builder.add_node("research_enhancement", checked_node("research_enhancement", research_enhancement_adapter))
+    builder.add_node("reflection", checked_node("reflection", reflection_adapter))
+    builder.add_node("finalize_answer", checked_node("finalize_answer", finalize_answer_adapter))
     
     # ===== 定义图结构 =====
     
@@ -66,8 +72,9 @@ def create_advanced_research_graph():
         ["web_research"]
     )
     
-    # 5. 网络搜索 -> 反思
-    builder.add_edge("web_research", "reflection")
+    # 5. 网络搜索（各分支只搜索）-> 汇合后统一抓取 -> 反思
+    builder.add_edge("web_research", "research_enhancement")
+    builder.add_edge("research_enhancement", "reflection")
     
     # 6. 反思 -> 内容增强（条件边）
     builder.add_conditional_edges(
@@ -86,7 +93,7 @@ def create_advanced_research_graph():
     builder.add_edge("finalize_answer", END)
     
     # 编译图
-    graph = builder.compile()
+    graph = builder.compile(checkpointer=checkpointer)
     
     print("🎯 高级研究图创建完成")
     print("  节点数量：", len(builder.nodes))
@@ -140,7 +147,7 @@ def should_enhance_content_advanced(state: AdvancedResearchState) -> str:
         return "skip_enhancement"
     
     # 简化版决策逻辑
-    current_findings = state.get("web_research_results", [])
+    current_findings = store_results(state)
     
     if len(current_findings) < 3:
         print("🔍 内容较少，启用增强")
@@ -195,17 +202,63 @@ def continue_to_web_research_advanced(state: AdvancedResearchState):
     print(f"🔄 并行发送 {len(query_list)} 个搜索查询")
     print(f"🔄 当前任务ID: {current_task_id}")
     
+    # 已收集的规范化URL，用于分支内计算查询的边际新颖度
+    known_urls = sorted(key for key in store_keys(state) if isinstance(key, str))
+    
     # 创建并行搜索任务
     return [
         Send("web_research", {
             "search_query": query,
             "id": idx,
-            "current_task_id": current_task_id
+            "current_task_id": current_task_id,
+            "scenario_type": state.get("scenario_type"),
+            "known_urls": known_urls
         })
         for idx, query in enumerate(query_list)
     ]
 
 
+# ===== 自适应查询扩展 =====
+
+async def adaptive_fanout_search(search_func, search_query: str, known_urls=None, mode: str = None) -> list:
+    """
+    自适应查询扩展搜索
+    先执行基础查询，统计其贡献的新规范化URL比例；只有边际新颖度超过阈值时才追加扩展查询
+    """
+    fanout_config = get_fanout_config(mode)
+    threshold = fanout_config["novelty_threshold"]
+    max_expansions = fanout_config["max_expansions"]
+    
+    seen_urls = set(known_urls or [])
+    collected = []
+    
+    candidate_queries = [search_query] + [
+        f"{search_query} {suffix}" for suffix in FANOUT_QUERY_SUFFIXES[:max_expansions]
+    ]
+    
+    for idx, query in enumerate(candidate_queries):
+        results = await robust_web_search(search_func, [query])
+        collected.extend(results)
+        
+        # 计算本次查询的边际新颖度
+        hits = [
+            get_result_url(item)
+            for result_data in results if isinstance(result_data, dict)
+            for item in result_data.get("search_results", [])
+        ]
+        hit_urls = {canonicalize_url(url) for url in hits if url}
+        new_urls = hit_urls - seen_urls
+        seen_urls |= hit_urls
+        novelty = len(new_urls) / len(hits) if hits else 0.0
+        
+        print(f"🧭 查询扩展 {idx}/{max_expansions}: '{query[:40]}' 新URL {len(new_urls)}/{len(hits)} (新颖度 {novelty:.2f}, 阈值 {threshold})")
+        
+        if novelty < threshold:
+            break
+    
+    return collected
+
+
 # ===== 适配器函数 =====
 
 def generate_query_adapter(state: AdvancedResearchState, config: RunnableConfig):
@@ -243,10 +296,11 @@ def generate_query_adapter(state: AdvancedResearchState, config: RunnableConfig)
         print(f"🔧 查询生成失败，使用fallback查询: {fallback_queries}")
         search_queries = fallback_queries
     
-    # 更新状态
-    updated_state = {**state}
-    updated_state.update(result)
-    updated_state["query_list"] = search_queries  # V2需要的字段名
+    # 只返回本节点修改的字段：回传完整状态会让operator.add字段在每轮循环中重复追加
+    updated_state = {
+        "search_queries": search_queries,
+        "cycle_count": result.get("cycle_count", state.get("cycle_count", 0))
+    }
     
     print(f"🔧 适配器返回字段: {list(updated_state.keys())}")
     print(f"🔧 适配器返回的查询: {search_queries}")
@@ -255,7 +309,7 @@ def generate_query_adapter(state: AdvancedResearchState, config: RunnableConfig)
 
 
 async def web_research_adapter(state: AdvancedResearchState, config: RunnableConfig):
-    """网络搜索适配器 - 支持并行搜索和内容增强"""
+    """网络搜索适配器 - 并行分支只负责搜索，内容增强在汇合后的research_enhancement节点统一进行"""
     
     print(f"🔍 V2并行网络搜索适配器启动...")
     print(f"🔍 输入状态字段: {list(state.keys())}")
@@ -267,28 +321,14 @@ async def web_research_adapter(state: AdvancedResearchState, config: RunnableCon
     search_query = state.get("search_query", "")
     if not search_query:
         print("⚠️ 没有搜索查询，返回空结果")
-        return {
-            "web_research_results": [],
-            "sources_gathered": [],
-            "search_results": [],
-            "current_task_detailed_findings": []
-        }
+        return {"pending_branch_results": []}
     
     # 检查是否启用并行搜索
     enable_parallel = state.get("enable_parallel_search", True)
-    enable_enhancement = state.get("enable_content_enhancement", True)
     
     if enable_parallel:
-        print(f"🚀 启用并行搜索模式")
+        print(f"🚀 启用自适应扩展搜索模式")
         
-        # 生成相关查询进行并行搜索
-        related_queries = [
-            search_query,
-            f"{search_query} 案例研究",
-            f"{search_query} 最新发展",
-        ]
-        
-        # 使用并行搜索工具
         try:
             # 创建搜索函数的包装器
             async def single_search(query):
@@ -298,12 +338,19 @@ async def web_research_adapter(state: AdvancedResearchState, config: RunnableCon
                     "id": state.get("id", 0),
                     "current_task_id": state.get("current_task_id", "unknown"),
                     "cycle_count": state.get("cycle_count", 1),
-                    "user_query": state.get("user_query", "")
+                    "user_query": state.get("user_query", ""),
+                    "stream_enhancement": False  # V2自行增强
                 }
-                return web_search_node(adapted_state)
+                # 同步搜索放到专用线程池，避免阻塞事件循环上的其他SSE流
+                return await run_blocking("google_search", web_search_node, adapted_state)
             
-            # 并行执行搜索
-            all_results = await robust_web_search(single_search, related_queries)
+            # 先执行基础查询，按边际新颖度决定是否扩展
+            all_results = await adaptive_fanout_search(
+                single_search,
+                search_query,
+                known_urls=state.get("known_urls", []),
+                mode=state.get("scenario_type")
+            )
             
             # 合并所有结果
             web_results = []
@@ -325,9 +372,10 @@ async def web_research_adapter(state: AdvancedResearchState, config: RunnableCon
                 "id": state.get("id", 0),
                 "current_task_id": state.get("current_task_id", "unknown"),
                 "cycle_count": state.get("cycle_count", 1),
-                "user_query": state.get("user_query", "")
+                "user_query": state.get("user_query", ""),
+                "stream_enhancement": False  # V2自行增强
             }
-            result = web_search_node(adapted_state)
+            result = await run_blocking("google_search", web_search_node, adapted_state)
             web_results = result.get("search_results", [])
             sources = result.get("sources_gathered", [])
     
@@ -340,65 +388,97 @@ async def web_research_adapter(state: AdvancedResearchState, config: RunnableCon
             "id": state.get("id", 0),
             "current_task_id": state.get("current_task_id", "unknown"),
             "cycle_count": state.get("cycle_count", 1),
-            "user_query": state.get("user_query", "")
+            "user_query": state.get("user_query", ""),
+            "stream_enhancement": False  # V2自行增强
         }
         
-        result = web_search_node(adapted_state)
+        result = await run_blocking("google_search", web_search_node, adapted_state)
         web_results = result.get("search_results", [])
         sources = result.get("sources_gathered", [])
     
-    # 内容增强处理
+    print(f"🔍 分支搜索完成: {len(web_results)} 条结果，等待汇合后统一增强")
+    
+    return {
+        "pending_branch_results": [{
+            "search_query": search_query,
+            "id": state.get("id", 0),
+            "current_task_id": state.get("current_task_id", "unknown"),
+            "parallel": enable_parallel,
+            "results": web_results,
+            "sources": sources
+        }]
+    }
+
+
+async def research_enhancement_adapter(state: AdvancedResearchState, config: RunnableConfig):
+    """汇合增强适配器 - 合并所有搜索分支的结果，跨分支选出最优的唯一URL作为一个批次抓取"""
+    
+    branches = sorted(state.get("pending_branch_results", []) or [], key=lambda branch: branch.get("id", 0))
+    print(f"🔥 汇合增强适配器启动: {len(branches)} 个搜索分支")
+    
+    # 合并分支结果，按规范化URL去重（不同查询经常命中相同页面）
+    web_results = []
+    sources = []
+    seen_urls = set()
+    for branch in branches:
+        sources.extend(branch.get("sources", []))
+        for result in branch.get("results", []):
+            if isinstance(result, dict):
+                url = get_result_url(result)
+                key = canonicalize_url(url) if url else None
+            else:
+                # 如果是字符串，创建基本格式
+                result = {
+                    "title": "搜索结果",
+                    "snippet": str(result),
+                    "url": f"https://example.com/search/{len(web_results)}"
+                }
+                key = None
+            if key and key in seen_urls:
+                continue
+            if key:
+                seen_urls.add(key)
+            web_results.append(result)
+    
+    duplicate_count = sum(len(branch.get("results", [])) for branch in branches) - len(web_results)
+    print(f"🔥 分支结果合并: {len(web_results)} 条唯一结果 (去除重复 {duplicate_count} 条)")
+    
+    enable_enhancement = state.get("enable_content_enhancement", True)
     enhanced_results = web_results
     if enable_enhancement and web_results:
-        print(f"🔥 启用Firecrawl内容增强")
+        stage_config = get_enhancement_stage_config(state.get("scenario_type"))
+        branch_queries = " ".join(branch.get("search_query", "") for branch in branches)
+        print(f"🔥 启用Firecrawl内容增强: 时间预算 {stage_config['time_budget']}秒，跨分支最多 {stage_config['max_urls']} 个URL")
         try:
-            # 转换搜索结果格式以适配增强函数
-            formatted_results = []
-            for result in web_results:
-                if isinstance(result, dict):
-                    formatted_results.append(result)
-                else:
-                    # 如果是字符串，创建基本格式
-                    formatted_results.append({
-                        "title": "搜索结果",
-                        "snippet": str(result),
-                        "url": f"https://example.com/search/{len(formatted_results)}"
-                    })
-            
             enhanced_results = await enhance_content_with_firecrawl(
-                formatted_results,
+                web_results,
                 {
-                    "max_urls": 3,
-                    "quality_threshold": 0.6
+                    "time_budget": stage_config["time_budget"],
+                    "max_urls": stage_config["max_urls"],
+                    "quality_threshold": stage_config["quality_threshold"],
+                    "query": f"{state.get('user_query', '')} {branch_queries}".strip()
                 }
             )
-            
             print(f"🔥 内容增强完成: {len(enhanced_results)} 条结果")
-            
         except Exception as e:
             print(f"❌ 内容增强失败，使用原始结果: {e}")
             enhanced_results = web_results
     
-    # 构建返回结果
+    parallel = any(branch.get("parallel") for branch in branches)
+    current_task_id = branches[0].get("current_task_id", "unknown") if branches else "unknown"
+    
+    # 构建返回结果：所有结果只写入运行级来源存储，V1兼容字段由source_store视图按需生成
     v2_result = {
-        "web_research_results": enhanced_results,
-        "sources_gathered": sources,
-        "search_results": enhanced_results,  # v1兼容
-        "parallel_search_results": enhanced_results,  # 标记为并行搜索结果
-        
-        # 任务特定结果
-        "current_task_detailed_findings": [{
-            "task_id": state.get("current_task_id", "unknown"),
-            "content": content,
-            "source": "parallel_web_search" if enable_parallel else "web_search",
-            "enhanced": enable_enhancement,
-            "timestamp": "now"
-        } for content in enhanced_results] if enhanced_results else []
+        "pending_branch_results": None,  # 清空本轮分支结果
+        "source_store": store_update(
+            enhanced_results,
+            task_id=current_task_id,
+            origin="parallel_web_search" if parallel else "web_search"
+        ),
+        "sources_gathered": sources
     }
     
-    print(f"🔍 V2网络搜索适配器返回字段: {list(v2_result.keys())}")
-    print(f"🔍 返回的搜索结果数量: {len(v2_result.get('search_results', []))}")
-    print(f"🔍 并行搜索: {enable_parallel}, 内容增强: {enable_enhancement}")
+    print(f"🔥 汇合增强适配器返回: {len(enhanced_results)} 条结果, 并行搜索: {parallel}, 内容增强: {enable_enhancement}")
     
     return v2_result
 
@@ -409,18 +489,20 @@ def reflection_adapter(state: AdvancedResearchState, config: RunnableConfig):
     print(f"🤔 反思适配器启动...")
     print(f"🤔 输入状态字段: {list(state.keys())}")
     
-    # 转换状态格式
+    # 转换状态格式（V1节点需要正文，从内容存储取回）
+    current_results = store_results(state, materialize=True)
     adapted_state = {
         "user_query": state.get("user_query", ""),  # 确保包含user_query
-        "web_research_result": state.get("web_research_results", []),
-        "search_results": state.get("search_results", []),  # V1兼容字段
+        "web_research_result": current_results,
+        "search_results": current_results,  # V1兼容字段（来源存储视图）
         "sources_gathered": state.get("sources_gathered", []),
         "plan": state.get("plan", []),
         "current_task_pointer": state.get("current_task_pointer", 0),
         "research_loop_count": state.get("current_task_loop_count", 0),
         "cycle_count": state.get("cycle_count", 1),  # V1需要的字段
         "number_of_ran_queries": len(state.get("executed_search_queries", [])),
-        "scenario_type": state.get("scenario_type", "default")
+        "scenario_type": state.get("scenario_type", "default"),
+        "task_description": get_current_task(state).description  # 用于反思结果的相关性排序
     }
     
     print(f"🤔 传递给V1的字段: {list(adapted_state.keys())}")
@@ -431,11 +513,8 @@ def reflection_adapter(state: AdvancedResearchState, config: RunnableConfig):
     result = reflect_node(adapted_state)
     print(f"🤔 V1返回字段: {list(result.keys())}")
     
-    # 转换结果格式
+    # 转换结果格式（只返回本节点修改的字段）
     v2_result = {
-        # 保持原有状态
-        **state,
-        
         # 映射V1返回的字段
         "reflection_is_sufficient": result.get("reflection_is_sufficient", False),
         "reflection_knowledge_gap": result.get("reflection_knowledge_gap", ""),
@@ -470,37 +549,9 @@ def finalize_answer_adapter(state: AdvancedResearchState, config: RunnableConfig
     print(f"📝 全局记忆数量: {len(global_memory)}")
     print(f"📝 研究计划数量: {len(research_plan)}")
     
-    # 收集所有搜索结果
-    all_search_results = []
-    
-    # 从web_research_results收集
-    web_results = state.get("web_research_results", []) or []
-    if web_results:
-        all_search_results.extend(web_results)
-        print(f"📝 从web_research_results收集到 {len(web_results)} 条结果")
-    
-    # 从search_results收集（V1兼容字段）
-    search_results = state.get("search_results", []) or []
-    if search_results:
-        all_search_results.extend(search_results)
-        print(f"📝 从search_results收集到 {len(search_results)} 条结果")
-    
-    # 从parallel_search_results收集
-    parallel_results = state.get("parallel_search_results", []) or []
-    if parallel_results:
-        all_search_results.extend(parallel_results)
-        print(f"📝 从parallel_search_results收集到 {len(parallel_results)} 条结果")
-    
-    # 从current_task_detailed_findings收集
-    detailed_findings = state.get("current_task_detailed_findings", []) or []
-    if detailed_findings:
-        # 转换格式
-        for finding in detailed_findings:
-            if isinstance(finding, dict) and "content" in finding:
-                all_search_results.append(finding["content"])
-        print(f"📝 从current_task_detailed_findings收集到 {len(detailed_findings)} 条结果")
-    
-    print(f"📝 总共收集到 {len(all_search_results)} 条搜索结果")
+    # 从运行级来源存储收集所有搜索结果（每个来源一次）
+    all_search_results = store_results(state, materialize=True)
+    print(f"📝 从来源存储收集到 {len(all_search_results)} 条结果")
     
     # 如果没有搜索结果，创建一个基本的结果
     if not all_search_results:
@@ -513,7 +564,7 @@ def finalize_answer_adapter(state: AdvancedResearchState, config: RunnableConfig
         "search_results": all_search_results,  # V1必需字段
         "sources_gathered": state.get("sources_gathered", []),
         "ledger": [],  # 从task_results构建
-        "final_report_markdown": state.get("final_report_markdown", ""),
+        "final_report_markdown": deref(state.get("final_report_markdown"), ""),
         "cycle_count": state.get("cycle_count", 1),
         "scenario_type": state.get("scenario_type", "default")
     }
@@ -559,10 +610,11 @@ def finalize_answer_adapter(state: AdvancedResearchState, config: RunnableConfig
     print(f"📝 V1返回的report字段: {len(result.get('report') or '')}")
     print(f"📝 V1返回的final_report_markdown字段: {len(result.get('final_report_markdown') or '')}")
     
-    # 转换结果格式
+    # 转换结果格式：报告正文写入运行级内容存储，状态和事件中只携带句柄
+    report_handle = content_stores.put(final_report)
     final_result = {
-        "final_report_markdown": final_report,
-        "report": final_report,  # v1兼容
+        "final_report_markdown": report_handle,
+        "report": report_handle,  # v1兼容
         "is_complete": True,
         "execution_summary": {
             "total_tasks": len(research_plan),
@@ -574,13 +626,13 @@ def finalize_answer_adapter(state: AdvancedResearchState, config: RunnableConfig
     }
     
     print(f"📝 最终报告适配器返回字段: {list(final_result.keys())}")
-    print(f"📝 最终报告长度: {len(final_result.get('final_report_markdown', ''))}")
+    print(f"📝 最终报告长度: {content_length(report_handle)}")
     
     return final_result
 
 
 # ===== 图实例化 =====
 
-def get_advanced_research_graph():
+def get_advanced_research_graph(checkpointer=None):
     """获取高级研究图实例"""
-    return create_advanced_research_graph() 
\ No newline at end of file
+    return create_advanced_research_graph(checkpointer) 
\ No newline at end of file
@@ -5,10 +5,133 @@
 
 from __future__ import annotations
 from dataclasses import dataclass, field
-from typing import TypedDict, List, Optional, Dict, Any
+from typing import TypedDict, List, Optional, Dict, Any, Callable, Hashable
 from typing_extensions import Annotated
+import hashlib
 import operator
 
+from agent.url_utils import canonicalize_url, get_result_url
+from agent.content_store import content_length
+from .config import STATE_REDUCER_CAPS
+
+
+def accumulate_branches(existing: Optional[List[dict]], update: Optional[List[dict]]) -> List[dict]:
+    """并行分支结果累积；汇合节点消费后返回None清空"""
+    if update is None:
+        return []
+    return (existing or []) + update
+
+
+# ===== 去重、有界的累积reducer =====
+
+def _text_key(value: Any) -> str:
+    return hashlib.blake2b(str(value).encode("utf-8"), digest_size=8).hexdigest()
+
+
+def result_key(item: Any) -> Hashable:
+    """搜索结果/来源的合并键：规范化URL，没有URL时取内容摘要"""
+    url = get_result_url(item)
+    return canonicalize_url(url) if url else _text_key(item)
+
+
+def finding_key(item: Any) -> Hashable:
+    """发现的合并键：显式ID，否则为 (任务ID, 内容的合并键)"""
+    if not isinstance(item, dict):
+        return _text_key(item)
+    if item.get("id"):
+        return item["id"]
+    return (item.get("task_id"), result_key(item.get("content")))
+
+
+def item_score(item: Any) -> float:
+    """淘汰评分：已抓取正文的优先，其次显式质量分和内容丰富程度"""
+    if isinstance(item, dict) and "task_id" in item and "content" in item:
+        item = item["content"]  # 发现按其内容评分
+    if not isinstance(item, dict):
+        return min(1.0, len(str(item)) / 2000) * 0.5
+
+    explicit = item.get("score") or item.get("quality_score") or item.get("relevance_score") or 0.0
+    try:
+        explicit = float(explicit)
+    except (TypeError, ValueError):
+        explicit = 0.0
+    enhanced = 1.0 if item.get("is_enhanced") or item.get("enhanced") else 0.0
+    text = item.get("enhanced_content") or item.get("content") or item.get("snippet") or ""
+    return explicit + enhanced + 0.5 * min(1.0, content_length(text) / 2000)  # 句柄按记录的长度计
+
+
+def _merge_items(old: Any, new: Any) -> Any:
+    """同一键的两条数据：评分高的一方覆盖另一方的字段（抓取正文等不会被稀薄的摘要覆盖）"""
+    if isinstance(old, dict) and isinstance(new, dict):
+        if item_score(new) >= item_score(old):
+            return {**old, **new}
+        return {**new, **old}
+    return new if item_score(new) >= item_score(old) else old
+
+
+def merge_unique(existing: Optional[List[Any]], update: Optional[List[Any]],
+                 key_fn: Callable[[Any], Hashable] = result_key,
+                 cap: Optional[int] = None) -> List[Any]:
+    """
+    按键合并累积列表
+
+    同键数据合并到首次出现的位置；超过cap时保留评分最高的cap条（同分保留较新的），
+    保留项维持原有顺序。update为None时不修改
+    """
+    merged: List[Any] = []
+    index: Dict[Hashable, int] = {}
+    for item in list(existing or []) + list(update or []):
+        key = key_fn(item)
+        position = index.get(key)
+        if position is None:
+            index[key] = len(merged)
+            merged.append(item)
+        else:
+            merged[position] = _merge_items(merged[position], item)
+
+    if cap and len(merged) > cap:
+        ranked = sorted(range(len(merged)), key=lambda i: (item_score(merged[i]), i), reverse=True)
+        merged = [merged[i] for i in sorted(ranked[:cap])]
+    return merged
+
+
+def merge_source_store(existing: Optional[Dict[Hashable, dict]],
+                       update: Optional[Dict[Hashable, dict]]) -> Dict[Hashable, dict]:
+    """
+    运行级来源存储的reducer：{规范化URL: {"result", "task_ids", "origin"}}
+
+    同一来源合并结果字段（评分高的一方优先）并合并所属任务；
+    超过STATE_REDUCER_CAPS["source_store"]时保留评分最高的来源
+    """
+    merged = dict(existing or {})
+    for key, entry in (update or {}).items():
+        previous = merged.get(key)
+        if previous is None:
+            merged[key] = entry
+            continue
+        task_ids = list(previous.get("task_ids", []))
+        task_ids.extend(task_id for task_id in entry.get("task_ids", []) if task_id not in task_ids)
+        merged[key] = {
+            "result": _merge_items(previous.get("result"), entry.get("result")),
+            "task_ids": task_ids,
+            "origin": entry.get("origin") or previous.get("origin")
+        }
+
+    cap = STATE_REDUCER_CAPS.get("source_store")
+    if cap and len(merged) > cap:
+        keys = list(merged)
+        ranked = sorted(range(len(keys)), key=lambda i: (item_score(merged[keys[i]].get("result")), i), reverse=True)
+        merged = {keys[i]: merged[keys[i]] for i in sorted(ranked[:cap])}
+    return merged
+
+
+def bounded_unique(field_name: str, key_fn: Callable[[Any], Hashable] = result_key) -> Callable:
+    """生成指定字段的去重有界reducer，容量取STATE_REDUCER_CAPS[field_name]"""
+    def reducer(existing: Optional[List[Any]], update: Optional[List[Any]]) -> List[Any]:
+        return merge_unique(existing, update, key_fn, STATE_REDUCER_CAPS.get(field_name))
+    reducer.__name__ = f"merge_{field_name}"
+    return reducer
+
 
 @dataclass
 class ResearchTask:
@@ -66,9 +189,11 @@ class AdvancedResearchState(TypedDict):
     
     # ===== 搜索和处理 =====
     executed_search_queries: Annotated[List[str], operator.add]    # 已执行的搜索查询
-    web_research_results: Annotated[List[dict], operator.add]      # 网络搜索结果
-    sources_gathered: Annotated[List[dict], operator.add]          # 收集的源信息
-    parallel_search_results: Annotated[List[dict], operator.add]   # 并行搜索结果
+    web_research_results: List[dict]        # 兼容字段：节点不再写入，结果只在source_store中（旧状态由source_store视图回退读取）
+    sources_gathered: Annotated[List[dict], bounded_unique("sources_gathered")]                # 收集的源信息（按URL去重）
+    parallel_search_results: List[dict]     # 兼容字段：同web_research_results
+    pending_branch_results: Annotated[List[dict], accumulate_branches]  # 本轮各搜索分支的原始结果（待汇合增强）
+    source_store: Annotated[Dict[str, dict], merge_source_store]       # 运行级来源存储（唯一写入位置，读取见source_store模块）
     
     # ===== 反思和评估 =====
     reflection_is_sufficient: Optional[bool]           # 反思：信息是否充足
@@ -91,11 +216,11 @@ class AdvancedResearchState(TypedDict):
     reasoning_model: str                    # 推理模型名称
     
     # ===== 任务特定结果 =====
-    current_task_detailed_findings: Annotated[List[Dict[str, Any]], operator.add]  # 当前任务详细发现
+    current_task_detailed_findings: List[Dict[str, Any]]  # 兼容字段：节点不再写入，发现由source_store.task_findings视图生成
     task_specific_results: Annotated[List[Dict[str, Any]], operator.add]           # 按任务分组的结果
     
     # ===== 最终输出 =====
-    final_report_markdown: Optional[str]    # 最终Markdown报告
+    final_report_markdown: Optional[Any]    # 最终Markdown报告（长报告为内容存储句柄，用deref取回）
     execution_summary: Optional[Dict]       # 执行总结统计
     
     # ===== 错误处理 =====
@@ -104,9 +229,9 @@ class AdvancedResearchState(TypedDict):
     
     # ===== 兼容性字段 (保持与v1的兼容) =====
     search_queries: List[str]                              # v1兼容：搜索查询列表
-    search_results: Annotated[List[dict], operator.add]    # v1兼容：搜索结果 (支持并行更新)
+    search_results: List[dict]                             # v1兼容：节点不再写入，V1节点的输入由source_store视图生成
     critique: str                                          # v1兼容：反思内容
-    report: str                                            # v1兼容：报告内容
+    report: Any                                            # v1兼容：报告内容（同final_report_markdown）
     is_complete: bool                                      # v1兼容：完成标志
     cycle_count: int                                       # v1兼容：轮次计数
     scenario_type: Optional[str]                           # v1兼容：场景类型
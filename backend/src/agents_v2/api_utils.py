@@ -12,53 +12,24 @@ from contextlib import asynccontextmanager
 import aiohttp
 from concurrent.futures import ThreadPoolExecutor
 import json
+import functools
+import contextvars
+import threading
 from dotenv import load_dotenv
-import os
-from urllib.parse import urlparse
+
+from .config import BLOCKING_POOL_SIZES
+from agent.scrape_engine import scrape_engine, ScrapeEngine, ScrapeProfile, V2_PROFILE
 
 logger = logging.getLogger(__name__)
 
-# V2 Firecrawl配置类 - 基于Firesearch最佳实践
-@dataclass
-class V2FirecrawlConfig:
-    """V2 Firecrawl配置参数"""
-    # 速率限制 - 更保守的设置
-    MAX_CONCURRENT_REQUESTS: int = 1        # V2降低并发数
-    MAX_SOURCES_TO_SCRAPE: int = 2          # V2减少抓取数量
-    REQUEST_DELAY: float = 2.0              # V2增加请求间延迟
-    
-    # 重试配置
-    MAX_RETRIES: int = 1                    # V2减少重试次数
-    RETRY_DELAY: float = 3.0                # V2增加重试延迟
-    
-    # 超时配置
-    SCRAPE_TIMEOUT: int = 10                # V2缩短超时时间
-    BATCH_TIMEOUT: int = 20                 # V2缩短批量超时
-    
-    # 内容限制
-    MIN_CONTENT_LENGTH: int = 50            # V2降低最小长度要求
-    MAX_CONTENT_LENGTH: int = 3000          # V2减少最大内容长度
-    
-    # 质量控制
-    PRIORITY_DOMAINS: List[str] = None
-    EXCLUDED_DOMAINS: List[str] = None
-    
-    def __post_init__(self):
-        if self.PRIORITY_DOMAINS is None:
-            self.PRIORITY_DOMAINS = [
-                '.edu', '.gov', '.org',
-                'wikipedia.org', 'arxiv.org'
-            ]
-        
-        if self.EXCLUDED_DOMAINS is None:
-            self.EXCLUDED_DOMAINS = [
-                'twitter.com', 'facebook.com', 'instagram.com',
-                'tiktok.com', 'youtube.com', 'linkedin.com',
-                'pinterest.com', 'reddit.com'
-            ]
+# V2 Firecrawl配置 - V2配置档，参数定义见agent.scrape_engine.ScrapeProfile
+V2FirecrawlConfig = ScrapeProfile
 
 # V2全局配置实例
-V2_FIRECRAWL_CONFIG = V2FirecrawlConfig()
+V2_FIRECRAWL_CONFIG = V2_PROFILE
+
+# V2抓取格式
+V2_SCRAPE_FORMATS = V2_PROFILE.FORMATS
 
 @dataclass
 class APICallResult:
@@ -206,288 +177,79 @@ class ParallelProcessor:
         
         return processed_results
 
-class RealFirecrawlClient:
-    """真实的Firecrawl客户端 - V2版本，支持自动降级到Mock"""
-    
-    def __init__(self, api_key: str = None):
-        from firecrawl import AsyncFirecrawlApp
-        
-        self.api_key = api_key or os.getenv("FIRECRAWL_API_KEY")
-        self.config = V2_FIRECRAWL_CONFIG
-        self.last_request_time = 0  # 用于速率限制
-        
-        if self.api_key:
-            try:
-                self.client = AsyncFirecrawlApp(api_key=self.api_key)
-                self.mock_mode = False
-                logger.info("🔥 V2真实Firecrawl客户端初始化成功")
-            except Exception as e:
-                logger.error(f"❌ V2 Firecrawl客户端初始化失败: {e}")
-                self.client = None
-                self.mock_mode = True
-        else:
-            logger.info("ℹ️ V2 Firecrawl API Key未配置，使用Mock模式")
-            self.client = None
-            self.mock_mode = True
-        
-        self.retry_manager = APIRetryManager(
-            max_retries=self.config.MAX_RETRIES, 
-            timeout=float(self.config.SCRAPE_TIMEOUT)
+class BlockingExecutorPool:
+    """阻塞调用线程池 - 为每个同步依赖提供独立、有界的线程池"""
+    
+    def __init__(self, pool_sizes: Dict[str, int] = None):
+        self.pool_sizes = pool_sizes or BLOCKING_POOL_SIZES
+        self._executors: Dict[str, ThreadPoolExecutor] = {}
+        self._lock = threading.Lock()
+    
+    def get_executor(self, name: str) -> ThreadPoolExecutor:
+        """获取（懒创建）指定依赖的线程池"""
+        with self._lock:
+            executor = self._executors.get(name)
+            if executor is None:
+                max_workers = self.pool_sizes.get(name, self.pool_sizes.get("default", 4))
+                executor = ThreadPoolExecutor(
+                    max_workers=max_workers,
+                    thread_name_prefix=f"blocking-{name}"
+                )
+                self._executors[name] = executor
+                logger.info(f"🧵 创建阻塞线程池: {name} (max_workers={max_workers})")
+            return executor
+    
+    async def run(self, name: str, func: Callable[..., Any], *args, **kwargs) -> Any:
+        """在指定依赖的线程池中执行同步函数，不阻塞事件循环"""
+        loop = asyncio.get_running_loop()
+        # 复制上下文变量（抓取上下文的运行ID等），与asyncio.to_thread一致
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(
+            self.get_executor(name),
+            functools.partial(context.run, func, *args, **kwargs)
         )
     
-    def _extract_domain(self, url: str) -> str:
-        """提取域名"""
-        try:
-            return urlparse(url).netloc.lower()
-        except:
-            return ""
-    
-    def _is_suitable_for_enhancement(self, url: str) -> bool:
-        """判断URL是否适合增强"""
-        if not url:
-            return False
-        
-        domain = self._extract_domain(url)
-        
-        # 检查排除域名
-        for excluded in self.config.EXCLUDED_DOMAINS:
-            if excluded in domain:
-                return False
-        
-        # 检查文件类型排除
-        excluded_extensions = ['.pdf', '.doc', '.docx', '.ppt', '.pptx']
-        if any(url.lower().endswith(ext) for ext in excluded_extensions):
-            return False
-        
-        return True
+    def shutdown(self):
+        """关闭所有线程池"""
+        with self._lock:
+            for executor in self._executors.values():
+                executor.shutdown(wait=False)
+            self._executors.clear()
+
+class RealFirecrawlClient:
+    """真实的Firecrawl客户端 - V2版本，统一抓取引擎上的V2配置档，支持自动降级到Mock"""
     
-    def _calculate_priority_score(self, url: str) -> float:
-        """计算URL优先级分数"""
-        domain = self._extract_domain(url)
-        score = 0.5
-        
-        # 优先域名加分
-        for priority in self.config.PRIORITY_DOMAINS:
-            if priority in domain:
-                score += 0.4
-                break
-        
-        # HTTPS加分
-        if url.startswith('https://'):
-            score += 0.1
+    def __init__(self, api_key: str = None, engine: ScrapeEngine = None, profile: ScrapeProfile = None):
+        # 默认共享全局抓取引擎（同一连接池、速率限制和页面缓存）
+        if engine is None:
+            engine = ScrapeEngine(api_key) if api_key else scrape_engine
+        self.engine = engine
+        self.config = profile or V2_FIRECRAWL_CONFIG
+        self.mock_mode = not self.engine.enabled
         
-        return min(1.0, max(0.0, score))
+        if self.mock_mode:
+            logger.info("ℹ️ V2 Firecrawl未启用，使用Mock模式")
     
-    async def _rate_limited_request(self):
-        """实现速率限制"""
-        current_time = time.time()
-        time_since_last = current_time - self.last_request_time
-        
-        if time_since_last < self.config.REQUEST_DELAY:
-            sleep_time = self.config.REQUEST_DELAY - time_since_last
-            logger.debug(f"⏱️ V2速率限制：等待 {sleep_time:.1f} 秒")
-            await asyncio.sleep(sleep_time)
-        
-        self.last_request_time = time.time()
+    @property
+    def client(self):
+        return None if self.mock_mode else self.engine.client
     
-    async def scrape_url(self, url: str, options: Dict[str, Any] = None) -> Dict[str, Any]:
-        """抓取单个URL的深度内容"""
-        
+    async def scrape_url(self, url: str, options: Dict[str, Any] = None, query: str = "") -> Dict[str, Any]:
+        """抓取单个URL的深度内容；query用于从超长页面中抽取相关段落"""
         if self.mock_mode:
-            return await self._mock_scrape_url(url, options)
-        
-        async def _real_scrape():
-            # 构建Firecrawl参数 - 正确的参数传递方式
-            scrape_kwargs = {
-                "formats": ["markdown", "html"],
-                "only_main_content": True,
-                "timeout": 20000
-            }
-            
-            # 合并用户选项
-            if options:
-                scrape_kwargs.update(options)
-            
-            # 调用真实的Firecrawl API - 使用正确的参数传递方式
-            result = await self.client.scrape_url(url, **scrape_kwargs)
-            
-            # 处理Firecrawl SDK返回的对象
-            if result and hasattr(result, 'success') and result.success:
-                # 从ScrapeResponse对象中提取数据
-                metadata = getattr(result, 'metadata', {}) or {}
-                
-                # 获取内容
-                markdown_content = getattr(result, 'markdown', '')
-                html_content = getattr(result, 'html', '')
-                content = markdown_content or html_content or ''
-                
-                return {
-                    "success": True,
-                    "url": url,
-                    "title": metadata.get("title", f"Content from {url}") if isinstance(metadata, dict) else f"Content from {url}",
-                    "content": content,
-                    "html": html_content,
-                    "metadata": metadata if isinstance(metadata, dict) else {},
-                    "word_count": len(content.split()) if content else 0,
-                    "extraction_time": time.time(),
-                    "source": "firecrawl_real"
-                }
-            else:
-                # 处理错误情况
-                error_msg = "Unknown Firecrawl error"
-                if result:
-                    if hasattr(result, 'error'):
-                        error_msg = str(result.error)
-                    elif hasattr(result, 'success') and not result.success:
-                        error_msg = "Firecrawl scraping failed"
-                else:
-                    error_msg = "No response from Firecrawl"
-                raise Exception(error_msg)
-        
-        result = await self.retry_manager.robust_api_call(_real_scrape)
-        
-        if result.success:
-            logger.info(f"🔥 Firecrawl抓取成功: {url} ({result.data.get('word_count', 0)} 词)")
-            return result.data
-        else:
-            logger.warning(f"🔥 Firecrawl抓取失败: {url} - {result.error}")
-            # 不使用假数据，直接返回失败状态
-            return {
-                "success": False,
-                "url": url,
-                "title": "增强失败",
-                "content": "",  # 空内容，不污染报告
-                "error": result.error,
-                "source": "firecrawl_failed"
-            }
-    
-    async def _mock_scrape_url(self, url: str, options: Dict[str, Any] = None) -> Dict[str, Any]:
-        """Mock抓取模式 - 降级方案"""
+            return await self.engine.mock_scrape(url)
         
-        async def _mock_scrape():
-            # 模拟网络延迟
-            await asyncio.sleep(0.5)
-            
-            # 模拟不同的抓取结果
-            if "example.com" in url:
-                return {
-                    "success": True,
-                    "url": url,
-                    "title": f"深度内容标题 - {url}",
-                    "content": f"这是从 {url} 抓取的深度内容。包含详细的技术分析、案例研究和专业见解。" * 10,
-                    "metadata": {"author": "专家作者", "publish_date": "2024-01-01"},
-                    "word_count": 500,
-                    "extraction_time": time.time(),
-                    "source": "firecrawl_mock"
-                }
-            else:
-                # 模拟真实的内容抓取
-                return {
-                    "success": True,
-                    "url": url,
-                    "title": f"增强内容 - {url.split('/')[-1]}",
-                    "content": f"从 {url} 获取的增强内容：\n\n" + 
-                              "这是通过Firecrawl深度抓取获得的高质量内容。" * 20,
-                    "metadata": {"source": "firecrawl_mock", "quality": "high"},
-                    "word_count": 800,
-                    "extraction_time": time.time(),
-                    "source": "firecrawl_mock"
-                }
-        
-        result = await self.retry_manager.robust_api_call(_mock_scrape)
-        
-        if result.success:
-            logger.info(f"🔥 Mock Firecrawl抓取成功: {url} ({result.data.get('word_count', 0)} 词)")
-            return result.data
-        else:
-            logger.warning(f"🔥 Mock Firecrawl抓取失败: {url} - {result.error}")
-            return {
-                "success": False,
-                "url": url,
-                "title": "抓取失败",
-                "content": f"无法抓取内容: {result.error}",
-                "error": result.error,
-                "source": "firecrawl_mock"
-            }
-    
-    async def batch_scrape(self, urls: List[str], options: Dict[str, Any] = None) -> List[Dict[str, Any]]:
-        """批量抓取多个URL"""
+        return await self.engine.scrape_url(url, self.config, options, query)
+    
+    async def batch_scrape(self, urls: List[str], options: Dict[str, Any] = None,
+                           query: str = "", deadline: float = None) -> List[Dict[str, Any]]:
+        """批量抓取多个URL；deadline为批量截止时间(秒)，到期返回已完成的结果"""
         logger.info(f"🔥 开始批量Firecrawl抓取: {len(urls)} 个URL (Real: {not self.mock_mode})")
         
-        if not self.mock_mode and self.client and len(urls) > 1:
-            # 尝试使用Firecrawl的批量抓取功能
-            try:
-                batch_kwargs = {
-                    "formats": ["markdown", "html"],
-                    "only_main_content": True,
-                    "timeout": 20000
-                }
-                
-                if options:
-                    batch_kwargs.update(options)
-                
-                batch_result = await self.client.batch_scrape_urls(urls, **batch_kwargs)
-                
-                # 处理批量抓取的响应对象
-                if batch_result and hasattr(batch_result, 'success') and batch_result.success:
-                    scraped_data = []
-                    # 批量抓取通常返回的是响应对象，需要获取数据列表
-                    data_list = getattr(batch_result, 'data', []) or []
-                    
-                    for item in data_list:
-                        if item:
-                            # 处理单个抓取结果
-                            metadata = getattr(item, 'metadata', {}) or {}
-                            markdown_content = getattr(item, 'markdown', '')
-                            html_content = getattr(item, 'html', '')
-                            content = markdown_content or html_content or ''
-                            
-                            scraped_data.append({
-                                "success": True,
-                                "url": metadata.get("sourceURL", "unknown") if isinstance(metadata, dict) else "unknown",
-                                "title": metadata.get("title", "Unknown title") if isinstance(metadata, dict) else "Unknown title",
-                                "content": content,
-                                "html": html_content,
-                                "metadata": metadata if isinstance(metadata, dict) else {},
-                                "word_count": len(content.split()) if content else 0,
-                                "extraction_time": time.time(),
-                                "source": "firecrawl_real_batch"
-                            })
-                    
-                    successful_count = len(scraped_data)
-                    logger.info(f"🔥 批量Firecrawl抓取完成: {successful_count}/{len(urls)} 成功")
-                    return scraped_data
-                    
-            except Exception as e:
-                logger.warning(f"🔥 批量Firecrawl抓取失败，降级到单个抓取: {e}")
-        
-        # 降级到单个抓取模式
-        processor = ParallelProcessor(max_concurrent=3)
-        
-        # 创建抓取任务
-        scrape_tasks = [self.scrape_url for _ in urls]
-        args_list = [(url, options) for url in urls]
-        
-        results = await processor.parallel_execute(scrape_tasks, *args_list)
-        
-        # 提取成功的结果
-        scraped_data = []
-        for result in results:
-            if result.success:
-                scraped_data.append(result.data)
-            else:
-                scraped_data.append({
-                    "success": False,
-                    "url": "unknown",
-                    "content": f"抓取失败: {result.error}",
-                    "error": result.error,
-                    "source": "firecrawl_fallback"
-                })
-        
-        successful_count = sum(1 for data in scraped_data if data.get("success", False))
-        logger.info(f"🔥 批量抓取完成: {successful_count}/{len(urls)} 成功")
+        if self.mock_mode:
+            return list(await asyncio.gather(*[self.engine.mock_scrape(url) for url in urls]))
         
-        return scraped_data
+        return await self.engine.scrape_urls(urls, self.config, options, deadline=deadline, query=query)
 
 
 # 保留Mock类以供向后兼容
@@ -496,14 +258,18 @@ class MockFirecrawlClient(RealFirecrawlClient):
     
     def __init__(self):
         # 强制使用Mock模式
-        super().__init__(api_key=None)
+        super().__init__()
         self.mock_mode = True
-        self.client = None
 
 # 全局实例
 retry_manager = APIRetryManager()
 parallel_processor = ParallelProcessor()
 firecrawl_client = RealFirecrawlClient()  # 现在使用真实客户端，会自动降级到Mock如果没有API Key
+blocking_pool = BlockingExecutorPool()
+
+async def run_blocking(pool_name: str, func: Callable[..., Any], *args, **kwargs) -> Any:
+    """在专用线程池中执行同步调用"""
+    return await blocking_pool.run(pool_name, func, *args, **kwargs)
 
 # 工具函数
 async def robust_web_search(search_func: Callable, queries: List[str]) -> List[Dict[str, Any]]:
@@ -539,43 +305,24 @@ async def enhance_content_with_firecrawl(search_results: List[Dict],
     config = enhancement_config or {}
     firecrawl_config = V2_FIRECRAWL_CONFIG
     
-    # 使用配置化的限制
-    max_urls = config.get("max_urls", firecrawl_config.MAX_SOURCES_TO_SCRAPE)
-    quality_threshold = config.get("quality_threshold", 0.6)  # V2降低阈值
-    
-    # 选择高质量的URL进行增强 - 使用优先级算法
-    priority_urls = []
-    url_scores = []
-    seen_domains = set()
-    
-    for result in search_results[:max_urls * 3]:  # 扩大候选范围
-        # 兼容不同的URL字段名：'url' 或 'link'（Google搜索使用'link'）
-        url = result.get("url") or result.get("link", "")
-        title = result.get("title", "")
-        snippet = result.get("snippet", "")
-        
-        if not url:
-            continue
-        
-        # 域名去重
-        domain = urlparse(url).netloc.lower() if url else ""
-        if domain in seen_domains:
-            continue
-        
-        # 检查是否适合增强
-        if not _is_url_suitable_for_enhancement(url, firecrawl_config):
-            continue
-        
-        # 计算质量评分
-        quality_score = _calculate_url_quality_score(url, title, snippet, firecrawl_config)
-        
-        if quality_score >= quality_threshold:
-            url_scores.append((url, quality_score, domain))
-            seen_domains.add(domain)
-    
-    # 按分数排序并选择前N个
-    url_scores.sort(key=lambda x: x[1], reverse=True)
-    priority_urls = [url for url, score, domain in url_scores[:max_urls]]
+    # 使用配置化的限制；指定time_budget时max_urls仅作为上限，数量按预测耗时和价值决定
+    time_budget = config.get("time_budget")
+    max_urls = config.get("max_urls", None if time_budget is not None else firecrawl_config.MAX_SOURCES_TO_SCRAPE)
+    quality_threshold = config.get("quality_threshold", firecrawl_config.QUALITY_THRESHOLD)
+    
+    # 选择高质量的URL进行增强 - 使用引擎的统一选择策略
+    if time_budget is not None:
+        priority_urls = await scrape_engine.aplan_urls(
+            search_results, firecrawl_config, time_budget,
+            max_count=max_urls,
+            quality_threshold=quality_threshold
+        )
+    else:
+        priority_urls = await scrape_engine.aselect_urls(
+            search_results, firecrawl_config,
+            max_count=max_urls,
+            quality_threshold=quality_threshold
+        )
     
     if not priority_urls:
         logger.info("🔥 V2没有找到适合增强的URL")
@@ -584,7 +331,8 @@ async def enhance_content_with_firecrawl(search_results: List[Dict],
     logger.info(f"🔥 V2选择 {len(priority_urls)} 个URL进行Firecrawl增强")
     
     # 使用Firecrawl批量抓取 - 应用速率限制
-    enhanced_data = await firecrawl_client.batch_scrape(priority_urls)
+    enhanced_data = await firecrawl_client.batch_scrape(priority_urls, query=config.get("query", ""),
+                                                        deadline=time_budget)
     
     # 将增强内容合并到搜索结果中
     enhanced_results = search_results.copy()
@@ -596,12 +344,8 @@ async def enhance_content_with_firecrawl(search_results: List[Dict],
                 # 兼容不同的URL字段名进行匹配
                 result_url = result.get("url") or result.get("link", "")
                 if result_url == enhanced.get("url"):
-                    # 限制增强内容长度
-                    enhanced_content = enhanced["content"]
-                    if len(enhanced_content) > firecrawl_config.MAX_CONTENT_LENGTH:
-                        enhanced_content = enhanced_content[:firecrawl_config.MAX_CONTENT_LENGTH] + "..."
-                    
-                    result["enhanced_content"] = enhanced_content
+                    # 内容长度已由V2配置档限制
+                    result["enhanced_content"] = enhanced["content"]
                     result["enhanced_title"] = enhanced["title"]
                     result["enhanced_metadata"] = enhanced.get("metadata", {})
                     result["word_count"] = enhanced.get("word_count", 0)
@@ -619,46 +363,103 @@ async def enhance_content_with_firecrawl(search_results: List[Dict],
     
     return enhanced_results 
 
-def _is_url_suitable_for_enhancement(url: str, config: V2FirecrawlConfig) -> bool:
-    """判断URL是否适合增强"""
-    if not url:
-        return False
-    
-    domain = urlparse(url).netloc.lower()
-    
-    # 检查排除域名
-    for excluded in config.EXCLUDED_DOMAINS:
-        if excluded in domain:
-            return False
-    
-    # 检查文件类型排除
-    excluded_extensions = ['.pdf', '.doc', '.docx', '.ppt', '.pptx']
-    if any(url.lower().endswith(ext) for ext in excluded_extensions):
-        return False
+# 测试函数
+async def test_blocking_pool_overlap(call_count: int = 4, call_duration: float = 0.3) -> Dict[str, Any]:
+    """测试阻塞调用是否真正并发执行，且事件循环在期间保持响应"""
+    intervals = []
+    
+    def blocking_call(idx: int):
+        start = time.perf_counter()
+        time.sleep(call_duration)
+        intervals.append((start, time.perf_counter()))
+        return idx
+    
+    # 事件循环心跳：如果循环被阻塞，心跳次数会明显偏少
+    ticks = 0
+    stop = asyncio.Event()
+    
+    async def heartbeat():
+        nonlocal ticks
+        while not stop.is_set():
+            ticks += 1
+            await asyncio.sleep(0.01)
+    
+    pool = BlockingExecutorPool({"test": call_count})
+    heartbeat_task = asyncio.create_task(heartbeat())
+    
+    start_time = time.perf_counter()
+    results = await asyncio.gather(*[
+        pool.run("test", blocking_call, idx) for idx in range(call_count)
+    ])
+    elapsed = time.perf_counter() - start_time
+    
+    stop.set()
+    await heartbeat_task
+    pool.shutdown()
+    
+    # 所有调用的时间区间存在公共重叠部分
+    overlap = max(s for s, _ in intervals) < min(e for _, e in intervals)
+    
+    assert results == list(range(call_count))
+    assert overlap, "阻塞调用没有并发执行"
+    assert elapsed < call_duration * call_count * 0.6, f"并发耗时过长: {elapsed:.2f}s"
+    assert ticks >= int(call_duration / 0.01 * 0.5), f"事件循环被阻塞: 心跳 {ticks} 次"
+    
+    print(f"✅ 阻塞线程池并发测试通过: {call_count} 个调用耗时 {elapsed:.2f}s, 心跳 {ticks} 次")
+    return {"elapsed": elapsed, "ticks": ticks, "overlap": overlap}
+
+async def test_web_research_overlap(call_duration: float = 0.3) -> Dict[str, Any]:
+    """测试两个并行分支的web_research_adapter在慢速搜索下是否重叠执行"""
+    from unittest import mock
+    from . import advanced_graph
+    
+    intervals = []
+    
+    def slow_web_search(state):
+        start = time.perf_counter()
+        time.sleep(call_duration)
+        intervals.append((start, time.perf_counter()))
+        query = state["search_query"]
+        return {
+            "search_results": [{"title": query, "url": f"https://example.com/{query}"}],
+            "sources_gathered": [],
+        }
     
-    return True
+    ticks = 0
+    stop = asyncio.Event()
+    
+    async def heartbeat():
+        nonlocal ticks
+        while not stop.is_set():
+            ticks += 1
+            await asyncio.sleep(0.01)
+    
+    branches = [
+        {"search_query": f"query-{idx}", "id": idx, "current_task_id": "task-1",
+         "enable_parallel_search": False}
+        for idx in range(2)
+    ]
+    
+    with mock.patch.object(advanced_graph, "web_search_node", slow_web_search):
+        heartbeat_task = asyncio.create_task(heartbeat())
+        start_time = time.perf_counter()
+        outputs = await asyncio.gather(*[
+            advanced_graph.web_research_adapter(branch, {}) for branch in branches
+        ])
+        elapsed = time.perf_counter() - start_time
+        stop.set()
+        await heartbeat_task
+    
+    overlap = max(s for s, _ in intervals) < min(e for _, e in intervals)
+    
+    assert [out["pending_branch_results"][0]["search_query"] for out in outputs] == ["query-0", "query-1"]
+    assert overlap, "两个分支的搜索没有重叠执行"
+    assert elapsed < call_duration * 1.5, f"分支串行执行: {elapsed:.2f}s"
+    assert ticks >= int(call_duration / 0.01 * 0.5), f"事件循环被阻塞: 心跳 {ticks} 次"
+    
+    print(f"✅ 分支搜索并发测试通过: 2 个分支耗时 {elapsed:.2f}s, 心跳 {ticks} 次")
+    return {"elapsed": elapsed, "ticks": ticks, "overlap": overlap}
 
-def _calculate_url_quality_score(url: str, title: str, snippet: str, config: V2FirecrawlConfig) -> float:
-    """计算URL质量分数"""
-    domain = urlparse(url).netloc.lower()
-    score = 0.3  # 基础分数
-    
-    # 标题长度加分
-    if len(title) > 10:
-        score += 0.2
-    
-    # 摘要长度加分
-    if len(snippet) > 50:
-        score += 0.2
-    
-    # 优先域名大幅加分
-    for priority in config.PRIORITY_DOMAINS:
-        if priority in domain:
-            score += 0.4
-            break
-    
-    # HTTPS加分
-    if url.startswith('https://'):
-        score += 0.1
-    
-    return min(1.0, max(0.0, score)) 
\ No newline at end of file
+if __name__ == "__main__":
+    asyncio.run(test_blocking_pool_overlap())
+    asyncio.run(test_web_research_overlap())
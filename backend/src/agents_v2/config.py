@@ -0,0 +1,90 @@
+"""
+V2 Agent 配置文件
+定义高级研究图中按模式区分的行为参数
+"""
+
+# 自适应查询扩展配置 (web_research_adapter)
+# 先执行基础查询，只有当新增URL比例（边际新颖度）超过阈值时才继续扩展
+SEARCH_FANOUT_CONFIG = {
+    "default": {
+        "novelty_threshold": 0.5,     # 边际新颖度阈值 (新URL数 / 返回结果数)
+        "max_expansions": 1,          # 最多追加的扩展查询数
+    },
+    "quick_lookup": {
+        "novelty_threshold": 1.1,     # 快速查询：不扩展
+        "max_expansions": 0,
+    },
+    "research_assistant": {
+        "novelty_threshold": 0.6,
+        "max_expansions": 1,
+    },
+    "deep_research": {
+        "novelty_threshold": 0.4,     # 深度研究：更积极地扩展
+        "max_expansions": 2,
+    },
+}
+
+# 汇合后内容增强配置 (research_enhancement节点)
+# 各搜索分支只负责搜索，汇合后从所有分支的去重结果中选出最优的URL作为一个批次抓取
+# 抓取数量由时间预算内的预测耗时和价值决定，max_urls只是上限
+ENHANCEMENT_STAGE_CONFIG = {
+    "default": {
+        "time_budget": 20,            # 每轮抓取时间预算(秒)
+        "max_urls": 6,                # 每轮最多抓取的URL数（跨所有分支）
+        "quality_threshold": 0.6,
+    },
+    "quick_lookup": {
+        "time_budget": 8,
+        "max_urls": 2,
+    },
+    "deep_research": {
+        "time_budget": 45,            # 深度研究预算充足时使用更多来源
+        "max_urls": 10,
+    },
+}
+
+# 累积字段的去重与容量上限 (advanced_state中的reducer)
+# 来源按规范化URL合并；超过上限时保留评分最高的条目。
+# 搜索结果和发现只写入source_store，V1兼容列表字段没有reducer
+STATE_REDUCER_CAPS = {
+    "sources_gathered": 200,
+    "source_store": 150,            # 运行级来源存储（最终报告的唯一来源）
+}
+
+# 扩展查询后缀（按顺序使用）
+FANOUT_QUERY_SUFFIXES = ["案例研究", "最新发展"]
+
+
+def get_fanout_config(mode=None):
+    """
+    获取指定模式的查询扩展配置
+
+    Args:
+        mode: 'quick_lookup', 'research_assistant', 'deep_research' 或 None(使用默认)
+
+    Returns:
+        dict: 合并后的配置
+    """
+    config = SEARCH_FANOUT_CONFIG["default"].copy()
+
+    if mode and mode in SEARCH_FANOUT_CONFIG:
+        config.update(SEARCH_FANOUT_CONFIG[mode])
+
+    return config
+
+def get_enhancement_stage_config(mode=None):
+    """获取指定模式的汇合增强配置"""
+    config = ENHANCEMENT_STAGE_CONFIG["default"].copy()
+
+    if mode and mode in ENHANCEMENT_STAGE_CONFIG:
+        config.update(ENHANCEMENT_STAGE_CONFIG[mode])
+
+    return config
+
+# 阻塞依赖的专用线程池大小
+# 异步节点中的同步SDK调用（Google CSE等）通过run_in_executor在独立线程池执行，避免阻塞事件循环
+# 调用Gemini的节点均为同步节点，由LangGraph在其执行器线程中运行，无需单独的线程池
+BLOCKING_POOL_SIZES = {
+    "google_search": 8,     # Google Custom Search (googleapiclient，同步)
+    "default": 4,
+}
@@ -8,6 +8,7 @@ from langchain_core.runnables import RunnableConfig
 
 from .advanced_state import AdvancedResearchState, ResearchTask, TaskResult
 from .planner import get_current_task, is_planning_complete
+from .source_store import task_findings
 
 
 class TaskCoordinator:
@@ -46,7 +47,7 @@ class TaskCoordinator:
             return False
         
         # 检查是否有足够的研究结果
-        current_findings = state.get("current_task_detailed_findings", [])
+        current_findings = task_findings(state, get_current_task(state).id)
         if len(current_findings) >= 5:  # 简单阈值
             print(f"✅ 任务有足够研究结果 ({len(current_findings)}个)")
             return False
@@ -120,7 +121,7 @@ class TaskCoordinator:
             "task_progress": {
                 "current_loop": state.get("current_task_loop_count", 0),
                 "max_loops": state.get("max_research_loops_per_task", 4),
-                "total_findings": len(state.get("current_task_detailed_findings", []))
+                "total_findings": len(task_findings(state, current_task.id))
             }
         }
         
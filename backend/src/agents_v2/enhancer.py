@@ -12,6 +12,9 @@ from langchain_google_genai import ChatGoogleGenerativeAI
 
 from .advanced_state import AdvancedResearchState, ContentQualityAssessment
 from .planner import get_current_task
+from .source_store import store_results
+from agent.ranking import rank_results
+from agent.records import SearchHit
 
 
 @dataclass
@@ -54,40 +57,37 @@ class ContentEnhancer:
     
     def extract_grounding_sources(self, state: AdvancedResearchState) -> List[Dict[str, str]]:
         """从研究状态中提取信息源"""
-        grounding_sources = []
         
-        # 从搜索结果中提取
-        search_results = state.get("web_research_results", [])
-        for result in search_results[-10:]:  # 最近10个结果
-            if isinstance(result, dict):
-                # 兼容不同的URL字段名：'url' 或 'link'（Google搜索使用'link'）
-                result_url = result.get("url") or result.get("link", "")
-                grounding_sources.append({
-                    "title": result.get("title", "未知标题"),
-                    "url": result_url,
-                    "snippet": result.get("snippet", result.get("content", ""))[:200]  # 限制长度
-                })
+        # 从搜索结果中提取 - 按与查询/当前任务的相关性选取前10个
+        search_results = rank_results(
+            store_results(state, materialize=True),
+            state.get("user_query", ""),
+            top_k=10,
+            context=get_current_task(state).description
+        )
+        # 搜索结果和收集的源在入口规范化为SearchHit，不再逐字段兼容url/link、snippet/content
+        hits = [
+            (SearchHit.from_dict(result), "未知标题")
+            for result in search_results if isinstance(result, dict)
+        ]
         
-        # 从收集的源中提取
-        sources_gathered = state.get("sources_gathered", [])
-        for source in sources_gathered[-5:]:  # 最近5个源
-            # 兼容不同的URL字段名
-            source_url = source.get("url") or source.get("link", "") if isinstance(source, dict) else ""
-            if isinstance(source, dict) and source_url:
-                grounding_sources.append({
-                    "title": source.get("title", "未知来源"),
-                    "url": source_url,
-                    "snippet": source.get("snippet", "")[:200]
-                })
+        # 从收集的源中提取 - 最近5个源
+        hits.extend(
+            (SearchHit.from_dict(source), "未知来源")
+            for source in state.get("sources_gathered", [])[-5:] if isinstance(source, dict)
+        )
         
         # 去重（基于URL）
         seen_urls = set()
         unique_sources = []
-        for source in grounding_sources:
-            url = source.get("url", "")
-            if url and url not in seen_urls:
-                seen_urls.add(url)
-                unique_sources.append(source)
+        for hit, default_title in hits:
+            if hit.url and hit.url not in seen_urls:
+                seen_urls.add(hit.url)
+                unique_sources.append({
+                    "title": hit.title or default_title,
+                    "url": hit.url,
+                    "snippet": str(hit.snippet or hit.content)[:200]  # 限制长度
+                })
         
         return unique_sources[:8]  # 最多8个源
     
@@ -287,7 +287,7 @@ def content_enhancement_node(state: AdvancedResearchState, config: RunnableConfi
     research_topic = current_task.description
     
     # 获取当前研究发现
-    current_findings = state.get("web_research_results", [])
+    current_findings = store_results(state, materialize=True)
     findings_content = [
         result.get("content", result.get("snippet", ""))
         for result in current_findings
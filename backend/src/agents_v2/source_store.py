@@ -0,0 +1,92 @@
+"""
+运行级来源存储
+汇合增强节点把每轮（已增强的）搜索结果按规范化URL写入state["source_store"]，
+反思、增强决策、任务协调和最终报告都从这里读取。V1兼容的结果列表
+（web_research_results、search_results、current_task_detailed_findings等）由视图函数按需生成，
+同一来源只会进入报告提示词一次。
+结果中的长文本（抓取正文、增强内容）写入时替换为运行级内容存储的句柄，需要文本的读取方用materialize=True取回
+"""
+
+from typing import Any, Dict, Hashable, List, Optional
+
+from agent.content_store import externalize, materialize as materialize_content
+from agent.records import Finding, SearchHit
+from .advanced_state import finding_key, merge_unique, result_key
+
+# 没有来源存储时（旧状态或其他写入方）回退读取的V1兼容字段
+LEGACY_RESULT_FIELDS = ("web_research_results", "search_results", "parallel_search_results")
+
+
+def store_update(results: List[Any], task_id: str = None, origin: str = None) -> Dict[Hashable, dict]:
+    """构建写入来源存储的更新（由merge_source_store合并），长文本字段替换为内容句柄"""
+    update: Dict[Hashable, dict] = {}
+    for result in results or []:
+        # 入口规范化：状态中只保存规范键名（url、is_enhanced），字符串结果转为基本格式
+        result = SearchHit.from_dict(result).to_dict()
+        update[result_key(result)] = {
+            "result": externalize(result),
+            "task_ids": [task_id] if task_id else [],
+            "origin": origin
+        }
+    return update
+
+
+def _legacy_results(state: Dict[str, Any]) -> List[Any]:
+    results = merge_unique([], [
+        result for field in LEGACY_RESULT_FIELDS for result in state.get(field) or []
+    ])
+    findings = [
+        finding["content"] for finding in state.get("current_task_detailed_findings") or []
+        if isinstance(finding, dict) and "content" in finding
+    ]
+    return merge_unique(results, findings)
+
+
+def store_results(state: Dict[str, Any], task_id: Optional[str] = None,
+                  materialize: bool = False) -> List[Any]:
+    """
+    来源存储中的结果（按首次收集的顺序）
+
+    Args:
+        state: 研究状态
+        task_id: 指定时只返回该任务收集的来源
+        materialize: 是否取回内容句柄对应的文本（只计数/路由的读取方不需要）
+    """
+    store = state.get("source_store") or {}
+    if not store:
+        results = _legacy_results(state) if task_id is None else [
+            finding.hit.to_dict() for finding in task_findings(state, task_id)
+        ]
+    else:
+        results = [
+            entry["result"] for entry in store.values()
+            if task_id is None or task_id in entry.get("task_ids", [])
+        ]
+    return [materialize_content(result) for result in results] if materialize else results
+
+
+def task_findings(state: Dict[str, Any], task_id: Optional[str] = None) -> List[Finding]:
+    """current_task_detailed_findings视图：每个(任务, 来源)一条发现（需要dict时用Finding.to_dict）"""
+    store = state.get("source_store") or {}
+    if not store:
+        legacy = merge_unique([], state.get("current_task_detailed_findings") or [], finding_key)
+        findings = [Finding.from_dict(finding) for finding in legacy]
+        return [finding for finding in findings if task_id is None or finding.task_id == task_id]
+
+    findings = []
+    for entry in store.values():
+        owners = [owner for owner in entry.get("task_ids", []) if task_id is None or owner == task_id]
+        if not owners:
+            continue
+        hit = SearchHit.from_dict(entry["result"])
+        source = entry.get("origin") or "web_search"
+        findings.extend(Finding(task_id=owner, hit=hit, source=source) for owner in owners)
+    return findings
+
+
+def store_keys(state: Dict[str, Any]) -> List[Hashable]:
+    """已收集来源的合并键（规范化URL）"""
+    store = state.get("source_store") or {}
+    if store:
+        return list(store)
+    return [result_key(result) for result in _legacy_results(state)]
@@ -0,0 +1,224 @@
+"""
+V2节点状态更新约定
+带reducer的字段（operator.add等）会把节点返回值合并到已有值上：节点回传完整状态时，
+已累积的列表会在每轮循环中被再次追加，状态大小和每步复制成本随轮次成倍增长。
+这里登记每个节点允许写入的reducer字段，并提供检查工具和测试
+"""
+
+import functools
+import inspect
+import logging
+import os
+from typing import Any, Callable, Dict, List, Optional, get_type_hints
+
+from agent.content_store import is_handle
+from .advanced_state import AdvancedResearchState
+
+logger = logging.getLogger(__name__)
+
+# 开启后图中每个节点的返回值都会被检查（开发/测试用），违反约定时抛出异常
+ENFORCE_STATE_CONTRACTS = os.getenv("V2_STATE_CONTRACT_CHECK", "false").lower() == "true"
+
+
+class StateContractError(AssertionError):
+    """节点返回了不属于自己的reducer字段"""
+
+
+def reducer_fields(schema: type = AdvancedResearchState) -> frozenset:
+    """状态中声明了reducer（Annotated元数据）的字段"""
+    hints = get_type_hints(schema, include_extras=True)
+    return frozenset(
+        name for name, hint in hints.items()
+        if any(callable(meta) for meta in getattr(hint, "__metadata__", ()))
+    )
+
+
+REDUCER_FIELDS = reducer_fields()
+
+# 各节点允许写入的reducer字段（未登记的节点不允许写入任何reducer字段）
+NODE_REDUCER_OUTPUTS: Dict[str, frozenset] = {
+    "planner": frozenset(),
+    "task_coordinator": frozenset(),
+    "content_enhancer": frozenset(),
+    "generate_query": frozenset(),
+    "web_research": frozenset({"pending_branch_results"}),
+    "research_enhancement": frozenset({
+        "pending_branch_results",
+        "source_store",             # 结果只写入来源存储，V1兼容列表由source_store视图生成
+        "sources_gathered",
+    }),
+    "reflection": frozenset(),
+    "finalize_answer": frozenset(),
+}
+
+
+def check_node_update(node: str, update: Any, state: Optional[Dict[str, Any]] = None) -> List[str]:
+    """
+    检查节点返回值是否符合约定
+
+    Args:
+        node: 节点名称
+        update: 节点返回值
+        state: 节点的输入状态；提供时同时检查reducer字段是否回传了已有的累积值
+
+    Returns:
+        list: 违反约定的描述，符合约定时为空
+    """
+    if not isinstance(update, dict):
+        return []
+
+    allowed = NODE_REDUCER_OUTPUTS.get(node, frozenset())
+    violations = []
+    for key in REDUCER_FIELDS.intersection(update):
+        if key not in allowed:
+            violations.append(f"{node} 返回了不属于它的reducer字段 {key}")
+            continue
+        if state is None:
+            continue
+        existing = state.get(key)
+        value = update[key]
+        if not existing:
+            continue
+        if isinstance(value, list):
+            echoed = value is existing or value[:len(existing)] == list(existing)
+        elif isinstance(value, dict):
+            echoed = value is existing or all(k in value for k in existing)
+        else:
+            echoed = False
+        if echoed:
+            violations.append(f"{node} 在reducer字段 {key} 中回传了已累积的 {len(existing)} 条数据")
+    return violations
+
+
+def checked_node(node: str, func: Callable) -> Callable:
+    """包装节点函数：返回值违反约定时抛出StateContractError（ENFORCE_STATE_CONTRACTS关闭时原样返回）"""
+    if not ENFORCE_STATE_CONTRACTS:
+        return func
+
+    def verify(state, update):
+        violations = check_node_update(node, update, state)
+        if violations:
+            raise StateContractError("; ".join(violations))
+        return update
+
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(state, *args, **kwargs):
+            return verify(state, await func(state, *args, **kwargs))
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(state, *args, **kwargs):
+        return verify(state, func(state, *args, **kwargs))
+    return wrapper
+
+
+def _sample_state() -> Dict[str, Any]:
+    """各reducer字段均已有累积数据的状态（模拟多轮循环之后）"""
+    from .advanced_state import ResearchTask
+    from .source_store import store_update
+
+    results = [
+        {"title": f"结果{i}", "url": f"https://example.org/{i}", "snippet": "已有的搜索结果" * 5}
+        for i in range(3)
+    ]
+    results[0] = {**results[0], "enhanced_content": "已抓取的正文" * 200, "is_enhanced": True}
+    return {
+        "user_query": "量子计算的最新进展",
+        "research_plan": [ResearchTask(id="task-1", description="量子计算的最新进展")],
+        "current_task_pointer": 0,
+        "current_task_loop_count": 1,
+        "cycle_count": 2,
+        "task_results": [],
+        "global_memory": ["已有的全局记忆"],
+        "executed_search_queries": ["量子计算"],
+        "web_research_results": list(results),
+        "sources_gathered": [{"url": result["url"]} for result in results],
+        "parallel_search_results": list(results),
+        "pending_branch_results": [],
+        "source_store": store_update(results, task_id="task-1", origin="web_search"),
+        "search_results": list(results),
+        "current_task_detailed_findings": [{"task_id": "task-1", "content": result} for result in results],
+        "task_specific_results": [],
+        "critique": "",
+        "is_complete": False,
+        "scenario_type": "quick_lookup",
+        "enable_content_enhancement": False,
+    }
+
+
+def test_node_contracts() -> Dict[str, List[str]]:
+    """在模拟状态上运行V2适配器节点（V1依赖替换为回传完整状态的桩函数），检查返回值约定"""
+    import asyncio
+    from unittest import mock
+    from . import advanced_graph
+
+    def echo_queries(state):
+        return {**state, "search_queries": ["量子纠错", "量子硬件"], "cycle_count": state.get("cycle_count", 0) + 1}
+
+    def echo_reflect(state):
+        return {**state, "critique": "信息充足", "is_complete": True}
+
+    report_inputs = []
+
+    def echo_report(state):
+        report_inputs.append(state.get("search_results", []))
+        return {**state, "report": "# 报告", "is_complete": True}
+
+    def echo_search(state):
+        results = [{"title": "新结果", "url": "https://example.org/new", "snippet": "新的搜索结果" * 5}]
+        return {**state, "search_results": results, "sources_gathered": [{"url": results[0]["url"]}]}
+
+    async def run_blocking(pool_name, func, *args, **kwargs):
+        return func(*args, **kwargs)
+
+    state = _sample_state()
+    branch_state = {
+        "search_query": "量子纠错", "id": 0, "current_task_id": "task-1",
+        "enable_parallel_search": False, "scenario_type": "quick_lookup"
+    }
+    report = {}
+    with mock.patch.object(advanced_graph, "generate_queries_node", echo_queries), \
+            mock.patch.object(advanced_graph, "reflect_node", echo_reflect), \
+            mock.patch.object(advanced_graph, "generate_report_node", echo_report), \
+            mock.patch.object(advanced_graph, "web_search_node", echo_search), \
+            mock.patch.object(advanced_graph, "run_blocking", run_blocking):
+        report["generate_query"] = check_node_update(
+            "generate_query", advanced_graph.generate_query_adapter(state, {}), state)
+        report["web_research"] = check_node_update(
+            "web_research", asyncio.run(advanced_graph.web_research_adapter(branch_state, {})), branch_state)
+
+        enhancement_state = {**state, "pending_branch_results": [{
+            "search_query": "量子纠错", "id": 0, "current_task_id": "task-1", "parallel": False,
+            "results": [{"title": "新结果", "url": "https://example.org/new", "snippet": "新的搜索结果" * 5}],
+            "sources": []
+        }]}
+        report["research_enhancement"] = check_node_update(
+            "research_enhancement",
+            asyncio.run(advanced_graph.research_enhancement_adapter(enhancement_state, {})),
+            enhancement_state)
+        report["reflection"] = check_node_update(
+            "reflection", advanced_graph.reflection_adapter(state, {}), state)
+        report["finalize_answer"] = check_node_update(
+            "finalize_answer", advanced_graph.finalize_answer_adapter(state, {}), state)
+
+    # 每个来源只进入报告一次（旧版本从4个字段拼接，同一来源出现多次）
+    if report_inputs and len(report_inputs[0]) != len(state["source_store"]):
+        report["finalize_answer"].append(
+            f"finalize_answer 向报告传入 {len(report_inputs[0])} 条结果，来源存储中只有 {len(state['source_store'])} 个来源")
+    # 状态中的长文本是内容句柄，传给V1报告节点前已取回
+    if report_inputs and any(
+            is_handle(value) for result in report_inputs[0] if isinstance(result, dict) for value in result.values()):
+        report["finalize_answer"].append("finalize_answer 向报告传入了未取回的内容句柄")
+
+    failed = {node: violations for node, violations in report.items() if violations}
+    print(f"🧪 节点状态约定检查: {len(report) - len(failed)}/{len(report)} 通过")
+    for node, violations in failed.items():
+        for violation in violations:
+            print(f"  ❌ {violation}")
+    assert not failed, failed
+    return report
+
+
+if __name__ == "__main__":
+    test_node_contracts()
@@ -7,6 +7,7 @@ import os
 import sys
 import json
 import asyncio
+import uuid
 from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
@@ -44,6 +45,14 @@ from unified_api import create_unified_research_endpoint, UnifiedResearchRequest
 # V1.5 快速搜索API导入
 from quick_search_api import create_quick_search_endpoints
 
+# 共享后台资源
+from agent.background_loop import background_loop
+from agent.page_cache import page_cache
+from agent.local_scrape import local_scrape_engine
+from agent.scrape_scheduler import with_scrape_context, PRIORITY_RESEARCH
+from agents_v2.api_utils import blocking_pool
+from agent.checkpointer import close_checkpointer
+
 
 class ResearchRequest(BaseModel):
     """V1研究请求（保持兼容性）"""
@@ -58,6 +67,9 @@ async def lifespan(app: FastAPI):
     print("🚀 FastAPI应用启动")
     print("🔧 初始化LangGraph研究系统...")
     
+    # 启动后台事件循环，供同步节点复用抓取客户端和连接
+    background_loop.start()
+    
     # 可以在这里进行预热或初始化
     try:
         # 测试V1图
@@ -84,6 +96,11 @@ async def lifespan(app: FastAPI):
     yield
     
     print("🛑 FastAPI应用关闭")
+    background_loop.stop()
+    blocking_pool.shutdown()
+    local_scrape_engine.shutdown()
+    page_cache.close()
+    close_checkpointer()
 
 
 # 创建FastAPI应用
@@ -106,7 +123,7 @@ app.add_middleware(
 
 # ===== V1 API（保持现有功能） =====
 
-async def stream_research_v1(query: str, scenario_type: str) -> AsyncGenerator[str, None]:
+async def stream_research_v1(query: str, scenario_type: str, run_id: str) -> AsyncGenerator[str, None]:
     """
     V1研究流式处理 - 支持新的用户友好格式
     """
@@ -124,7 +141,7 @@ async def stream_research_v1(query: str, scenario_type: str) -> AsyncGenerator[s
     
     config = RunnableConfig(
         configurable={
-            "thread_id": f"research-{hash(query)}",
+            "thread_id": run_id,  # 每次运行唯一（相同查询的并发请求不共享线程）
         }
     )
     
@@ -306,8 +323,13 @@ async def research(request: ResearchRequest):
     if not request.query.strip():
         raise HTTPException(status_code=400, detail="查询不能为空")
     
+    run_id = f"v1-{uuid.uuid4().hex[:12]}"
     return StreamingResponse(
-        stream_research_v1(request.query, request.scenario_type),
+        with_scrape_context(
+            stream_research_v1(request.query, request.scenario_type, run_id),
+            run_id=run_id,
+            priority=PRIORITY_RESEARCH
+        ),
         media_type="text/plain; charset=utf-8",
         headers={
             "Cache-Control": "no-cache",
@@ -10,10 +10,16 @@ from typing import List, Dict, Any, Optional
 import logging
 import time
 import json
+import uuid
 
 # 导入V1的搜索工具和新的Firecrawl工具
 from agent.tools import google_web_search
-from agent.firecrawl_utils import enhance_search_results_sync, EnhancementResult
+from agent.firecrawl_utils import enhance_search_results_async, EnhancementResult
+from agent.ranking import rank_results
+from agent.page_cache import page_cache
+from agent.scrape_scheduler import scrape_scheduler, scrape_context, PRIORITY_INTERACTIVE
+from agent.adaptive_concurrency import adaptive_concurrency
+from agent.scrape_engine import scrape_engine
 
 logger = logging.getLogger(__name__)
 
@@ -22,7 +28,8 @@ class QuickSearchRequest(BaseModel):
     query: str
     enhance: bool = False            # 是否启用Firecrawl增强
     max_results: int = 3            # 最大搜索结果数
-    max_enhance: int = 2            # 最大增强结果数
+    max_enhance: Optional[int] = None  # 最大增强结果数（上限，实际数量按时间预算决定）
+    time_budget: float = 10.0        # 整体时间预算(秒)，包含搜索耗时
     language: str = "zh"             # 搜索语言偏好
 
 class QuickSearchResponse(BaseModel):
@@ -64,10 +71,16 @@ class QuickSearchAPI:
             if request.enhance and search_results:
                 logger.info("🔥 启用Firecrawl内容增强")
                 
-                enhancement_result = enhance_search_results_sync(
-                    search_results, 
-                    max_enhance=request.max_enhance
-                )
+                # 在后台事件循环上抓取，不阻塞API事件循环；用户正在等待，优先于深度研究的抓取
+                with scrape_context(run_id=f"quick-{uuid.uuid4().hex[:12]}", priority=PRIORITY_INTERACTIVE):
+                    # 搜索已消耗的时间从预算中扣除，保证整体响应时间可预期
+                    remaining_budget = max(1.0, request.time_budget - (time.time() - start_time))
+                    enhancement_result = await enhance_search_results_async(
+                        search_results, 
+                        max_enhance=request.max_enhance,
+                        query=request.query,
+                        time_budget=remaining_budget
+                    )
                 
                 enhanced_results = enhancement_result.enhanced_results
                 enhancement_stats = {
@@ -137,7 +150,7 @@ class QuickSearchAPI:
             else:
                 summary_parts.append(f"**🔍 搜索结果:**\n")
             
-            for i, result in enumerate(results[:3], 1):
+            for i, result in enumerate(rank_results(results, query, top_k=3), 1):
                 title = result.get('title', '未知标题')[:80]
                 content = result.get('content', '')[:200]
                 url = result.get('url', '')
@@ -183,7 +196,11 @@ class QuickSearchAPI:
             "enhancement_rate": (
                 self.search_stats["enhanced_searches"] / 
                 max(self.search_stats["total_searches"], 1) * 100
-            )
+            ),
+            "page_cache": page_cache.get_stats(),
+            "scrape_scheduler": scrape_scheduler.get_stats(),
+            "scrape_concurrency": adaptive_concurrency.get_stats(),
+            "speculative_prefetch": scrape_engine.prefetcher.get_stats()
         }
 
 # 全局API实例
@@ -8,6 +8,7 @@ from fastapi import FastAPI, HTTPException
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 import json
+import uuid
 import asyncio
 from langchain_core.runnables import RunnableConfig
 
@@ -19,6 +20,15 @@ from agent.state import ResearchState as V1State
 from agents_v2.advanced_graph import get_advanced_research_graph
 from agents_v2.advanced_state import AdvancedResearchState as V2State
 
+# 抓取调度上下文
+from agent.scrape_scheduler import with_scrape_context, PRIORITY_RESEARCH, PRIORITY_BACKGROUND
+from agent.content_store import content_stores, content_length, deref
+
+# 持久化检查点（中断的运行可恢复）
+from agent.checkpointer import (
+    get_checkpointer, RUN_COMPLETED, RUN_FAILED, RUN_INTERRUPTED
+)
+
 
 class UnifiedResearchRequest(BaseModel):
     """统一研究请求"""
@@ -35,17 +45,18 @@ class APIManager:
     def __init__(self):
         self.v1_graph = None
         self.v2_graph = None
+        self.active_runs = set()  # 本进程中正在执行的运行（thread_id）
     
     def get_v1_graph(self):
         """获取V1图实例"""
         if not self.v1_graph:
-            self.v1_graph = build_graph()
+            self.v1_graph = build_graph(checkpointer=get_checkpointer())
         return self.v1_graph
     
     def get_v2_graph(self):
         """获取V2图实例"""
         if not self.v2_graph:
-            self.v2_graph = get_advanced_research_graph()
+            self.v2_graph = get_advanced_research_graph(checkpointer=get_checkpointer())
         return self.v2_graph
     
     def create_v1_initial_state(self, query: str, scenario_type: str) -> V1State:
@@ -81,6 +92,7 @@ class APIManager:
             "web_research_results": [],
             "sources_gathered": [],
             "parallel_search_results": [],
+            "source_store": {},
             
             # 反思和评估
             "reflection_is_sufficient": None,
@@ -127,18 +139,21 @@ class APIManager:
     async def execute_v1_research(
         self, 
         query: str, 
-        scenario_type: str
+        scenario_type: str,
+        thread_id: str,
+        resume: bool = False
     ) -> Iterator[Dict[str, Any]]:
-        """执行V1研究流程"""
+        """执行V1研究流程（resume时从thread_id的最后一个检查点继续）"""
         
-        print(f"🔄 启动V1研究流程：{query}")
+        print(f"🔄 {'恢复' if resume else '启动'}V1研究流程：{query} (thread_id: {thread_id})")
         
         graph = self.get_v1_graph()
-        initial_state = self.create_v1_initial_state(query, scenario_type)
+        # 恢复时输入为None，LangGraph从最后完成的节点继续
+        initial_state = None if resume else self.create_v1_initial_state(query, scenario_type)
         
         config = RunnableConfig(
             configurable={
-                "thread_id": "v1-research",
+                "thread_id": thread_id,
             }
         )
         
@@ -172,32 +187,55 @@ class APIManager:
     async def execute_v2_research(
         self, 
         query: str, 
-        mode: str
+        mode: str,
+        thread_id: str,
+        resume: bool = False
     ) -> Iterator[Dict[str, Any]]:
-        """执行V2研究流程"""
+        """执行V2研究流程（resume时从thread_id的最后一个检查点继续）"""
         
-        print(f"🚀 启动V2研究流程：{query} (模式：{mode})")
+        print(f"🚀 {'恢复' if resume else '启动'}V2研究流程：{query} (模式：{mode}, thread_id: {thread_id})")
         
         graph = self.get_v2_graph()
-        initial_state = self.create_v2_initial_state(query, mode)
-        
         config = RunnableConfig(
             configurable={
-                "thread_id": "v2-research",
+                "thread_id": thread_id,
             }
         )
         
+        if resume:
+            # 恢复时输入为None，LangGraph从最后完成的节点继续；任务上下文取自检查点中的状态
+            initial_state = None
+            context_source = (await graph.aget_state(config)).values
+        else:
+            initial_state = self.create_v2_initial_state(query, mode)
+            context_source = initial_state
+        
         try:
             print(f"🔄 开始执行V2图...")
             # 处理V2图事件 - 使用异步方式
-            async for event in graph.astream(initial_state, config={"configurable": {"thread_id": "v2-research"}}):
+            # 节点只返回修改的字段，步骤信息所需的当前任务上下文在这里跨事件跟踪
+            task_context = {
+                key: context_source[key]
+                for key in ("research_plan", "current_task_pointer", "current_task_loop_count")
+                if key in context_source
+            }
+            async for event in graph.astream(initial_state, config):
                 print(f"🔄 V2图事件: {list(event.keys())}")
                 
+                for node_data in event.values():
+                    if isinstance(node_data, dict):
+                        task_context.update({
+                            key: node_data[key]
+                            for key in ("research_plan", "current_task_pointer", "current_task_loop_count")
+                            if key in node_data
+                        })
+                
                 # 发送状态更新事件
                 yield {
                     "version": "v2",
                     "event_type": "state_update",
                     "data": event,
+                    "task_context": dict(task_context),
                     "timestamp": "now"
                 }
                 
@@ -241,10 +279,11 @@ class APIManager:
                     completed_tasks = 0
                     for node_name, state in event.items():
                         if isinstance(state, dict):
+                            # 报告正文在运行级内容存储中，状态里是句柄（可能需从检查点库加载，放到线程中）
                             if state.get("final_report_markdown"):
-                                final_report = state["final_report_markdown"]
+                                final_report = await asyncio.to_thread(deref, state["final_report_markdown"])
                             if state.get("report"):
-                                final_report = state["report"]
+                                final_report = await asyncio.to_thread(deref, state["report"])
                             if state.get("execution_summary"):
                                 completed_tasks = state["execution_summary"].get("completed_tasks", 0)
                     
@@ -274,38 +313,120 @@ class APIManager:
     
     async def execute_research(
         self, 
-        request: UnifiedResearchRequest
+        request: UnifiedResearchRequest,
+        run_id: str = None,
+        resume: bool = False
     ) -> Iterator[Dict[str, Any]]:
-        """执行统一研究流程"""
+        """
+        执行统一研究流程
+        
+        run_id同时作为抓取调度的运行ID和LangGraph的thread_id（每次运行唯一）；
+        resume时从该运行的最后一个检查点继续
+        """
+        
+        run_id = run_id or new_run_id(request.version)
         
         if request.version == "v1":
-            async for event in self.execute_v1_research(
-                request.query, 
-                request.scenario_type
-            ):
-                yield event
+            stream = self.execute_v1_research(request.query, request.scenario_type, run_id, resume)
+            priority = PRIORITY_RESEARCH
         elif request.version == "v2":
-            async for event in self.execute_v2_research(
-                request.query, 
-                request.mode
-            ):
-                yield event
+            # V2深度研究的抓取作为后台任务，让位于快速搜索
+            stream = self.execute_v2_research(request.query, request.mode, run_id, resume)
+            priority = PRIORITY_BACKGROUND
         else:
             raise HTTPException(
                 status_code=400, 
                 detail=f"不支持的版本：{request.version}"
             )
+        
+        # 恢复的运行已在prepare_resume中认领（标记为running）
+        checkpointer = get_checkpointer()
+        heartbeat = None
+        if checkpointer is not None:
+            if not resume:
+                await asyncio.to_thread(checkpointer.register_run, run_id, request.version, request.dict())
+            heartbeat = asyncio.create_task(self._heartbeat(checkpointer, run_id))
+        
+        # 没有收到完成/错误事件就结束（客户端断开等）的运行记为中断，可恢复
+        status, error = RUN_INTERRUPTED, None
+        self.active_runs.add(run_id)
+        try:
+            async for event in with_scrape_context(stream, run_id=run_id, priority=priority):
+                if event.get("event_type") == "completion":
+                    status = RUN_COMPLETED
+                elif event.get("event_type") == "error":
+                    status, error = RUN_FAILED, event.get("data", {}).get("error")
+                yield event
+        finally:
+            self.active_runs.discard(run_id)
+            if heartbeat is not None:
+                heartbeat.cancel()
+            
+            def finish_run():
+                # 运行结束（含客户端断开）后释放其内容存储（待写内容落库）；有检查点时内容仍可从检查点库取回
+                content_stores.release(run_id)
+                if checkpointer is not None:
+                    checkpointer.set_run_status(run_id, status, error)
+            
+            try:
+                await asyncio.to_thread(finish_run)
+            except asyncio.CancelledError:
+                # 客户端断开时请求任务已被取消，直接完成收尾
+                finish_run()
+                raise
+    
+    @staticmethod
+    async def _heartbeat(checkpointer, run_id: str):
+        """定期刷新运行心跳，执行时间长的节点运行期间运行不会被判定为已中断"""
+        interval = checkpointer.config["stale_after"] / 3
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await asyncio.to_thread(checkpointer.touch_run, run_id)
+            except Exception as e:
+                print(f"⚠️ 运行心跳写入失败: {run_id} - {e}")
+    
+    async def prepare_resume(self, thread_id: str) -> UnifiedResearchRequest:
+        """检查运行是否可以恢复并认领该运行，返回登记的原始请求"""
+        
+        checkpointer = get_checkpointer()
+        if checkpointer is None:
+            raise HTTPException(status_code=503, detail="检查点存储未启用，无法恢复运行")
+        
+        run = await asyncio.to_thread(checkpointer.get_run, thread_id)
+        if run is None:
+            raise HTTPException(status_code=404, detail=f"运行不存在或已过期：{thread_id}")
+        if thread_id in self.active_runs or not run["resumable"]:
+            raise HTTPException(status_code=409, detail=f"运行状态为 {run['status']}，无法恢复")
+        
+        request = UnifiedResearchRequest(**run["request"])
+        graph = self.get_v1_graph() if request.version == "v1" else self.get_v2_graph()
+        snapshot = await graph.aget_state(RunnableConfig(configurable={"thread_id": thread_id}))
+        if not snapshot.next:
+            raise HTTPException(status_code=409, detail="运行没有待执行的节点，无需恢复")
+        
+        # 原子认领：并发的恢复请求（包括其他实例）只有一个能继续执行
+        if not await asyncio.to_thread(checkpointer.claim_run, thread_id):
+            raise HTTPException(status_code=409, detail="运行已被其他请求恢复")
+        
+        print(f"♻️ 恢复运行 {thread_id}：下一步 {list(snapshot.next)}")
+        return request
+
+
+def new_run_id(version: str) -> str:
+    """每次运行唯一的ID（同时作为LangGraph的thread_id）"""
+    return f"{version}-{uuid.uuid4().hex[:12]}"
 
 
 # 全局API管理器
 api_manager = APIManager()
 
 
-async def stream_research_response(request: UnifiedResearchRequest):
+async def stream_research_response(request: UnifiedResearchRequest, run_id: str = None, resume: bool = False):
     """流式研究响应"""
     
     try:
-        async for event in api_manager.execute_research(request):
+        async for event in api_manager.execute_research(request, run_id=run_id, resume=resume):
             # 根据版本处理不同的事件格式
             if request.version == "v1":
                 # V1事件转换为前端期望的格式
@@ -412,10 +533,11 @@ def convert_v2_event_to_sse(event: Dict[str, Any]) -> list:
     elif event.get("event_type") == "state_update":
         # V2状态更新事件
         data = event.get("data", {})
+        task_context = event.get("task_context", {})
         for node_name, node_data in data.items():
             if isinstance(node_data, dict):
-                # 生成V2节点的友好步骤信息
-                step_info = generate_v2_step_info(node_name, node_data)
+                # 生成V2节点的友好步骤信息（节点更新只含修改的字段，任务上下文取自运行中的跟踪）
+                step_info = generate_v2_step_info(node_name, {**task_context, **node_data})
                 if step_info:
                     results.append(f"data: {json.dumps(step_info, ensure_ascii=False)}\n\n")
     
@@ -499,7 +621,9 @@ def generate_v2_step_info(node_name: str, node_data: dict) -> dict:
         }
     
     elif node_name == "web_research":
-        search_results_count = len(node_data.get("search_results", []))
+        search_results_count = sum(
+            len(branch.get("results", [])) for branch in node_data.get("pending_branch_results") or []
+        )
         return {
             "step": "web_search",
             "details": f"🌐 [{current_task_name}] 第{cycle}轮 - 执行网络搜索 (获得{search_results_count}条结果)",
@@ -512,6 +636,26 @@ def generate_v2_step_info(node_name: str, node_data: dict) -> dict:
             }
         }
     
+    elif node_name == "research_enhancement":
+        round_results = [entry.get("result") for entry in (node_data.get("source_store") or {}).values()]
+        search_results_count = len(round_results)
+        enhanced_count = sum(
+            1 for result in round_results
+            if isinstance(result, dict) and result.get("is_enhanced")
+        )
+        return {
+            "step": "content_enhancement",
+            "details": f"🔥 [{current_task_name}] 第{cycle}轮 - 汇合搜索结果并深度抓取 ({enhanced_count}/{search_results_count}条已增强)",
+            "state": {
+                "current_task": {
+                    "name": current_task_name,
+                    "cycles_completed": cycle
+                },
+                "search_results_count": search_results_count,
+                "enhanced_count": enhanced_count
+            }
+        }
+    
     elif node_name == "reflection":
         is_complete = node_data.get("is_complete", False)
         critique = node_data.get("critique", "")
@@ -530,7 +674,7 @@ def generate_v2_step_info(node_name: str, node_data: dict) -> dict:
         }
     
     elif node_name == "finalize_answer":
-        report_length = len(node_data.get("report", "") or node_data.get("final_report_markdown", ""))
+        report_length = content_length(node_data.get("report", "") or node_data.get("final_report_markdown", ""))
         return {
             "step": "report_generation",
             "details": f"📄 生成综合报告 (报告长度: {report_length} 字符)",
@@ -563,8 +707,11 @@ def create_unified_research_endpoint(app: FastAPI):
         print(f"  版本：{request.version}")
         print(f"  场景/模式：{request.scenario_type if request.version == 'v1' else request.mode}")
         
+        run_id = new_run_id(request.version)
+        print(f"  运行ID：{run_id}")
+        
         return StreamingResponse(
-            stream_research_response(request),
+            stream_research_response(request, run_id=run_id),
             media_type="text/plain; charset=utf-8",
             headers={
                 "Cache-Control": "no-cache",
@@ -572,9 +719,47 @@ def create_unified_research_endpoint(app: FastAPI):
                 "Access-Control-Allow-Origin": "*",
                 "Access-Control-Allow-Methods": "GET, POST, OPTIONS",
                 "Access-Control-Allow-Headers": "Content-Type",
+                "Access-Control-Expose-Headers": "X-Research-Thread-Id",
+                "X-Research-Thread-Id": run_id,
             }
         )
     
+    @app.post("/unified-research/resume/{thread_id}")
+    async def resume_unified_research(thread_id: str):
+        """
+        恢复中断的研究运行
+        从该运行最后完成的节点继续执行，已完成的搜索和抓取不再重复
+        """
+        
+        request = await api_manager.prepare_resume(thread_id)
+        print(f"📡 收到恢复请求：{thread_id} (查询：{request.query})")
+        
+        return StreamingResponse(
+            stream_research_response(request, run_id=thread_id, resume=True),
+            media_type="text/plain; charset=utf-8",
+            headers={
+                "Cache-Control": "no-cache",
+                "Connection": "keep-alive",
+                "Access-Control-Allow-Origin": "*",
+                "Access-Control-Allow-Methods": "GET, POST, OPTIONS",
+                "Access-Control-Allow-Headers": "Content-Type",
+                "Access-Control-Expose-Headers": "X-Research-Thread-Id",
+                "X-Research-Thread-Id": thread_id,
+            }
+        )
+    
+    @app.get("/unified-research/runs")
+    async def list_research_runs(resumable: bool = False, limit: int = 50):
+        """列出最近的研究运行（resumable=true时只返回可恢复的运行）"""
+        
+        checkpointer = get_checkpointer()
+        if checkpointer is None:
+            return {"enabled": False, "runs": []}
+        runs = await asyncio.to_thread(checkpointer.list_runs, resumable, limit)
+        for run in runs:
+            run["active"] = run["thread_id"] in api_manager.active_runs
+        return {"enabled": True, "runs": runs}
+    
     @app.get("/research-versions")
     async def get_research_versions():
         """获取支持的研究版本"""